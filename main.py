@@ -3,7 +3,14 @@
 
 import sys
 import importlib
-from watermark_app import WatermarkApp
+import multiprocessing
+from watermark import startup
+
+# --profile-startup：打印导入与窗口初始化各阶段耗时（需在导入 Qt 与主窗口模块前开启）
+PROFILE_STARTUP = "--profile-startup" in sys.argv
+if PROFILE_STARTUP:
+    sys.argv.remove("--profile-startup")
+    startup.enable()
 
 def _load_qt_modules():
     for base in ("PyQt5", "PySide6"):
@@ -16,8 +23,24 @@ def _load_qt_modules():
     raise ImportError("未找到 Qt 绑定，请安装 PyQt5 或 PySide6")
 QtWidgets, QtCore = _load_qt_modules()
 QApplication = QtWidgets.QApplication
+startup.mark("import Qt")
+
+from watermark_app import WatermarkApp
+startup.mark("import watermark_app")
+
+
+def _print_startup_report():
+    """首帧绘制后打印启动耗时"""
+    startup.mark("first event loop pass")
+    startup.finish()
+    print("\n".join(startup.report_lines()), file=sys.stderr)
+
 
 if __name__ == "__main__":
+    # 打包后的程序需由此进入进程池子进程
+    multiprocessing.freeze_support()
+    # 界面进程中有 Qt 与字体扫描等线程，fork 出的导出/校准进程可能死锁，进程池一律用 spawn 启动
+    multiprocessing.set_start_method("spawn", force=True)
     # 高DPI显示支持（必须在创建 QApplication 前设置）
     try:
         QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling)
@@ -27,8 +50,12 @@ if __name__ == "__main__":
 
     app = QApplication(sys.argv)
     app.setApplicationName("WatermarkApp")
+    startup.mark("QApplication")
     window = WatermarkApp()
     window.show()
+    startup.mark("window.show")
+    if PROFILE_STARTUP:
+        QtCore.QTimer.singleShot(0, _print_startup_report)
     # 兼容 PyQt5/PySide6 的事件循环方法，避免对 None 调用
     if hasattr(app, "exec"):
         exit_code = app.exec()
@@ -36,4 +63,4 @@ if __name__ == "__main__":
         exit_code = app.exec_()
     else:
         raise RuntimeError("未找到 QApplication 的事件循环方法: exec/exec_")
-    sys.exit(exit_code)
\ No newline at end of file
+    sys.exit(exit_code)
@@ -18,6 +18,7 @@ class FontSettingsUI:
       host.on_font_selected, host.on_font_size_changed, host.on_font_bold_changed, host.on_font_italic_changed。
     - 构造后会将关键控件引用回填到宿主：
       host.font_combo, host.font_size_spin, host.font_bold_check, host.font_italic_check。
+    - host._available_fonts 在启动时可能仍为空；宿主的后台字体扫描完成后会向 host.font_combo 追加字体项。
     """
 
     def __init__(self, host):
@@ -183,10 +184,11 @@ class FontSettingsUI:
         layout.addWidget(QLabel("阴影:"), 6, 0)
         layout.addWidget(shadow_row, 6, 1)
 
-        # 高清渲染（超采样）
+        # 高清渲染（超采样）；0 为自动：按字体与字号实测选取与 4 倍无可见差异的最低倍数
         layout.addWidget(QLabel("高清渲染倍数:"), 7, 0)
         render_scale_spin = QSpinBox()
-        render_scale_spin.setRange(1, 4)
+        render_scale_spin.setRange(0, 4)
+        render_scale_spin.setSpecialValueText("自动")
         render_scale_spin.setValue(int(getattr(host, "render_scale", 1)))
         render_scale_spin.valueChanged.connect(host.on_render_scale_changed)
         layout.addWidget(render_scale_spin, 7, 1)
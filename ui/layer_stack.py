@@ -0,0 +1,40 @@
+try:
+    from PyQt5.QtWidgets import QGroupBox, QVBoxLayout, QHBoxLayout, QListWidget, QPushButton, QLabel
+except Exception:
+    from PySide6.QtWidgets import QGroupBox, QVBoxLayout, QHBoxLayout, QListWidget, QPushButton, QLabel
+
+
+class LayerStackUI:
+    """多图层叠加子组件（如 Logo + 版权行 + 摄影师署名）。
+
+    - 依赖宿主的事件：host.on_add_layer, host.on_remove_layer, host.on_clear_layers,
+      以及 host._refresh_layer_list 用于根据 host.watermark_layers 刷新列表。
+    - 构造后回填图层列表控件：host.layer_list。
+    """
+
+    def __init__(self, host):
+        self.group = QGroupBox("图层叠加（可选）")
+        layout = QVBoxLayout(self.group)
+
+        hint = QLabel("图层非空时，按列表顺序（底层在前）一次性合成，替代上方单一水印。")
+        hint.setWordWrap(True)
+        layout.addWidget(hint)
+
+        layer_list = QListWidget()
+        layer_list.setMaximumHeight(120)
+        layout.addWidget(layer_list)
+
+        btn_row = QHBoxLayout()
+        add_btn = QPushButton("添加当前为图层")
+        add_btn.clicked.connect(host.on_add_layer)
+        remove_btn = QPushButton("删除选中")
+        remove_btn.clicked.connect(host.on_remove_layer)
+        clear_btn = QPushButton("清空")
+        clear_btn.clicked.connect(host.on_clear_layers)
+        btn_row.addWidget(add_btn)
+        btn_row.addWidget(remove_btn)
+        btn_row.addWidget(clear_btn)
+        layout.addLayout(btn_row)
+
+        host.layer_list = layer_list
+        host._refresh_layer_list()
@@ -65,6 +65,9 @@ class LeftPanel(QWidget):
         export_layout.addWidget(self.export_button)
         export_layout.addWidget(self.export_all_button)
         layout.addLayout(export_layout)
+        self.resume_export_button = QPushButton("继续未完成的导出")
+        self.resume_export_button.clicked.connect(self._host.resume_export)
+        layout.addWidget(self.resume_export_button)
 
     def add_image_item(self, path: str):
         pixmap = QPixmap(path)
@@ -1,13 +1,13 @@
 try:
     from PyQt5.QtWidgets import (
         QWidget, QGroupBox, QVBoxLayout, QHBoxLayout, QLabel, QComboBox,
-        QSlider, QSpinBox, QRadioButton, QLineEdit
+        QSlider, QSpinBox, QRadioButton, QLineEdit, QCheckBox
     )
     from PyQt5.QtCore import Qt
 except Exception:
     from PySide6.QtWidgets import (
         QWidget, QGroupBox, QVBoxLayout, QHBoxLayout, QLabel, QComboBox,
-        QSlider, QSpinBox, QRadioButton, QLineEdit
+        QSlider, QSpinBox, QRadioButton, QLineEdit, QCheckBox
     )
     from PySide6.QtCore import Qt
 
@@ -19,7 +19,8 @@ class OutputSettingsUI:
     - 构造后将关键控件引用回填宿主以保持既有逻辑兼容：
       format_combo, jpeg_quality_container, jpeg_quality_slider, jpeg_quality_value_label,
       resize_container, resize_mode_combo, resize_width_row, resize_height_row, resize_percent_row,
-      resize_width_spin, resize_height_spin, resize_percent_spin,
+      resize_width_spin, resize_height_spin, resize_percent_spin, renditions_input, archive_combo,
+      export_pool_combo, export_workers_spin, stage_metrics_check,
       naming_prefix_radio, naming_suffix_radio, naming_original_radio,
       prefix_input, suffix_input。
     """
@@ -96,6 +97,56 @@ class OutputSettingsUI:
         rp_layout.addWidget(resize_percent_spin)
         resize_v.addWidget(resize_percent_row)
         output_layout.addWidget(resize_container)
+
+        # 多尺寸导出：一次解码输出多个尺寸/格式（留空则按上方单一设置导出）
+        renditions_layout = QHBoxLayout()
+        renditions_layout.addWidget(QLabel("多尺寸导出:"))
+        renditions_input = QLineEdit()
+        renditions_input.setPlaceholderText("如 2048w:jpeg:90:_l, 1024w:jpeg:85:_m, 50%:png")
+        renditions_input.setToolTip("尺寸[:格式[:质量[:后缀]]]，尺寸为 1920w / 1080h / 50% / orig，逗号分隔")
+        if hasattr(host, "_renditions_text"):
+            renditions_input.setText(host._renditions_text())
+        renditions_input.textChanged.connect(host.on_renditions_changed)
+        renditions_layout.addWidget(renditions_input)
+        output_layout.addLayout(renditions_layout)
+
+        # 打包输出：直接流式写入 ZIP（存储模式）或 TAR，不落地单个文件
+        archive_layout = QHBoxLayout()
+        archive_layout.addWidget(QLabel("打包输出:"))
+        archive_combo = QComboBox()
+        archive_combo.addItem("不打包（逐个文件）", "")
+        archive_combo.addItem("ZIP（存储，不压缩）", "zip")
+        archive_combo.addItem("TAR", "tar")
+        idx = archive_combo.findData(getattr(host, "archive_format", ""))
+        archive_combo.setCurrentIndex(idx if idx >= 0 else 0)
+        archive_combo.currentIndexChanged.connect(host.on_archive_format_changed)
+        archive_layout.addWidget(archive_combo)
+        output_layout.addLayout(archive_layout)
+
+        # 导出并发：自动（按校准结果）或手动指定线程/进程及数量
+        concurrency_layout = QHBoxLayout()
+        concurrency_layout.addWidget(QLabel("导出并发:"))
+        export_pool_combo = QComboBox()
+        export_pool_combo.addItem("自动", "auto")
+        export_pool_combo.addItem("多线程", "thread")
+        export_pool_combo.addItem("多进程", "process")
+        idx = export_pool_combo.findData(getattr(host, "export_pool", "auto"))
+        export_pool_combo.setCurrentIndex(idx if idx >= 0 else 0)
+        export_pool_combo.currentIndexChanged.connect(host.on_export_pool_changed)
+        export_workers_spin = QSpinBox()
+        export_workers_spin.setRange(0, 64)
+        export_workers_spin.setSpecialValueText("自动")
+        export_workers_spin.setValue(int(getattr(host, "export_workers", 0)))
+        export_workers_spin.valueChanged.connect(host.on_export_workers_changed)
+        concurrency_layout.addWidget(export_pool_combo)
+        concurrency_layout.addWidget(export_workers_spin)
+        output_layout.addLayout(concurrency_layout)
+
+        # 阶段耗时统计：导出完成时在提示框中列出解码/文字/合成/缩放/编码/写出耗时
+        stage_metrics_check = QCheckBox("统计各阶段耗时")
+        stage_metrics_check.setChecked(bool(getattr(host, "stage_metrics", False)))
+        stage_metrics_check.toggled.connect(host.on_stage_metrics_changed)
+        output_layout.addWidget(stage_metrics_check)
         # 初始显隐
         if hasattr(host, "_update_resize_rows_visibility"):
             host.resize_mode_combo = resize_mode_combo
@@ -151,6 +202,11 @@ class OutputSettingsUI:
         host.resize_width_spin = resize_width_spin
         host.resize_height_spin = resize_height_spin
         host.resize_percent_spin = resize_percent_spin
+        host.renditions_input = renditions_input
+        host.archive_combo = archive_combo
+        host.export_pool_combo = export_pool_combo
+        host.export_workers_spin = export_workers_spin
+        host.stage_metrics_check = stage_metrics_check
         host.naming_prefix_radio = naming_prefix_radio
         host.naming_suffix_radio = naming_suffix_radio
         host.naming_original_radio = naming_original_radio
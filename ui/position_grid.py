@@ -1,14 +1,20 @@
 try:
-    from PyQt5.QtWidgets import QGroupBox, QGridLayout, QPushButton
+    from PyQt5.QtWidgets import (
+        QWidget, QGroupBox, QGridLayout, QHBoxLayout, QLabel, QPushButton, QSpinBox, QCheckBox
+    )
 except Exception:
-    from PySide6.QtWidgets import QGroupBox, QGridLayout, QPushButton
+    from PySide6.QtWidgets import (
+        QWidget, QGroupBox, QGridLayout, QHBoxLayout, QLabel, QPushButton, QSpinBox, QCheckBox
+    )
 
 
 class PositionGridUI:
-    """九宫格位置选择子组件。
+    """九宫格位置选择子组件（含平铺模式）。
 
-    - 依赖宿主的事件：host.on_position_selected（读取 sender.property("position")）。
-    - 构造后提供 group 以加入父布局，并可选回填按钮列表：host.position_buttons。
+    - 依赖宿主的事件：host.on_position_selected（读取 sender.property("position")），
+      host.on_tile_spacing_changed, host.on_tile_stagger_changed。
+    - 构造后提供 group 以加入父布局，并可选回填按钮列表：host.position_buttons；
+      平铺控件：host.tile_spacing_spin, host.tile_stagger_check。
     """
 
     def __init__(self, host):
@@ -30,5 +36,32 @@ class PositionGridUI:
             layout.addWidget(btn, i // 3, i % 3)
             btns.append(btn)
 
+        # 平铺：整图重复水印（配合旋转角度实现斜向平铺）
+        tile_row = QWidget()
+        tile_layout = QHBoxLayout(tile_row)
+        tile_layout.setContentsMargins(0, 0, 0, 0)
+        tile_btn = QPushButton("平铺")
+        tile_btn.setProperty("position", "tile")
+        tile_btn.clicked.connect(host.on_position_selected)
+        tile_btn.setMinimumSize(84, 32)
+        tile_layout.addWidget(tile_btn)
+        btns.append(tile_btn)
+
+        tile_layout.addWidget(QLabel("间距:"))
+        tile_spacing_spin = QSpinBox()
+        tile_spacing_spin.setRange(0, 2000)
+        tile_spacing_spin.setSuffix(" px")
+        tile_spacing_spin.setValue(int(getattr(host, "tile_spacing", 80)))
+        tile_spacing_spin.valueChanged.connect(host.on_tile_spacing_changed)
+        tile_layout.addWidget(tile_spacing_spin)
+
+        tile_stagger_check = QCheckBox("隔行错位")
+        tile_stagger_check.setChecked(bool(getattr(host, "tile_stagger", True)))
+        tile_stagger_check.stateChanged.connect(host.on_tile_stagger_changed)
+        tile_layout.addWidget(tile_stagger_check)
+        layout.addWidget(tile_row, 3, 0, 1, 3)
+
         # 可选：回填按钮列表，便于后续高亮或状态更新
-        host.position_buttons = btns
\ No newline at end of file
+        host.position_buttons = btns
+        host.tile_spacing_spin = tile_spacing_spin
+        host.tile_stagger_check = tile_stagger_check
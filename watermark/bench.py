@@ -0,0 +1,284 @@
+"""Benchmark suite for the processing and export hot paths.
+
+    python -m watermark.bench [inputs...] [--sizes 12,24,50,100] [--repeat 3]
+                              [--only text] [--save-baseline] [--threshold 0.15]
+
+Times `load_font`, `apply_text_watermark` (plain, bold, italic, stroke,
+shadow and render_scale variants), `apply_image_watermark`,
+`resize_image_proportionally` and `save_image` (PNG and JPEG) on every
+input (default: the images in testCases) plus synthetic 12/24/50/100 MP
+photos. Each case reports the median ms per image over `--repeat` runs,
+megapixels per second and the peak RSS reached while it ran.
+
+Inputs are decoded before timing starts and the text run cache is cleared
+before every run, so text cases include rasterization as for an image with
+per-image variables.
+
+Results can be kept as a baseline (``~/.watermark_app/bench_baseline.json``,
+per machine); later runs compare against it and exit with status 3 when a
+case got slower by more than `--threshold`.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from PIL import Image
+
+from .cli import collect_inputs
+from .exporting import resize_image_proportionally, save_image
+from .fonts import clear_font_cache, load_font
+from .processing import apply_image_watermark, apply_text_watermark, clear_run_cache
+from .settings_io import default_settings_path, ensure_parent_dir
+from .tuning import machine_key
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_DEFAULT_INPUTS = [os.path.join(_ROOT, "testCases")]
+_WATERMARK_IMAGE = os.path.join(_ROOT, "testCases", "watermark_sample1.png")
+DEFAULT_SIZES = (12, 24, 50, 100)
+# Slower than baseline by less than this many ms is noise, whatever the ratio
+_MIN_REGRESSION_MS = 1.0
+
+BENCH_TEXT = "© Watermark Bench 水印 2024"
+TEXT_VARIANTS: Dict[str, Dict] = {
+    "plain": {},
+    "bold": {"font_bold": True},
+    "italic": {"font_italic": True},
+    "stroke": {"stroke_width": 3, "stroke_color": "#000000"},
+    "shadow": {"shadow_enabled": True, "shadow_offset": (4, 4), "shadow_color": "#000000"},
+    "render_scale2": {"render_scale": 2},
+    "render_scale4": {"render_scale": 4},
+    "render_auto": {"render_scale": 0},
+}
+
+
+def baseline_path() -> str:
+    return os.path.join(os.path.dirname(default_settings_path()), "bench_baseline.json")
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak-RSS mark for this process (Linux); False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size in MB (since the last `reset_peak_rss` where supported; 0 if unknown)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def synthetic_image(megapixels: int) -> Image.Image:
+    """A 4:3 RGB photo stand-in: gradients plus sensor-like noise (so encoders do real work)."""
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = int(megapixels * 1e6 / height)
+    size = (width, height)
+    noise = Image.effect_noise(size, 48)
+    gradient = Image.linear_gradient("L").resize(size)
+    radial = Image.radial_gradient("L").resize(size)
+    img = Image.merge("RGB", (Image.blend(gradient, noise, 0.35), Image.blend(radial, noise, 0.25),
+                              gradient.transpose(Image.ROTATE_180)))
+    return img
+
+
+def _image_cases(tmp_dir: str) -> List[Tuple[str, Callable[[Image.Image], object]]]:
+    cases: List[Tuple[str, Callable[[Image.Image], object]]] = []
+    for variant, options in TEXT_VARIANTS.items():
+        def text_case(img, options=options):
+            clear_run_cache()
+            return apply_text_watermark(img, BENCH_TEXT, "bottom-right", None, 60, None, 0,
+                                        options.get("font_bold", False), options.get("font_italic", False),
+                                        "#FFFFFF", **{k: v for k, v in options.items()
+                                                      if k not in ("font_bold", "font_italic")})
+        cases.append((f"text.{variant}", text_case))
+    cases.append(("image_watermark", lambda img: apply_image_watermark(
+        img, _WATERMARK_IMAGE, "center", None, 60, scale_percent=50)))
+    cases.append(("resize.percent50", lambda img: resize_image_proportionally(img, "percent", 0, 0, 50)))
+    cases.append(("save_image.png", lambda img: save_image(img, "png", 90, os.path.join(tmp_dir, "out.png"))))
+    cases.append(("save_image.jpeg", lambda img: save_image(img, "jpeg", 90, os.path.join(tmp_dir, "out.jpg"))))
+    return cases
+
+
+def _measure(fn: Callable[[], object], repeat: int) -> Tuple[float, float]:
+    """(median seconds, peak RSS MB) of `repeat` calls."""
+    reset_peak_rss()
+    times = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+        del result
+    return statistics.median(times), peak_rss_mb()
+
+
+def _bench_load_font(repeat: int) -> Dict[str, Dict]:
+    results = {}
+
+    def cold():
+        clear_font_cache()
+        return load_font(48)
+
+    for name, fn in (("load_font.cold", cold), ("load_font.warm", lambda: load_font(48))):
+        seconds, rss = _measure(fn, repeat * 5)
+        results[name] = {"ms": seconds * 1000.0, "mp_per_s": None, "peak_rss_mb": round(rss, 1)}
+    return results
+
+
+def run_suite(
+    inputs: List[str],
+    sizes=DEFAULT_SIZES,
+    repeat: int = 3,
+    only: Optional[str] = None,
+    log: Optional[Callable[[str], None]] = None,
+) -> Dict:
+    """Run every case on every input; returns {"machine", "created", "cases": {key: stats}}.
+
+    Case keys are "<case>@<input label>"; stats are ms (per image), mp_per_s,
+    peak_rss_mb and megapixels.
+    """
+    cases: Dict[str, Dict] = {}
+    if not only or only in "load_font":
+        for name, stats in _bench_load_font(repeat).items():
+            cases[f"{name}@-"] = stats
+            if log is not None:
+                log(_format_row(f"{name}@-", stats))
+    sources: List[Tuple[str, Callable[[], Image.Image]]] = [
+        (os.path.basename(p), lambda p=p: Image.open(p)) for p in inputs
+    ]
+    sources += [(f"synthetic-{mp}MP", lambda mp=mp: synthetic_image(mp)) for mp in sizes]
+    tmp_dir = tempfile.mkdtemp(prefix="wm_bench_")
+    try:
+        image_cases = [(n, fn) for n, fn in _image_cases(tmp_dir) if not only or only in n]
+        for label, make in sources:
+            if not image_cases:
+                break
+            try:
+                img = make()
+                img.load()
+            except Exception as e:
+                if log is not None:
+                    log(f"skipping {label}: {e}")
+                continue
+            megapixels = img.size[0] * img.size[1] / 1e6
+            for name, fn in image_cases:
+                seconds, rss = _measure(lambda: fn(img), repeat)
+                key = f"{name}@{label}"
+                cases[key] = {"ms": seconds * 1000.0, "mp_per_s": megapixels / seconds if seconds > 0 else None,
+                              "peak_rss_mb": round(rss, 1), "megapixels": round(megapixels, 2)}
+                if log is not None:
+                    log(_format_row(key, cases[key]))
+            del img
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return {"machine": machine_key(), "created": time.strftime("%Y-%m-%d %H:%M:%S"), "repeat": repeat,
+            "cases": cases}
+
+
+def load_baseline(path: Optional[str] = None) -> Optional[Dict]:
+    """The saved results for this machine, or None."""
+    try:
+        with open(path or baseline_path(), "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data.get(machine_key()) if isinstance(data, dict) else None
+
+
+def save_baseline(results: Dict, path: Optional[str] = None) -> str:
+    path = path or baseline_path()
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            data = {}
+    except (OSError, ValueError):
+        data = {}
+    data[results["machine"]] = results
+    ensure_parent_dir(path)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+    return path
+
+
+def compare(results: Dict, baseline: Dict, threshold: float = 0.15) -> List[Tuple[str, float, float]]:
+    """Cases slower than the baseline by more than `threshold`: [(key, baseline ms, ms)]."""
+    regressions = []
+    base_cases = baseline.get("cases", {})
+    for key, stats in results["cases"].items():
+        base = base_cases.get(key)
+        if not base:
+            continue
+        if stats["ms"] > base["ms"] * (1.0 + threshold) and stats["ms"] - base["ms"] > _MIN_REGRESSION_MS:
+            regressions.append((key, base["ms"], stats["ms"]))
+    return regressions
+
+
+def _format_row(key: str, stats: Dict) -> str:
+    mp_s = f"{stats['mp_per_s']:8.1f}" if stats.get("mp_per_s") else "       -"
+    return f"{key:<48} {stats['ms']:10.2f} ms {mp_s} MP/s {stats['peak_rss_mb']:8.1f} MB"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m watermark.bench", description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="*", help="image files or folders (default: testCases)")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="synthetic image sizes in megapixels, comma separated; empty for none (default: 12,24,50,100)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the median is reported (default: 3)")
+    parser.add_argument("--only", help="only cases whose name contains this, e.g. text or save_image")
+    parser.add_argument("--baseline", help=f"baseline file (default: {baseline_path()})")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="flag cases slower than the baseline by more than this fraction (default: 0.15)")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    inputs = collect_inputs(args.inputs or _DEFAULT_INPUTS)
+    print(f"{len(inputs)} inputs + synthetic {sizes} MP, repeat {args.repeat}, machine {machine_key()}")
+    print(f"{'case@input':<48} {'per image':>13} {'':>13} {'peak RSS':>11}")
+    results = run_suite(inputs, sizes, args.repeat, args.only, log=print)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    status = 0
+    baseline = load_baseline(args.baseline)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        print(f"baseline from {baseline.get('created', '?')}: {len(regressions)} regression(s) "
+              f"over {args.threshold:.0%}")
+        for key, base_ms, ms in regressions:
+            print(f"REGRESSION {key}: {base_ms:.2f} ms -> {ms:.2f} ms ({(ms / base_ms - 1.0) * 100.0:+.1f}%)")
+        if regressions:
+            status = 3
+    elif not args.save_baseline:
+        print("no baseline for this machine yet; run with --save-baseline to create one")
+    if args.save_baseline:
+        print(f"baseline saved to {save_baseline(results, args.baseline)}")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
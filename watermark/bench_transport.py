@@ -0,0 +1,87 @@
+"""Benchmark: shared-memory vs pickled image transport on a process pool.
+
+    python -m watermark.bench_transport [inputs...] [-w 8] [--repeat 4]
+
+Two measurements per transport, on the same input list (default: testCases):
+
+- ``transfer``: workers decode each image and hand the decoded pixels to the
+  parent, which maps them; isolates the cost of moving pixels.
+- ``export``: a full `export_images(workers=N)` run into a temporary folder.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from .cli import collect_inputs
+from .engine import export_images, open_oriented
+from .shm import SharedImage
+from .templates_io import normalize_template_fields
+
+_DEFAULT_INPUTS = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "testCases")]
+
+
+def _decode_task(path: str, transport: str):
+    img, _ = open_oriented(path)
+    img = img.convert("RGBA")
+    if transport == "shm":
+        return SharedImage.from_image(img).detach()
+    return img
+
+
+def bench_transfer(paths: List[str], workers: int, transport: str) -> Dict[str, float]:
+    megapixels = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(abs, range(workers)))  # start the workers outside the timed region
+        start = time.perf_counter()
+        for result in pool.map(_decode_task, paths, [transport] * len(paths)):
+            if transport == "shm":
+                shared = SharedImage.attach(result)
+                img = shared.image()
+                megapixels += img.size[0] * img.size[1] / 1e6
+                del img  # release the view before unmapping
+                shared.unlink()
+            else:
+                megapixels += result.size[0] * result.size[1] / 1e6
+        elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "images_per_s": len(paths) / elapsed, "mp_per_s": megapixels / elapsed}
+
+
+def bench_export(paths: List[str], workers: int, transport: str, tpl: Dict) -> Dict[str, float]:
+    out = tempfile.mkdtemp(prefix="wm_bench_")
+    try:
+        start = time.perf_counter()
+        report = export_images(paths, out, tpl, incremental=False, workers=workers, transport=transport)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(out, ignore_errors=True)
+    return {"seconds": elapsed, "images_per_s": len(paths) / elapsed, "failed": len(report["failed"])}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m watermark.bench_transport", description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="*", help="image files or folders (default: testCases)")
+    parser.add_argument("-w", "--workers", type=int, default=8, help="worker processes (default: 8)")
+    parser.add_argument("--repeat", type=int, default=4, help="repeat the input list N times (default: 4)")
+    parser.add_argument("--format", choices=["png", "jpeg"], default="jpeg", help="export format (default: jpeg)")
+    args = parser.parse_args(argv)
+
+    paths = collect_inputs(args.inputs or _DEFAULT_INPUTS) * max(1, args.repeat)
+    if not paths:
+        print("no supported images found")
+        return 1
+    tpl = normalize_template_fields({"text": "© Bench {filename}", "format": args.format, "position": "tile"})
+    print(f"{len(paths)} images, {args.workers} workers")
+    for transport in ("pickle", "shm"):
+        t = bench_transfer(paths, args.workers, transport)
+        e = bench_export(paths, args.workers, transport, tpl)
+        print(f"{transport:>6}  transfer {t['seconds']:.3f}s ({t['mp_per_s']:.0f} MP/s)   "
+              f"export {e['seconds']:.3f}s ({e['images_per_s']:.1f} img/s, failed {e['failed']})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
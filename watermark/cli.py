@@ -0,0 +1,285 @@
+"""Headless command line interface: `python -m watermark export ...`."""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+from . import instrument, memprof
+from .engine import export_images, resume_export
+from .journal import load_job
+from .media import is_supported_image, scan_directory_for_images
+from .parallel import parse_size
+from .renditions import parse_rendition_spec
+from .settings_io import read_settings
+from .templates_io import find_template, normalize_template_fields, template_from_settings
+from .tuning import resolve_concurrency
+from .watch import HotFolder
+
+
+def collect_inputs(inputs: List[str]) -> List[str]:
+    """Expand files and folders into a de-duplicated list of supported images."""
+    paths: List[str] = []
+    seen = set()
+    for item in inputs:
+        found = scan_directory_for_images(item) if os.path.isdir(item) else [item]
+        for p in found:
+            if is_supported_image(p) and p not in seen:
+                paths.append(p)
+                seen.add(p)
+    return paths
+
+
+def resolve_template(name: Optional[str], settings_path: Optional[str] = None) -> Dict:
+    """Load template `name` from the settings file, or the last-session settings."""
+    settings = read_settings(settings_path) or {}
+    if name:
+        tpl = find_template(settings.get("templates", []), name)
+        if tpl is None:
+            raise SystemExit(f"template not found: {name}")
+        return normalize_template_fields(tpl)
+    return template_from_settings(settings)
+
+
+def _apply_overrides(tpl: Dict, args: argparse.Namespace) -> Dict:
+    if args.text is not None:
+        tpl["text"] = args.text
+        tpl["layers"] = []
+    if args.format:
+        tpl["format"] = args.format
+    if args.rendition:
+        tpl["renditions"] = [parse_rendition_spec(spec) for spec in args.rendition]
+    return tpl
+
+
+def _progress_printer(args: argparse.Namespace):
+    def _progress(done: int, total: int, path: str) -> None:
+        if not args.quiet:
+            print(f"[{done}/{total}] {path}")
+    return _progress
+
+
+def _print_report(report: Dict) -> int:
+    for path, err in report["failed"]:
+        print(f"failed: {path}: {err}", file=sys.stderr)
+    print(f"exported {len(report['exported'])}, skipped {len(report['skipped'])} unchanged, failed {len(report['failed'])}")
+    io_stats = report.get("io")
+    if io_stats and io_stats.get("files_read_ahead"):
+        print(f"read-ahead: {io_stats['files_read_ahead']} files, {io_stats['bytes_read_ahead'] / 1e6:.1f} MB, "
+              f"stalled {io_stats['stall_seconds']:.2f}s ({io_stats['misses']} misses)")
+    timing, write = report.get("timing"), report.get("write")
+    if timing and timing.get("images"):
+        print(f"compute: {timing['images']} images in {timing['compute_seconds']:.2f}s "
+              f"({timing['images_per_s']:.1f} img/s)")
+    if write and write.get("files"):
+        fsyncs = f", {write['fsyncs']} fsync batches" if write["fsyncs"] else ""
+        print(f"write: {write['files']} files, {write['bytes'] / 1e6:.1f} MB in {write['write_seconds']:.2f}s "
+              f"({write['write_mb_per_s']:.1f} MB/s){fsyncs}; render stalled on writer "
+              f"{write['stall_seconds']:.2f}s, final flush {write['drain_seconds']:.2f}s")
+    return 0 if not report["failed"] else 2
+
+
+def _workers_arg(text: str):
+    return "auto" if text == "auto" else max(1, int(text))
+
+
+def _concurrency(args: argparse.Namespace, paths: List[str], tpl: Dict) -> Dict:
+    """Export keyword arguments: the pool chosen by flags, cache or calibration, and the I/O flags."""
+    log = None if args.quiet else print
+    pool, workers, source = resolve_concurrency(paths, tpl, args.workers, args.pool, args.recalibrate, log)
+    if not args.quiet:
+        print(f"concurrency: {pool} x{workers} ({source})")
+    return {"pool": pool, "workers": workers, "transport": args.transport, "memory_budget": args.memory_budget,
+            "read_ahead": args.read_ahead, "read_ahead_bytes": args.read_ahead_bytes,
+            "write_behind": not args.no_write_behind, "fsync_every": args.fsync_every,
+            "fsync_interval": args.fsync_interval}
+
+
+def _start_stage_metrics(args: argparse.Namespace) -> None:
+    # After calibration, so its trial exports are not counted
+    if args.stage_metrics or args.metrics_out:
+        instrument.reset()
+        instrument.enable()
+    if args.memory_profile or args.memory_out:
+        memprof.reset()
+        memprof.enable()
+
+
+def _finish_stage_metrics(args: argparse.Namespace, report: Dict) -> None:
+    stages = report.get("stages")
+    if stages and args.stage_metrics:
+        print("stages:")
+        for line in instrument.summary_lines(stages):
+            print("  " + line)
+    if stages and args.metrics_out:
+        instrument.dump(args.metrics_out, stages)
+    memory = report.get("memory")
+    if memory and args.memory_profile:
+        for line in memprof.report_lines(memory):
+            print(line)
+    if memory and args.memory_out:
+        with open(args.memory_out, "w") as f:
+            json.dump(memory, f, indent=2, ensure_ascii=False)
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    tpl = _apply_overrides(resolve_template(args.template, args.settings), args)
+    paths = collect_inputs(args.inputs)
+    if not paths:
+        print("no supported images found", file=sys.stderr)
+        return 1
+    options = _concurrency(args, paths, tpl)
+    _start_stage_metrics(args)
+    report = export_images(paths, args.output, tpl, progress=_progress_printer(args),
+                           incremental=not args.force, archive=args.archive, **options)
+    _finish_stage_metrics(args, report)
+    return _print_report(report)
+
+
+def cmd_resume(args: argparse.Namespace) -> int:
+    job = load_job(args.output)
+    if job is None:
+        print(f"no export job to resume in {args.output}", file=sys.stderr)
+        return 1
+    remaining = [p for _, p in job["pending"]]
+    options = _concurrency(args, remaining, job["template"])
+    _start_stage_metrics(args)
+    report = resume_export(args.output, progress=_progress_printer(args), incremental=not args.force, **options)
+    if report is None:
+        print(f"no export job to resume in {args.output}", file=sys.stderr)
+        return 1
+    _finish_stage_metrics(args, report)
+    return _print_report(report)
+
+
+def cmd_watch(args: argparse.Namespace) -> int:
+    tpl = _apply_overrides(resolve_template(args.template, args.settings), args)
+    folders = [p for p in args.inputs if os.path.isdir(p)]
+    if not folders:
+        print("watch needs at least one input folder", file=sys.stderr)
+        return 1
+    hot = HotFolder(folders, args.output, tpl, workers=args.workers, settle=args.settle,
+                    poll=args.poll, interval=args.interval, metrics_interval=args.metrics_interval)
+    print(f"watching {', '.join(folders)} -> {args.output} (Ctrl+C to stop)")
+    hot.run()
+    return 0
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    from .service import WatermarkService
+
+    service = WatermarkService(args.host, args.port, workers=args.workers, queue_size=args.queue,
+                               settings_path=args.settings, batch_size=args.batch)
+    host, port = service.address
+    print(f"serving on http://{host}:{port} (POST /watermark, GET /metrics; Ctrl+C to stop)")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m watermark", description="Batch watermarking without the GUI.")
+    sub = parser.add_subparsers(dest="command")
+
+    p_export = sub.add_parser("export", help="watermark and export images")
+    p_export.add_argument("inputs", nargs="+", help="image files or folders")
+    p_export.add_argument("-o", "--output", required=True, help="output folder")
+    p_export.add_argument("-t", "--template", help="saved template name (default: last session settings)")
+    p_export.add_argument("--settings", help="settings JSON path (default: ~/.watermark_app/settings.json)")
+    p_export.add_argument("--text", help="override watermark text; supports {filename} {name} {ext} {index} {width} {height} {date_taken} {camera}")
+    p_export.add_argument("--format", choices=["png", "jpeg"], help="override output format")
+    p_export.add_argument("-r", "--rendition", action="append", metavar="SPEC",
+                          help="export rendition SIZE[:FORMAT[:QUALITY[:SUFFIX]]], e.g. 2048w:jpeg:90:_l (repeatable)")
+    p_export.add_argument("-a", "--archive", metavar="NAME.zip|NAME.tar",
+                          help="stream outputs into one archive in the output folder (zip is stored, not recompressed)")
+    p_export.add_argument("-j", "--workers", type=_workers_arg, default="auto",
+                          help="parallel workers, or 'auto' to use the calibrated choice (default: auto)")
+    p_export.add_argument("--pool", choices=["auto", "thread", "process"], default="auto",
+                          help="worker pool type (default: auto, chosen by calibration)")
+    p_export.add_argument("--recalibrate", action="store_true", help="re-measure thread/process throughput for this batch")
+    p_export.add_argument("--transport", choices=["shm", "pickle"], default="shm",
+                          help="how pixels move between processes (default: shared memory)")
+    p_export.add_argument("--memory-budget", type=parse_size, metavar="SIZE",
+                          help="max estimated image memory in flight with -j, e.g. 4G (default: half of RAM, 0 = no cap)")
+    p_export.add_argument("--read-ahead", type=int, default=4, metavar="N",
+                          help="load the next N inputs in the background (default: 4, 0 = off)")
+    p_export.add_argument("--read-ahead-bytes", type=parse_size, metavar="SIZE",
+                          help="max input bytes held by read-ahead, e.g. 512M (default: 256M)")
+    p_export.add_argument("--no-write-behind", action="store_true",
+                          help="write each output in the export loop instead of on a background writer thread")
+    p_export.add_argument("--fsync-every", type=int, default=0, metavar="N",
+                          help="fsync written outputs in batches of N files (default: 0 = no fsync)")
+    p_export.add_argument("--fsync-interval", type=float, default=0.0, metavar="SEC",
+                          help="fsync written outputs at least every SEC seconds (default: 0 = no fsync)")
+    p_export.add_argument("--stage-metrics", action="store_true",
+                          help="time every pipeline stage (decode, text, composite, resize, encode, write) and print a summary")
+    p_export.add_argument("--metrics-out", metavar="PATH",
+                          help="write stage histograms to PATH: Prometheus text for .prom/.txt, JSON otherwise")
+    p_export.add_argument("--memory-profile", action="store_true",
+                          help="record peak memory per stage and image (tracemalloc + RSS sampling) and print the top offenders")
+    p_export.add_argument("--memory-out", metavar="PATH", help="write the memory profile as JSON to PATH")
+    p_export.add_argument("-f", "--force", action="store_true", help="re-export inputs even if the output manifest says they are unchanged")
+    p_export.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    p_export.set_defaults(func=cmd_export)
+
+    p_watch = sub.add_parser("watch", help="export new images dropped into folders as they arrive")
+    p_watch.add_argument("inputs", nargs="+", help="folders to watch (recursively)")
+    p_watch.add_argument("-o", "--output", required=True, help="output folder")
+    p_watch.add_argument("-t", "--template", help="saved template name (default: last session settings)")
+    p_watch.add_argument("--settings", help="settings JSON path (default: ~/.watermark_app/settings.json)")
+    p_watch.add_argument("--text", help="override watermark text")
+    p_watch.add_argument("--format", choices=["png", "jpeg"], help="override output format")
+    p_watch.add_argument("-r", "--rendition", action="append", metavar="SPEC", help="export rendition (repeatable)")
+    p_watch.add_argument("-w", "--workers", type=int, help="export threads (default: min(4, CPUs))")
+    p_watch.add_argument("--settle", type=float, default=2.0, help="seconds a file must stay unchanged before export")
+    p_watch.add_argument("--poll", action="store_true", help="poll instead of using inotify")
+    p_watch.add_argument("--interval", type=float, default=1.0, help="polling/check interval in seconds")
+    p_watch.add_argument("--metrics-interval", type=float, default=10.0, help="seconds between metrics lines")
+    p_watch.set_defaults(func=cmd_watch)
+
+    p_serve = sub.add_parser("serve", help="run the local HTTP watermarking service")
+    p_serve.add_argument("--host", default="127.0.0.1", help="bind address (default: 127.0.0.1)")
+    p_serve.add_argument("--port", type=int, default=8765, help="port (default: 8765)")
+    p_serve.add_argument("-w", "--workers", type=int, help="render processes (default: CPU count)")
+    p_serve.add_argument("--queue", type=int, default=32, help="max requests in progress before answering 503")
+    p_serve.add_argument("--settings", help="settings JSON path with saved templates")
+    p_serve.add_argument("--batch", type=int, default=8,
+                         help="max small requests sent to a worker together (1 disables batching)")
+    p_serve.set_defaults(func=cmd_serve)
+
+    p_resume = sub.add_parser("resume", help="continue an interrupted export in an output folder")
+    p_resume.add_argument("output", help="output folder of the interrupted export")
+    p_resume.add_argument("-j", "--workers", type=_workers_arg, default="auto", help="parallel workers or 'auto'")
+    p_resume.add_argument("--pool", choices=["auto", "thread", "process"], default="auto", help="worker pool type")
+    p_resume.add_argument("--recalibrate", action="store_true", help="re-measure thread/process throughput")
+    p_resume.add_argument("--transport", choices=["shm", "pickle"], default="shm", help="process transport")
+    p_resume.add_argument("--memory-budget", type=parse_size, metavar="SIZE", help="max image memory in flight, e.g. 4G")
+    p_resume.add_argument("--read-ahead", type=int, default=4, metavar="N", help="inputs loaded ahead (0 = off)")
+    p_resume.add_argument("--read-ahead-bytes", type=parse_size, metavar="SIZE", help="max bytes held by read-ahead")
+    p_resume.add_argument("--no-write-behind", action="store_true", help="write outputs in the export loop")
+    p_resume.add_argument("--fsync-every", type=int, default=0, metavar="N", help="fsync outputs every N files")
+    p_resume.add_argument("--fsync-interval", type=float, default=0.0, metavar="SEC",
+                          help="fsync outputs every SEC seconds")
+    p_resume.add_argument("--stage-metrics", action="store_true", help="print per-stage timings")
+    p_resume.add_argument("--metrics-out", metavar="PATH", help="write stage histograms (.prom or JSON)")
+    p_resume.add_argument("--memory-profile", action="store_true", help="print peak memory per stage and image")
+    p_resume.add_argument("--memory-out", metavar="PATH", help="write the memory profile as JSON")
+    p_resume.add_argument("-f", "--force", action="store_true", help="ignore the output manifest for remaining inputs")
+    p_resume.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    p_resume.set_defaults(func=cmd_resume)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 1
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
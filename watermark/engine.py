@@ -0,0 +1,391 @@
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from PIL import Image
+
+from .layers import apply_layers, layer_from_template, scale_layer
+from . import instrument, memprof
+from .exporting import resize_image_proportionally
+from .journal import JobJournal, load_job
+from .manifest import ExportManifest
+from .media import make_output_basename
+from .metadata import apply_orientation, image_metadata, read_metadata
+from .prefetch import ReadAhead, close_buffer
+from .renditions import plan_renditions
+from .sinks import ArchiveSink, DirectorySink, WriteBehindSink
+from .variables import build_context
+
+
+def template_layers(tpl: Dict) -> List[Dict]:
+    """Return the layer stack of a template; a template without layers is one layer."""
+    layers = tpl.get("layers") or []
+    return list(layers) if layers else [layer_from_template(tpl)]
+
+
+def render_watermarked(
+    img: Image.Image,
+    tpl: Dict,
+    context: Optional[Dict[str, Any]] = None,
+    scale: float = 1.0,
+    stamps: Optional[List[Optional[Image.Image]]] = None,
+) -> Image.Image:
+    """Apply the watermark(s) described by template fields `tpl` to `img`.
+
+    - `scale`: size of `img` relative to the original; pixel-sized watermark
+      fields are scaled to match (used for renditions).
+    - `stamps`: prepared stamps per layer (see `layers.apply_layers`).
+    """
+    layers = template_layers(tpl)
+    if scale != 1.0:
+        layers = [scale_layer(layer, scale) for layer in layers]
+    return apply_layers(img, layers, context, stamps)
+
+
+def output_path_for(input_path: str, output_dir: str, tpl: Dict, extra_suffix: str = "") -> str:
+    """Build the output file path from the template's naming rule and format."""
+    filename = os.path.basename(input_path)
+    output_name = make_output_basename(filename, tpl.get("naming", "original"), tpl.get("prefix", ""), tpl.get("suffix", ""))
+    ext = "jpg" if str(tpl.get("format", "png")).lower() == "jpeg" else "png"
+    return os.path.join(output_dir, f"{output_name}{extra_suffix}.{ext}")
+
+
+def open_oriented(input_path: str, index: int = 1, data=None):
+    """Open an input upright and build its text-variable context.
+
+    `data` is an optional seekable buffer holding the file's bytes (see
+    `prefetch.ReadAhead`); the image is then decoded from it right away so
+    the caller can release the buffer.
+    """
+    with instrument.stage("decode"):
+        if data is None:
+            meta = read_metadata(input_path)
+            src = Image.open(input_path)
+        else:
+            src = Image.open(data)
+            meta = image_metadata(src)
+        src.load()
+        img = apply_orientation(src, meta["orientation"])
+    return img, build_context(input_path, index, img, meta)
+
+
+def export_renditions(input_path: str, output_dir: str, tpl: Dict, index: int = 1, sink=None,
+                      data=None) -> List[str]:
+    """Decode `input_path` once and write every rendition of `tpl["renditions"]`.
+
+    Sizes are processed largest first; each unwatermarked intermediate is
+    resized from the previous (larger) one, watermarked at its own scale and
+    encoded once per rendition sharing that size.
+    """
+    sink = sink or DirectorySink()
+    img, context = open_oriented(input_path, index, data)
+    orig_w = img.size[0]
+    outputs: List[str] = []
+    source = img
+    for size, group in plan_renditions(img.size, tpl.get("renditions") or []):
+        if source.size[0] < size[0] or source.size[1] < size[1]:
+            source = img
+        scaled = source if source.size == size else source.resize(size, Image.LANCZOS)
+        # Only downscaled intermediates feed the next (smaller) rendition
+        source = scaled if scaled.size[0] <= img.size[0] else img
+        watermarked = render_watermarked(scaled, tpl, context, scale=size[0] / float(orig_w or 1))
+        rgb = None
+        for r in group:
+            out_tpl = dict(tpl, format=r["format"])
+            output_path = output_path_for(input_path, output_dir, out_tpl, r["suffix"])
+            if r["format"] == "jpeg":
+                # Shared RGB buffer for all JPEG renditions of this size
+                rgb = rgb if rgb is not None else watermarked.convert("RGB")
+                output_path = sink.write(rgb, "jpeg", r["jpeg_quality"], output_path)
+            else:
+                output_path = sink.write(watermarked, "png", r["jpeg_quality"], output_path)
+            outputs.append(output_path)
+    return outputs
+
+
+def export_one(input_path: str, output_dir: str, tpl: Dict, index: int = 1, sink=None, data=None) -> str:
+    """Watermark, resize and save one image (to `sink`, default a file); returns the output path."""
+    output_path = output_path_for(input_path, output_dir, tpl)
+    img, context = open_oriented(input_path, index, data)
+    watermarked_img = render_watermarked(img, tpl, context)
+    watermarked_img = resize_image_proportionally(
+        watermarked_img,
+        mode=tpl.get("resize_mode", "none"),
+        resize_width=int(tpl.get("resize_width", 0)),
+        resize_height=int(tpl.get("resize_height", 0)),
+        resize_percent=int(tpl.get("resize_percent", 0)),
+    )
+    return (sink or DirectorySink()).write(
+        watermarked_img,
+        output_format=tpl.get("format", "png"),
+        jpeg_quality=int(tpl.get("jpeg_quality", 90)),
+        output_path=output_path,
+    )
+
+
+def export_images(
+    paths: List[str],
+    output_dir: str,
+    tpl: Dict,
+    progress: Optional[Callable[[int, int, str], None]] = None,
+    incremental: bool = True,
+    archive: Optional[str] = None,
+    workers: int = 1,
+    transport: str = "shm",
+    memory_budget: Optional[int] = None,
+    pool: str = "process",
+    read_ahead: int = 4,
+    read_ahead_bytes: Optional[int] = None,
+    write_behind: bool = True,
+    fsync_every: int = 0,
+    fsync_interval: float = 0.0,
+) -> Dict[str, Any]:
+    """Export a batch of images with template fields `tpl`.
+
+    With a non-empty `tpl["renditions"]` every input is decoded once and
+    written in all rendition sizes/formats. Progress is journaled in the
+    output folder so an interrupted batch can be continued with `resume_export`.
+
+    - `progress(done, total, path)` is called after each input.
+    - `incremental`: skip inputs whose size/mtime and settings match the
+      output folder's manifest and whose outputs still exist.
+    - `archive`: stream all outputs into this .zip/.tar file (relative paths
+      are inside `output_dir`) instead of writing individual files. Archive
+      exports are always complete rebuilds: no manifest and no journal.
+    - `workers`: > 1 renders on a pool; `pool` is "process" (see
+      `parallel.ProcessExporter`, `transport` "shm" or "pickle" selects how
+      pixels reach the workers) or "thread" (`parallel.ThreadExporter`).
+      `tuning.resolve_concurrency` picks both from a calibration run.
+      Inputs are then scheduled largest-first, and `memory_budget` (bytes;
+      None = half of RAM, 0 = unlimited) caps the images decoded at once.
+    - `read_ahead`: number of upcoming inputs whose bytes are loaded in the
+      background (`prefetch.ReadAhead`), at most `read_ahead_bytes` bytes
+      (None = 256 MB); 0 reads each file when its turn comes.
+    - `write_behind`: files are written by a background thread
+      (`sinks.WriteBehindSink`); an input is journaled and recorded in the
+      manifest only once its outputs are on disk. `fsync_every` files or
+      `fsync_interval` seconds (0 = never) fsyncs written outputs in batches.
+    Returns a report dict: {"exported": [...output paths], "skipped": [...input paths],
+    "failed": [(path, error)], "io": read-ahead counters, "timing": compute
+    time, "write": writer counters (empty without write-behind), "stages":
+    stage histograms when `instrument` is enabled, "memory": peaks per stage
+    and image when `memprof` is enabled}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    items = [(i + 1, p) for i, p in enumerate(paths)]
+    if archive:
+        sink = ArchiveSink(os.path.join(output_dir, archive))
+        return _with_sink(sink, lambda: _run_batch(items, output_dir, tpl, None, progress, False, sink, workers,
+                                                   transport, memory_budget, pool, read_ahead, read_ahead_bytes))
+    journal = JobJournal(output_dir)
+    journal.start(paths, tpl)
+    sink = WriteBehindSink(fsync_every=fsync_every, fsync_interval=fsync_interval) if write_behind else None
+    return _with_sink(sink, lambda: _run_batch(items, output_dir, tpl, journal, progress, incremental, sink,
+                                               workers, transport, memory_budget, pool, read_ahead,
+                                               read_ahead_bytes))
+
+
+def resume_export(
+    output_dir: str,
+    progress: Optional[Callable[[int, int, str], None]] = None,
+    incremental: bool = True,
+    workers: int = 1,
+    transport: str = "shm",
+    memory_budget: Optional[int] = None,
+    pool: str = "process",
+    read_ahead: int = 4,
+    read_ahead_bytes: Optional[int] = None,
+    write_behind: bool = True,
+    fsync_every: int = 0,
+    fsync_interval: float = 0.0,
+) -> Optional[Dict[str, Any]]:
+    """Continue the journaled batch in `output_dir` where it stopped.
+
+    Items already completed are not touched; failed items are retried with
+    their original batch index. Returns None when the folder has no job,
+    otherwise the same report as `export_images` for the remaining items.
+    """
+    job = load_job(output_dir)
+    if job is None:
+        return None
+    journal = JobJournal(output_dir)
+    journal.reopen()
+    sink = WriteBehindSink(fsync_every=fsync_every, fsync_interval=fsync_interval) if write_behind else None
+    return _with_sink(sink, lambda: _run_batch(job["pending"], output_dir, job["template"], journal, progress,
+                                               incremental, sink, workers, transport, memory_budget, pool,
+                                               read_ahead, read_ahead_bytes))
+
+
+def _with_sink(sink, run: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Run a batch and close `sink` after it, discarding its output on errors."""
+    if sink is None:
+        return run()
+    try:
+        report = run()
+    except BaseException:
+        sink.abort()
+        raise
+    sink.close()
+    return report
+
+
+def _run_batch(
+    items: List[Tuple[int, str]],
+    output_dir: str,
+    tpl: Dict,
+    journal: Optional[JobJournal],
+    progress: Optional[Callable[[int, int, str], None]],
+    incremental: bool,
+    sink=None,
+    workers: int = 1,
+    transport: str = "shm",
+    memory_budget: Optional[int] = None,
+    pool: str = "process",
+    read_ahead: int = 4,
+    read_ahead_bytes: Optional[int] = None,
+) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"exported": [], "skipped": [], "failed": [], "io": {}, "timing": {}, "write": {},
+                              "stages": {}, "memory": {}}
+    manifest = ExportManifest(output_dir, tpl) if incremental else None
+    total = len(items)
+    done = 0
+    keys: Dict[int, Optional[str]] = {}
+    todo: List[Tuple[int, str]] = []
+    skipped: List[int] = []
+    # Write-behind: inputs whose outputs are still queued, {index: (path, outputs, outputs not yet written)}
+    deferred = isinstance(sink, WriteBehindSink)
+    waiting: Dict[int, Tuple[str, List[str], Set[str]]] = {}
+    owner: Dict[str, int] = {}
+
+    def succeeded(index: int, input_path: str, outputs: List[str]) -> None:
+        report["exported"].extend(outputs)
+        if journal is not None:
+            journal.done(index, outputs)
+        if manifest is not None:
+            # Appended to the manifest's delta log, so a killed export still skips what it finished
+            manifest.record(input_path, keys[index], outputs)
+
+    def failed(index: int, input_path: str, error: str) -> None:
+        report["failed"].append((input_path, error))
+        if journal is not None:
+            journal.failed(index, error)
+
+    def settle() -> None:
+        written, errors = sink.completed()
+        for out in written + list(errors):
+            index = owner.pop(out, None)
+            if index is None or index not in waiting:
+                continue
+            input_path, outputs, left = waiting[index]
+            if out in errors:
+                del waiting[index]
+                failed(index, input_path, errors[out])
+                continue
+            left.discard(out)
+            if not left:
+                del waiting[index]
+                succeeded(index, input_path, outputs)
+
+    try:
+        for index, input_path in items:
+            key = manifest.key_for(input_path, index) if manifest is not None else None
+            if manifest is not None and manifest.is_current(input_path, key):
+                report["skipped"].append(input_path)
+                skipped.append(index)
+                done += 1
+                if progress is not None:
+                    progress(done, total, input_path)
+            else:
+                keys[index] = key
+                todo.append((index, input_path))
+        if journal is not None:
+            # One journal line (and fsync) for all unchanged inputs
+            journal.skipped(skipped)
+        start = time.perf_counter()
+        results = _export_items(todo, output_dir, tpl, sink, workers, transport, memory_budget, pool,
+                                read_ahead, read_ahead_bytes, report["io"])
+        for index, input_path, outputs, error in results:
+            left = sink.outstanding(outputs) if deferred and error is None else None
+            if error is not None:
+                failed(index, input_path, error)
+            elif left:
+                waiting[index] = (input_path, outputs, left)
+                owner.update((out, index) for out in left)
+            else:
+                succeeded(index, input_path, outputs)
+            if deferred:
+                settle()
+            done += 1
+            if progress is not None:
+                progress(done, total, input_path)
+        compute_seconds = time.perf_counter() - start
+        report["timing"] = {"images": len(todo), "compute_seconds": compute_seconds,
+                            "images_per_s": len(todo) / compute_seconds if compute_seconds > 0 else 0.0}
+        if deferred:
+            sink.flush()
+            settle()
+            report["write"] = sink.stats()
+        if instrument.is_enabled():
+            report["stages"] = instrument.snapshot()
+        if memprof.is_enabled():
+            report["memory"] = memprof.snapshot()
+        if journal is not None:
+            journal.finish()
+    finally:
+        if journal is not None:
+            journal.close()
+        if manifest is not None:
+            manifest.save()
+    return report
+
+
+def _export_items(items: List[Tuple[int, str]], output_dir: str, tpl: Dict, sink, workers: int, transport: str,
+                  memory_budget: Optional[int] = None, pool: str = "process", read_ahead: int = 0,
+                  read_ahead_bytes: Optional[int] = None, io_stats: Optional[Dict[str, Any]] = None):
+    """Yield (index, path, outputs, error) for each item, in-process or on a thread/process pool.
+
+    Read-ahead counters are stored in `io_stats` once the items are done.
+    """
+    if workers > 1 and len(items) > 1 and pool == "thread":
+        from .parallel import ThreadExporter
+
+        exporter = ThreadExporter(output_dir, tpl, workers, sink=sink, memory_budget=memory_budget,
+                                  read_ahead=read_ahead, read_ahead_bytes=read_ahead_bytes)
+        try:
+            yield from exporter.run(items)
+        finally:
+            if io_stats is not None:
+                io_stats.update(exporter.io_stats)
+        return
+    if workers > 1 and len(items) > 1 and not (tpl.get("renditions") and isinstance(sink, ArchiveSink)):
+        from .parallel import ProcessExporter
+
+        exporter = ProcessExporter(output_dir, tpl, workers, transport, sink=sink, memory_budget=memory_budget,
+                                   read_ahead=read_ahead, read_ahead_bytes=read_ahead_bytes)
+        try:
+            yield from exporter.run(items)
+        finally:
+            if io_stats is not None:
+                io_stats.update(exporter.io_stats)
+        return
+    prefetch = ReadAhead([p for _, p in items], read_ahead, read_ahead_bytes) if read_ahead > 0 else None
+    try:
+        for index, input_path in items:
+            data = None
+            try:
+                data = prefetch.get(input_path) if prefetch is not None else None
+                with memprof.image(input_path), instrument.stage("image_total"):
+                    if tpl.get("renditions"):
+                        outputs = export_renditions(input_path, output_dir, tpl, index=index, sink=sink, data=data)
+                    else:
+                        outputs = [export_one(input_path, output_dir, tpl, index=index, sink=sink, data=data)]
+            except Exception as e:
+                yield index, input_path, None, str(e)
+                continue
+            finally:
+                close_buffer(data)
+            yield index, input_path, outputs, None
+    finally:
+        if prefetch is not None:
+            prefetch.close()
+            if io_stats is not None:
+                io_stats.update(prefetch.stats())
@@ -1,28 +1,41 @@
-from typing import Tuple
+import os
+from typing import BinaryIO, Tuple, Union
 from PIL import Image
 
+from .instrument import stage, timed
 
+
+def compute_target_size(size: Tuple[int, int], mode: str, resize_width: int, resize_height: int, resize_percent: int) -> Tuple[int, int]:
+    """Return the proportional target size for `size` according to mode.
+
+    - mode: 'none'|'width'|'height'|'percent'
+    """
+    ow, oh = size
+    tw, th = ow, oh
+    if mode == "width" and resize_width > 0 and ow > 0:
+        tw = int(resize_width)
+        scale = tw / float(ow)
+        th = max(1, int(oh * scale))
+    elif mode == "height" and resize_height > 0 and oh > 0:
+        th = int(resize_height)
+        scale = th / float(oh)
+        tw = max(1, int(ow * scale))
+    elif mode == "percent" and resize_percent > 0:
+        scale = float(resize_percent) / 100.0
+        tw = max(1, int(ow * scale))
+        th = max(1, int(oh * scale))
+    return tw, th
+
+
+@timed("resize")
 def resize_image_proportionally(img: Image.Image, mode: str, resize_width: int, resize_height: int, resize_percent: int) -> Image.Image:
     """Resize image proportionally according to mode.
 
     - mode: 'none'|'width'|'height'|'percent'
     """
     try:
-        ow, oh = img.size
-        tw, th = ow, oh
-        if mode == "width" and resize_width > 0 and ow > 0:
-            tw = int(resize_width)
-            scale = tw / float(ow)
-            th = max(1, int(oh * scale))
-        elif mode == "height" and resize_height > 0 and oh > 0:
-            th = int(resize_height)
-            scale = th / float(oh)
-            tw = max(1, int(ow * scale))
-        elif mode == "percent" and resize_percent > 0:
-            scale = float(resize_percent) / 100.0
-            tw = max(1, int(ow * scale))
-            th = max(1, int(oh * scale))
-        if (tw, th) != (ow, oh):
+        tw, th = compute_target_size(img.size, mode, resize_width, resize_height, resize_percent)
+        if (tw, th) != img.size:
             return img.resize((tw, th), Image.LANCZOS)
         return img
     except Exception:
@@ -30,11 +43,29 @@ def resize_image_proportionally(img: Image.Image, mode: str, resize_width: int,
         return img
 
 
-def save_image(img: Image.Image, output_format: str, jpeg_quality: int, output_path: str) -> None:
-    """Save image in given format, handling color conversion for JPEG."""
+@timed("encode")
+def encode_image(img: Image.Image, output_format: str, jpeg_quality: int, fp: Union[str, BinaryIO]) -> None:
+    """Encode image to a path or writable file object, converting to RGB for JPEG."""
     fmt = (output_format or "png").lower()
     if fmt == "jpeg":
-        img_rgb = img.convert("RGB")
-        img_rgb.save(output_path, "JPEG", quality=int(jpeg_quality))
+        with stage("convert_rgb"):
+            img_rgb = img.convert("RGB")
+        img_rgb.save(fp, "JPEG", quality=int(jpeg_quality))
     else:
-        img.save(output_path, "PNG")
\ No newline at end of file
+        img.save(fp, "PNG")
+
+
+def save_image(img: Image.Image, output_format: str, jpeg_quality: int, output_path: str) -> None:
+    """Save image in given format, handling color conversion for JPEG.
+
+    The file is written under a temporary name and renamed into place, so an
+    interrupted export never leaves a partial file at `output_path`.
+    """
+    tmp_path = output_path + ".part"
+    try:
+        encode_image(img, output_format, jpeg_quality, tmp_path)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
\ No newline at end of file
@@ -0,0 +1,375 @@
+"""Persistent index of the installed fonts.
+
+Every face of every font file in the system font directories (macOS,
+Linux, Windows; Linux directories are walked recursively) is described by
+
+- ``path`` and ``index`` (face number inside a ``.ttc``/``.otc`` collection),
+- ``family`` and ``style`` names,
+- ``weight`` (OS/2 usWeightClass, 400 regular, 700 bold) and ``italic``,
+- ``ranges``: the Unicode code points the face maps to glyphs, as a flat
+  list of inclusive ``start, end`` pairs read from its cmap table.
+
+The index is stored in ``~/.watermark_app/font_index.json`` together with
+the mtime of every scanned directory. On the next start only directories
+whose mtime changed are listed again, and only new or modified files in
+them are parsed, so an unchanged system costs one ``stat`` per directory.
+
+`FontIndex` offers dict lookups by family, by (family, bold, italic) and by
+(path, index). `coverage_bits` turns a face's ranges into an int bitset
+(bit n set = code point n has a glyph, built once per face), so whether a
+face covers a text is one `&` against `text_bits(text)`.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from PIL import ImageFont
+
+from .settings_io import default_settings_path, ensure_parent_dir
+
+INDEX_VERSION = 1
+FONT_EXTS = {".ttf", ".otf", ".ttc", ".otc"}
+# Weights at or above this count as bold
+BOLD_WEIGHT = 600
+
+
+def font_dirs() -> List[str]:
+    """The system and user font directories of this platform (existing or not)."""
+    home = os.path.expanduser("~")
+    if sys.platform == "darwin":
+        return ["/System/Library/Fonts", "/System/Library/Fonts/Supplemental", "/Library/Fonts",
+                os.path.join(home, "Library/Fonts")]
+    if sys.platform.startswith("win"):
+        windir = os.environ.get("WINDIR", r"C:\Windows")
+        local = os.environ.get("LOCALAPPDATA", os.path.join(home, "AppData", "Local"))
+        return [os.path.join(windir, "Fonts"), os.path.join(local, "Microsoft", "Windows", "Fonts")]
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(home, ".local", "share")
+    return ["/usr/share/fonts", "/usr/local/share/fonts", os.path.join(data_home, "fonts"),
+            os.path.join(home, ".fonts")]
+
+
+def index_path() -> str:
+    return os.path.join(os.path.dirname(default_settings_path()), "font_index.json")
+
+
+# ---- sfnt parsing -------------------------------------------------------
+
+def _face_offsets(data) -> List[int]:
+    """Offsets of the table directories: one per face of a collection, else [0]."""
+    if data[:4] == b"ttcf":
+        count = struct.unpack_from(">I", data, 8)[0]
+        return list(struct.unpack_from(f">{count}I", data, 12))
+    return [0]
+
+
+def _tables(data, offset: int) -> Dict[bytes, Tuple[int, int]]:
+    count = struct.unpack_from(">H", data, offset + 4)[0]
+    tables = {}
+    for i in range(count):
+        tag, _, start, length = struct.unpack_from(">4sIII", data, offset + 12 + 16 * i)
+        tables[tag] = (start, length)
+    return tables
+
+
+def _merge_ranges(ranges: Iterable[Tuple[int, int]]) -> List[int]:
+    flat: List[int] = []
+    for start, end in sorted(ranges):
+        if flat and start <= flat[-1] + 1:
+            flat[-1] = max(flat[-1], end)
+        else:
+            flat += [start, end]
+    return flat
+
+
+def _cmap_format4(data, off: int) -> List[Tuple[int, int]]:
+    seg_x2 = struct.unpack_from(">H", data, off + 6)[0]
+    n = seg_x2 // 2
+    ends = struct.unpack_from(f">{n}H", data, off + 14)
+    starts = struct.unpack_from(f">{n}H", data, off + 16 + seg_x2)
+    range_off_pos = off + 16 + 3 * seg_x2
+    range_offs = struct.unpack_from(f">{n}H", data, range_off_pos)
+    ranges = []
+    for i in range(n):
+        start, end = starts[i], ends[i]
+        if start == 0xFFFF:
+            continue
+        if range_offs[i] == 0:
+            ranges.append((start, end))
+            continue
+        # Glyph ids come from glyphIdArray; code points mapping to glyph 0 are not covered
+        run = None
+        base = range_off_pos + 2 * i + range_offs[i]
+        for c in range(start, end + 1):
+            glyph = struct.unpack_from(">H", data, base + 2 * (c - start))[0]
+            if glyph:
+                run = (run[0], c) if run else (c, c)
+            elif run:
+                ranges.append(run)
+                run = None
+        if run:
+            ranges.append(run)
+    return ranges
+
+
+def _cmap_format12(data, off: int) -> List[Tuple[int, int]]:
+    groups = struct.unpack_from(">I", data, off + 12)[0]
+    return [struct.unpack_from(">II", data, off + 16 + 12 * i)[:2] for i in range(groups)]
+
+
+def _cmap_ranges(data, tables: Dict[bytes, Tuple[int, int]]) -> List[int]:
+    """Covered code points as a flat [start, end, ...] list (best Unicode subtable)."""
+    if b"cmap" not in tables:
+        return []
+    base = tables[b"cmap"][0]
+    count = struct.unpack_from(">H", data, base + 2)[0]
+    best = None
+    for i in range(count):
+        platform, encoding, sub_off = struct.unpack_from(">HHI", data, base + 4 + 8 * i)
+        off = base + sub_off
+        fmt = struct.unpack_from(">H", data, off)[0]
+        unicode_table = platform == 0 or (platform == 3 and encoding in (1, 10))
+        if not unicode_table or fmt not in (4, 12):
+            continue
+        # Full-repertoire format 12 beats the BMP-only format 4
+        rank = 2 if fmt == 12 else 1
+        if best is None or rank > best[0]:
+            best = (rank, fmt, off)
+    if best is None:
+        return []
+    _, fmt, off = best
+    return _merge_ranges(_cmap_format12(data, off) if fmt == 12 else _cmap_format4(data, off))
+
+
+def _weight_italic(data, tables: Dict[bytes, Tuple[int, int]]) -> Tuple[int, bool]:
+    if b"OS/2" in tables:
+        start, length = tables[b"OS/2"]
+        weight = struct.unpack_from(">H", data, start + 4)[0]
+        fs_selection = struct.unpack_from(">H", data, start + 62)[0] if length >= 64 else 0
+        # bit 0 ITALIC, bit 9 OBLIQUE
+        return weight or 400, bool(fs_selection & 0x0201)
+    if b"head" in tables:
+        mac_style = struct.unpack_from(">H", data, tables[b"head"][0] + 44)[0]
+        return (700 if mac_style & 1 else 400), bool(mac_style & 2)
+    return 400, False
+
+
+def read_faces(path: str) -> List[Dict]:
+    """Describe every face of a font file; [] when it cannot be parsed."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < 12:
+                return []
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return []
+    faces = []
+    try:
+        offsets = _face_offsets(data)
+        for index, offset in enumerate(offsets):
+            try:
+                tables = _tables(data, offset)
+                weight, italic = _weight_italic(data, tables)
+                ranges = _cmap_ranges(data, tables)
+                family, style = ImageFont.truetype(path, 12, index=index).getname()
+            except Exception:
+                continue
+            style = style or "Regular"
+            italic = italic or "italic" in style.lower() or "oblique" in style.lower()
+            faces.append({"path": path, "index": index, "family": family or os.path.basename(path),
+                          "style": style, "weight": int(weight), "italic": italic, "ranges": ranges})
+    except (struct.error, ValueError):
+        pass
+    finally:
+        data.close()
+    return faces
+
+
+# ---- coverage bitsets ----------------------------------------------------
+
+_bits_cache: Dict[Tuple[str, int], int] = {}
+_bits_lock = threading.Lock()
+
+
+def ranges_to_bits(ranges: List[int]) -> int:
+    """Bitset of a flat [start, end, ...] inclusive range list."""
+    if not ranges:
+        return 0
+    buf = bytearray(ranges[-1] // 8 + 1)
+    for i in range(0, len(ranges), 2):
+        start, end = ranges[i], ranges[i + 1]
+        first, last = start >> 3, end >> 3
+        if first == last:
+            buf[first] |= ((0xFF << (start & 7)) & (0xFF >> (7 - (end & 7)))) & 0xFF
+            continue
+        buf[first] |= (0xFF << (start & 7)) & 0xFF
+        buf[first + 1:last] = b"\xff" * (last - first - 1)
+        buf[last] |= 0xFF >> (7 - (end & 7))
+    return int.from_bytes(buf, "little")
+
+
+def coverage_bits(face: Dict) -> int:
+    """The face's coverage bitset (cached per face)."""
+    key = (face["path"], face["index"])
+    bits = _bits_cache.get(key)
+    if bits is None:
+        bits = ranges_to_bits(face["ranges"])
+        with _bits_lock:
+            _bits_cache[key] = bits
+    return bits
+
+
+def is_ignorable(ch: str) -> bool:
+    """Characters that never need a glyph of their own (spaces, controls, joiners, variation selectors)."""
+    cp = ord(ch)
+    return cp < 0x20 or ch.isspace() or cp in (0x200C, 0x200D) or 0xFE00 <= cp <= 0xFE0F
+
+
+def text_bits(text: str) -> int:
+    """Bitset of the code points of `text` that must be covered by a font."""
+    bits = 0
+    for ch in set(text):
+        if not is_ignorable(ch):
+            bits |= 1 << ord(ch)
+    return bits
+
+
+# ---- index --------------------------------------------------------------
+
+class FontIndex:
+    """All indexed faces plus dict lookups over them."""
+
+    def __init__(self, faces: List[Dict]):
+        self.faces = faces
+        self.by_family: Dict[str, List[Dict]] = {}
+        self.by_style: Dict[Tuple[str, bool, bool], Dict] = {}
+        self.by_path: Dict[Tuple[str, int], Dict] = {}
+        for face in faces:
+            family = face["family"].lower()
+            self.by_family.setdefault(family, []).append(face)
+            self.by_path[(face["path"], face["index"])] = face
+            bold = face["weight"] >= BOLD_WEIGHT
+            key = (family, bold, face["italic"])
+            # Among e.g. Bold and Black, keep the face nearest the nominal weight
+            target = 700 if bold else 400
+            current = self.by_style.get(key)
+            if current is None or abs(face["weight"] - target) < abs(current["weight"] - target):
+                self.by_style[key] = face
+
+    def family(self, name: str) -> List[Dict]:
+        return self.by_family.get(name.lower(), [])
+
+    def find(self, family: str, bold: bool = False, italic: bool = False) -> Optional[Dict]:
+        """The face of `family` with exactly this bold/italic style, or None."""
+        return self.by_style.get((family.lower(), bool(bold), bool(italic)))
+
+    def face(self, path: str, index: int = 0) -> Optional[Dict]:
+        return self.by_path.get((path, int(index)))
+
+
+def _load_cache(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+        return {}
+    return data.get("dirs") or {}
+
+
+def _save_cache(path: str, dirs: Dict[str, Dict]) -> None:
+    try:
+        ensure_parent_dir(path)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "dirs": dirs}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _scan_dir(path: str, cached: Dict[str, Dict], out: Dict[str, Dict], stats: Dict[str, int],
+              visited: set) -> None:
+    """Refresh the entry of `path` (and its subdirectories) into `out`."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    # Symlinked directories may point back up the tree
+    if (st.st_dev, st.st_ino) in visited:
+        return
+    visited.add((st.st_dev, st.st_ino))
+    mtime = st.st_mtime_ns
+    old = cached.get(path)
+    if old is not None and old.get("mtime") == mtime:
+        entry = old
+        stats["dirs_cached"] += 1
+    else:
+        stats["dirs_scanned"] += 1
+        old_files = (old or {}).get("files", {})
+        files: Dict[str, Dict] = {}
+        subdirs: List[str] = []
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            names = []
+        for name in names:
+            full = os.path.join(path, name)
+            if os.path.isdir(full):
+                subdirs.append(name)
+                continue
+            if os.path.splitext(name)[1].lower() not in FONT_EXTS:
+                continue
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            prev = old_files.get(name)
+            if prev is not None and prev["mtime"] == st.st_mtime_ns and prev["size"] == st.st_size:
+                files[name] = prev
+                continue
+            stats["files_parsed"] += 1
+            faces = [{k: v for k, v in face.items() if k != "path"} for face in read_faces(full)]
+            files[name] = {"mtime": st.st_mtime_ns, "size": st.st_size, "faces": faces}
+        entry = {"mtime": mtime, "subdirs": subdirs, "files": files}
+    out[path] = entry
+    for name in entry["subdirs"]:
+        _scan_dir(os.path.join(path, name), cached, out, stats, visited)
+
+
+def build_index(dirs: Optional[List[str]] = None, cache_path: Optional[str] = None,
+                stats: Optional[Dict[str, int]] = None) -> FontIndex:
+    """Bring the on-disk index up to date for `dirs` (default: `font_dirs()`) and return it."""
+    dirs = font_dirs() if dirs is None else dirs
+    cache_path = cache_path or index_path()
+    cached = _load_cache(cache_path)
+    stats = {"dirs_cached": 0, "dirs_scanned": 0, "files_parsed": 0} if stats is None else stats
+    stats.setdefault("dirs_cached", 0)
+    stats.setdefault("dirs_scanned", 0)
+    stats.setdefault("files_parsed", 0)
+    out: Dict[str, Dict] = {}
+    visited: set = set()
+    for d in dirs:
+        if os.path.isdir(d):
+            _scan_dir(os.path.abspath(d), cached, out, stats, visited)
+    if stats["dirs_scanned"] or set(out) != set(cached):
+        _save_cache(cache_path, out)
+    faces = [dict(face, path=os.path.join(d, name))
+             for d, entry in out.items() for name, info in entry["files"].items() for face in info["faces"]]
+    return FontIndex(faces)
+
+
+_index: Optional[FontIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index(refresh: bool = False) -> FontIndex:
+    """The process-wide index of the system fonts, built (or refreshed) on first use."""
+    global _index
+    with _index_lock:
+        if _index is None or refresh:
+            _index = build_index()
+        return _index
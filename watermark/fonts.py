@@ -1,17 +1,67 @@
 import os
-from typing import List, Tuple, Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
 from PIL import ImageFont
 
+from .fontindex import BOLD_WEIGHT, coverage_bits, get_index, is_ignorable, read_faces, text_bits
 
-def load_font(font_size: int, font_path: Optional[str] = None) -> ImageFont.FreeTypeFont:
+
+# Parsed font objects keyed by (path, size, face index); parsing a large CJK .ttc costs milliseconds
+_FONT_CACHE_MAX = 32
+_font_cache: "OrderedDict[Tuple[Optional[str], int, int], ImageFont.FreeTypeFont]" = OrderedDict()
+_font_lock = threading.Lock()
+
+# Families tried first, in order, for characters the selected font cannot render
+FALLBACK_FAMILIES = (
+    "PingFang SC", "Hiragino Sans GB", "Heiti SC", "STHeiti", "Songti SC",
+    "Noto Sans CJK SC", "Source Han Sans SC", "WenQuanYi Micro Hei", "WenQuanYi Zen Hei", "Microsoft YaHei",
+    "Arial Unicode MS", "Arial", "Helvetica", "DejaVu Sans", "Noto Sans", "Liberation Sans",
+    "Apple Color Emoji", "Noto Color Emoji", "Segoe UI Emoji", "Noto Emoji", "Symbola",
+)
+
+# Font run plans keyed by (text, font_path)
+_PLAN_CACHE_MAX = 256
+_plan_cache: "OrderedDict[Tuple[str, Optional[str]], List[Tuple[str, Optional[Tuple[str, int]]]]]" = OrderedDict()
+_chain: Tuple[object, List[Dict]] = (None, [])
+_path_faces: Dict[str, Optional[Dict]] = {}
+
+
+def load_font(font_size: int, font_path: Optional[str] = None, index: int = 0) -> ImageFont.FreeTypeFont:
     """Load a font. Prefer provided `font_path`; otherwise choose a CJK-friendly fallback.
 
+    `index` selects the face inside a font collection (.ttc).
     Returns a Pillow Font object; falls back to default when unavailable.
+    Loaded fonts are kept in a small LRU cache.
     """
+    key = (font_path, int(font_size), int(index))
+    with _font_lock:
+        font = _font_cache.get(key)
+        if font is not None:
+            _font_cache.move_to_end(key)
+            return font
+    font = _load_font_uncached(int(font_size), font_path, int(index))
+    with _font_lock:
+        _font_cache[key] = font
+        if len(_font_cache) > _FONT_CACHE_MAX:
+            _font_cache.popitem(last=False)
+    return font
+
+
+def clear_font_cache() -> None:
+    global _chain
+    with _font_lock:
+        _font_cache.clear()
+        _plan_cache.clear()
+        _path_faces.clear()
+        _chain = (None, [])
+
+
+def _load_font_uncached(font_size: int, font_path: Optional[str] = None, index: int = 0) -> ImageFont.FreeTypeFont:
     # Try user selected font first
     if font_path:
         try:
-            return ImageFont.truetype(font_path, font_size)
+            return ImageFont.truetype(font_path, font_size, index=index)
         except Exception:
             pass
 
@@ -51,43 +101,198 @@ def load_font(font_size: int, font_path: Optional[str] = None) -> ImageFont.Free
         return ImageFont.load_default()
 
 
+def fallback_faces() -> List[Dict]:
+    """Indexed faces in fallback order: `FALLBACK_FAMILIES`, then other upright
+    regular faces, smallest file first (cheapest to load)."""
+    global _chain
+    index = get_index()
+    if _chain[0] is index:
+        return _chain[1]
+    chain: List[Dict] = []
+    seen = set()
+    for family in FALLBACK_FAMILIES:
+        face = index.find(family) or next(iter(index.family(family)), None)
+        if face is not None and (face["path"], face["index"]) not in seen:
+            seen.add((face["path"], face["index"]))
+            chain.append(face)
+
+    def size(face: Dict) -> int:
+        try:
+            return os.path.getsize(face["path"])
+        except OSError:
+            return 1 << 62
+
+    rest = [f for f in index.faces
+            if f["weight"] < BOLD_WEIGHT and not f["italic"] and (f["path"], f["index"]) not in seen]
+    chain += sorted(rest, key=lambda f: (size(f), f["path"], f["index"]))
+    with _font_lock:
+        _chain = (index, chain)
+    return chain
+
+
+def _selected_face(font_path: str) -> Optional[Dict]:
+    """The index entry of a user-selected font file (parsed on demand when not indexed)."""
+    if font_path in _path_faces:
+        return _path_faces[font_path]
+    face = get_index().face(font_path, 0)
+    if face is None:
+        faces = read_faces(font_path)
+        face = faces[0] if faces else None
+    with _font_lock:
+        _path_faces[font_path] = face
+    return face
+
+
+def plan_font_runs(text: str, font_path: Optional[str] = None) -> List[Tuple[str, Optional[Tuple[str, int]]]]:
+    """Split `text` into runs and pick the face that renders each: [(run, (path, face index) or None)].
+
+    None means `load_font(size, font_path)`, i.e. the selected (or default)
+    font. Text the selected font covers completely stays one run; otherwise
+    the characters it lacks go to the first fallback covering all of them, or
+    failing that, character by character to the first fallback covering it.
+    Without a selected font, the first fallback covering the whole text is
+    used. Coverage tests are bitset operations (see `fontindex.coverage_bits`).
+    """
+    key = (text, font_path)
+    with _font_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+            return plan
+    plan = _plan_font_runs(text, font_path)
+    with _font_lock:
+        _plan_cache[key] = plan
+        if len(_plan_cache) > _PLAN_CACHE_MAX:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+def _plan_font_runs(text: str, font_path: Optional[str]) -> List[Tuple[str, Optional[Tuple[str, int]]]]:
+    need = text_bits(text)
+    primary = _selected_face(font_path) if font_path else None
+    primary_bits = coverage_bits(primary) if primary is not None else 0
+    if not need or (primary is not None and not need & ~primary_bits):
+        return [(text, None)]
+    chain = fallback_faces()
+    if not chain:
+        return [(text, None)]
+    missing = need & ~primary_bits
+    # One extra font for everything the selected font lacks renders in the fewest passes
+    helper = next((f for f in chain if not missing & ~coverage_bits(f)), None)
+    if primary is None and helper is not None:
+        return [(text, (helper["path"], helper["index"]))]
+
+    runs: List[List] = []
+    pending = ""
+    for ch in text:
+        if is_ignorable(ch):
+            if runs:
+                runs[-1][0] += ch
+            else:
+                pending += ch
+            continue
+        bit = 1 << ord(ch)
+        target: Optional[Tuple[str, int]] = None
+        if not primary_bits & bit:
+            face = helper if helper is not None else next((f for f in chain if coverage_bits(f) & bit), None)
+            if face is not None:
+                target = (face["path"], face["index"])
+        if runs and runs[-1][1] == target:
+            runs[-1][0] += ch
+        else:
+            runs.append([pending + ch, target])
+            pending = ""
+    if not runs:
+        return [(text, None)]
+    return [(run, target) for run, target in runs]
+
+
+def styled_face(path: Optional[str], index: int, bold: bool, italic: bool, run: str = "") -> Optional[Dict]:
+    """The real face of the same family with the requested style, or None.
+
+    The face's own style counts too (a selected Bold file stays bold). The
+    styled face must also cover `run`.
+    """
+    if not path:
+        return None
+    face = _selected_face(path) if index == 0 else get_index().face(path, index)
+    if face is None:
+        return None
+    want_bold = bold or face["weight"] >= BOLD_WEIGHT
+    want_italic = italic or face["italic"]
+    styled = get_index().find(face["family"], want_bold, want_italic)
+    if styled is None or (run and text_bits(run) & ~coverage_bits(styled)):
+        return None
+    return styled
+
+
+def font_runs(
+    texts: Sequence[str],
+    font_size: int,
+    font_path: Optional[str] = None,
+    bold: bool = False,
+    italic: bool = False,
+) -> Tuple[List[Tuple[str, ImageFont.FreeTypeFont, Tuple, bool]], bool]:
+    """Fonts for `texts` (see `plan_font_runs`), with real Bold/Italic faces where the family has them.
+
+    Returns ([(run, font, font key, synthetic bold)], synthetic italic). The
+    key identifies face and size. Synthetic bold is per run (its family has no
+    bold face); italic is slanted for the whole text at once, so when any run
+    lacks a real italic face all runs use upright faces and the slant is
+    synthesized.
+    """
+    planned = []
+    for text in texts:
+        for run, target in plan_font_runs(text, font_path):
+            path, index = target if target is not None else (font_path, 0)
+            planned.append((run, path, index))
+
+    def resolve(path, index, run, want_italic):
+        styled = styled_face(path, index, bold, want_italic, run)
+        if styled is None and bold and want_italic:
+            # No BoldItalic: a real Italic with synthetic bold still avoids the skew
+            styled = styled_face(path, index, False, True, run)
+        return styled
+
+    synth_italic = bool(italic) and any(resolve(path, index, run, True) is None for run, path, index in planned)
+    real_italic = bool(italic) and not synth_italic
+    out = []
+    for run, path, index in planned:
+        styled = resolve(path, index, run, real_italic) if (bold or real_italic) else None
+        synth_bold = bool(bold)
+        if styled is not None:
+            path, index = styled["path"], styled["index"]
+            synth_bold = synth_bold and styled["weight"] < BOLD_WEIGHT
+        out.append((run, load_font(font_size, path, index), (path, index, int(font_size)), synth_bold))
+    return out, synth_italic
+
+
 def scan_system_font_files() -> List[Tuple[str, str]]:
-    """Scan system font directories and collect available font files.
+    """List the installed font files from the persistent font index (see `fontindex`).
 
-    Returns a list of tuples: (display_name, absolute_path).
+    Returns a list of tuples: (display_name, absolute_path), one per file,
+    named after its first face ("Family Style"), common Chinese fonts first.
     """
     fonts: List[Tuple[str, str]] = []
-    search_dirs = [
-        "/System/Library/Fonts",
-        "/System/Library/Fonts/Supplemental",
-        "/Library/Fonts",
-        os.path.expanduser("~/Library/Fonts"),
-    ]
-    exts = {".ttf", ".otf", ".ttc"}
     seen = set()
-    for d in search_dirs:
-        if not os.path.isdir(d):
+    for face in get_index().faces:
+        if face["index"] != 0 or face["path"] in seen:
             continue
-        for name in os.listdir(d):
-            path = os.path.join(d, name)
-            if not os.path.isfile(path):
-                continue
-            _, ext = os.path.splitext(name)
-            if ext.lower() in exts:
-                disp = name
-                if path not in seen:
-                    fonts.append((disp, path))
-                    seen.add(path)
+        seen.add(face["path"])
+        style = face["style"]
+        disp = face["family"] if style.lower() in ("regular", "normal", "book") else f"{face['family']} {style}"
+        fonts.append((disp, face["path"]))
 
     # Sort with priority for common Chinese fonts
-    def score(item: Tuple[str, str]) -> int:
-        n = item[0].lower()
+    def score(item: Tuple[str, str]) -> Tuple[int, str]:
+        n = (item[0] + " " + os.path.basename(item[1])).lower()
         s = 0
-        if "pingfang" in n or "songti" in n or "stheiti" in n or "hiragino" in n:
+        if any(k in n for k in ("pingfang", "songti", "stheiti", "hiragino", "noto sans cjk", "noto serif cjk",
+                                "source han", "wenquanyi", "microsoft yahei")):
             s -= 10
         if "bold" in n:
             s += 1
-        return s
+        return s, item[0].lower()
 
     fonts.sort(key=score)
-    return fonts
\ No newline at end of file
+    return fonts
@@ -0,0 +1,255 @@
+"""Golden-image regression harness: correctness and render time in one run.
+
+    python -m watermark.golden [-k NAME] [--repeat 3] [--update] [--diff-dir DIR]
+
+Cases live in ``testCases/golden/cases.json``. Each case names an input
+(relative to testCases), the template fields to export it with and one
+reference file per output (in testCases/golden). A run exports every
+input through the real export path (`engine.export_one` /
+`export_renditions`) into memory, decodes the result and compares it with
+the reference:
+
+- sizes must match;
+- PSNR must be at least ``tolerance.psnr`` (default 50 dB) in every 32x32
+  tile, so a change confined to a small watermark is not averaged away by
+  the rest of the image, while JPEG encoder noise still passes;
+- the largest per-channel difference must be at most ``tolerance.max_diff``
+  (default 255, i.e. unchecked).
+
+Render time is measured per case: ``cold_ms`` with the stamp/text/font
+caches cleared, ``warm_ms`` as the median of `--repeat` runs with warm
+caches. Timings are stored in the case file per machine; a case whose warm
+time grew by more than `--max-slowdown` on the same machine is reported as
+SLOW. `--update` re-renders the references and records the timings.
+
+Exit status: 0 ok, 1 a mismatch, 3 only slowdowns.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+from PIL import Image, ImageChops, ImageStat
+
+from .engine import export_one, export_renditions
+from .exporting import encode_image
+from .fonts import clear_font_cache
+from .layers import clear_layer_cache
+from .processing import clear_run_cache
+from .templates_io import normalize_template_fields
+from .tuning import machine_key
+
+TEST_CASES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "testCases")
+GOLDEN_DIR = os.path.join(TEST_CASES_DIR, "golden")
+CASES_FILE = os.path.join(GOLDEN_DIR, "cases.json")
+DEFAULT_PSNR = 50.0
+TILE = 32
+_PATH_FIELDS = ("font_path", "image_watermark_path")
+
+
+class _MemorySink:
+    """Sink that keeps encoded outputs in memory instead of writing files."""
+
+    def __init__(self):
+        self.outputs: List[Tuple[str, bytes]] = []
+
+    def write(self, img: Image.Image, output_format: str, jpeg_quality: int, output_path: str) -> str:
+        buf = io.BytesIO()
+        encode_image(img, output_format, jpeg_quality, buf)
+        self.outputs.append((output_path, buf.getvalue()))
+        return output_path
+
+    def close(self) -> None:
+        pass
+
+
+def load_cases(path: str = CASES_FILE) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cases(data: Dict[str, Any], path: str = CASES_FILE) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def case_template(case: Dict) -> Dict:
+    """The case's template fields with testCases-relative file paths resolved."""
+    tpl = normalize_template_fields(dict(case["template"]))
+
+    def resolve(fields: Dict) -> Dict:
+        for key in _PATH_FIELDS:
+            value = fields.get(key)
+            if value and not os.path.isabs(value):
+                fields[key] = os.path.join(TEST_CASES_DIR, value)
+        return fields
+
+    resolve(tpl)
+    tpl["layers"] = [resolve(dict(layer)) for layer in tpl.get("layers") or []]
+    return tpl
+
+
+def render_case(case: Dict) -> List[bytes]:
+    """Export the case's input in memory; returns the encoded outputs in order."""
+    tpl = case_template(case)
+    input_path = os.path.join(TEST_CASES_DIR, case["input"])
+    sink = _MemorySink()
+    if tpl.get("renditions"):
+        export_renditions(input_path, GOLDEN_DIR, tpl, index=int(case.get("index", 1)), sink=sink)
+    else:
+        export_one(input_path, GOLDEN_DIR, tpl, index=int(case.get("index", 1)), sink=sink)
+    return [data for _, data in sink.outputs]
+
+
+def _clear_caches() -> None:
+    clear_layer_cache()
+    clear_run_cache()
+    clear_font_cache()
+
+
+def time_case(case: Dict, repeat: int = 3) -> Tuple[List[bytes], Dict[str, float]]:
+    """Render the case once cold and `repeat` times warm; returns (outputs, timing in ms)."""
+    _clear_caches()
+    start = time.perf_counter()
+    outputs = render_case(case)
+    cold = time.perf_counter() - start
+    warm = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        render_case(case)
+        warm.append(time.perf_counter() - start)
+    return outputs, {"cold_ms": round(cold * 1000.0, 2), "warm_ms": round(statistics.median(warm) * 1000.0, 2)}
+
+
+def _psnr(rms: List[float]) -> float:
+    mse = sum(v * v for v in rms) / len(rms)
+    return round(10.0 * math.log10(255.0 * 255.0 / mse), 2) if mse > 0 else math.inf
+
+
+def compare_images(actual: Image.Image, expected: Image.Image) -> Dict[str, Any]:
+    """Size match, largest channel difference, mean absolute difference, PSNR and worst tile PSNR (dB)."""
+    if actual.size != expected.size:
+        return {"size_ok": False, "max_diff": 255, "mean_diff": 255.0, "psnr": 0.0, "tile_psnr": 0.0}
+    mode = "RGBA" if "A" in actual.getbands() or "A" in expected.getbands() else "RGB"
+    diff = ImageChops.difference(actual.convert(mode), expected.convert(mode))
+    stat = ImageStat.Stat(diff)
+    tile_psnr = math.inf
+    # Largest difference over all bands (RGBA getbbox would only look at alpha before Pillow 10)
+    changed = diff.getchannel(0)
+    for band in diff.split()[1:]:
+        changed = ImageChops.lighter(changed, band)
+    bbox = changed.getbbox()
+    if bbox is not None:
+        # Only tiles overlapping the changed area can be worse than infinity
+        left, top, right, bottom = bbox
+        for y in range(top - top % TILE, bottom, TILE):
+            for x in range(left - left % TILE, right, TILE):
+                tile = diff.crop((x, y, min(x + TILE, diff.width), min(y + TILE, diff.height)))
+                tile_psnr = min(tile_psnr, _psnr(ImageStat.Stat(tile).rms))
+    return {
+        "size_ok": True,
+        "max_diff": max(hi for _, hi in stat.extrema),
+        "mean_diff": round(sum(stat.mean) / len(stat.mean), 4),
+        "psnr": _psnr(stat.rms),
+        "tile_psnr": tile_psnr,
+    }
+
+
+def check_case(case: Dict, outputs: List[bytes]) -> Tuple[bool, List[Dict[str, Any]]]:
+    """Compare outputs with the case's references; returns (ok, per-output results)."""
+    tolerance = case.get("tolerance") or {}
+    min_psnr = float(tolerance.get("psnr", DEFAULT_PSNR))
+    max_diff = int(tolerance.get("max_diff", 255))
+    references = case["references"]
+    results = []
+    ok = len(outputs) == len(references)
+    for data, ref in zip(outputs, references):
+        with Image.open(io.BytesIO(data)) as actual, Image.open(os.path.join(GOLDEN_DIR, ref)) as expected:
+            result = compare_images(actual, expected)
+        result["reference"] = ref
+        result["ok"] = result["size_ok"] and result["tile_psnr"] >= min_psnr and result["max_diff"] <= max_diff
+        ok = ok and result["ok"]
+        results.append(result)
+    return ok, results
+
+
+def _write_diff(case: Dict, outputs: List[bytes], diff_dir: str) -> None:
+    os.makedirs(diff_dir, exist_ok=True)
+    for data, ref in zip(outputs, case["references"]):
+        root, ext = os.path.splitext(os.path.basename(ref))
+        with open(os.path.join(diff_dir, f"{root}.actual{ext}"), "wb") as f:
+            f.write(data)
+        with Image.open(io.BytesIO(data)) as actual, Image.open(os.path.join(GOLDEN_DIR, ref)) as expected:
+            if actual.size == expected.size:
+                diff = ImageChops.difference(actual.convert("RGB"), expected.convert("RGB"))
+                # Stretch small differences so they are visible
+                diff.point(lambda v: min(255, v * 8)).save(os.path.join(diff_dir, f"{root}.diff.png"))
+
+
+def update_case(case: Dict, outputs: List[bytes], timing: Dict[str, float]) -> None:
+    for data, ref in zip(outputs, case["references"]):
+        with open(os.path.join(GOLDEN_DIR, ref), "wb") as f:
+            f.write(data)
+    case.setdefault("timing", {})[machine_key()] = timing
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m watermark.golden", description=__doc__.splitlines()[0])
+    parser.add_argument("-k", "--case", action="append", help="only cases whose name contains this (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="warm runs per case, the median is reported (default: 3)")
+    parser.add_argument("--max-slowdown", type=float, default=0.25,
+                        help="flag cases whose warm time grew by more than this fraction (default: 0.25)")
+    parser.add_argument("--update", action="store_true", help="rewrite the references and recorded timings")
+    parser.add_argument("--diff-dir", help="write actual outputs and amplified diff images of failures here")
+    args = parser.parse_args(argv)
+
+    data = load_cases()
+    cases = [c for c in data["cases"] if not args.case or any(k in c["name"] for k in args.case)]
+    machine = machine_key()
+    failed = slow = 0
+    for case in cases:
+        outputs, timing = time_case(case, args.repeat)
+        recorded = (case.get("timing") or {}).get(machine)
+        if args.update:
+            update_case(case, outputs, timing)
+            print(f"updated {case['name']:<32} cold {timing['cold_ms']:8.1f} ms  warm {timing['warm_ms']:8.1f} ms")
+            continue
+        ok, results = check_case(case, outputs)
+        worst = min((r["tile_psnr"] for r in results), default=0.0)
+        status = "ok" if ok else "FAIL"
+        speed = ""
+        if recorded:
+            change = timing["warm_ms"] / max(recorded["warm_ms"], 1e-6) - 1.0
+            speed = f" ({change * 100:+.0f}% vs {recorded['warm_ms']:.1f})"
+            if ok and change > args.max_slowdown:
+                status = "SLOW"
+                slow += 1
+        if not ok:
+            failed += 1
+            if args.diff_dir:
+                _write_diff(case, outputs, args.diff_dir)
+        psnr = "inf" if worst == math.inf else f"{worst:.1f}"
+        print(f"{status:<4} {case['name']:<32} psnr {psnr:>6} dB  cold {timing['cold_ms']:8.1f} ms  "
+              f"warm {timing['warm_ms']:8.1f} ms{speed}")
+        if not ok:
+            for r in results:
+                if not r["ok"]:
+                    print(f"     {r['reference']}: size_ok={r['size_ok']} max_diff={r['max_diff']} "
+                          f"mean_diff={r['mean_diff']} psnr={r['psnr']} tile_psnr={r['tile_psnr']}", file=sys.stderr)
+    if args.update:
+        save_cases(data)
+        print(f"{len(cases)} case(s) updated in {os.path.relpath(CASES_FILE)}")
+        return 0
+    print(f"{len(cases)} case(s): {len(cases) - failed - slow} ok, {failed} failed, {slow} slower")
+    return 1 if failed else (3 if slow else 0)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,228 @@
+"""Per-stage timing of the export pipeline.
+
+Stages (decode, convert, text_raster, image_stamp, tile_layer, composite,
+resize, convert_rgb, encode, write and the per-image total) are wrapped with `stage(name)` or `@timed(name)`.
+Recording is off by default: then `stage` returns a shared no-op context and
+`timed` wrappers cost one global check per call. `enable()` switches it on
+at runtime (also via the WATERMARK_STAGE_METRICS environment variable).
+
+Durations are aggregated into fixed-bucket histograms (thread-safe), which
+can be dumped as JSON (`snapshot`) or Prometheus text (`to_prometheus`).
+Worker processes send their histograms back with `drain` and the parent
+folds them in with `merge`.
+
+Other profilers (see `memprof`) can attach to the same stage points with
+`set_stage_hooks`.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds (Prometheus style, +Inf implied)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Report order; stages not listed here follow alphabetically
+STAGE_ORDER = ("read", "decode", "convert", "text_raster", "image_stamp", "tile_layer", "composite", "resize",
+               "convert_rgb", "encode", "write", "image_total")
+
+_enabled = os.environ.get("WATERMARK_STAGE_METRICS", "") not in ("", "0")
+# (enter(name) -> token, exit(token)) called around every stage, or None
+_hooks: Optional[Tuple[Callable[[str], Any], Callable[[Any], None]]] = None
+# Whether stage points do anything at all
+_active = _enabled
+_lock = threading.Lock()
+_hists: Dict[str, Dict] = {}
+
+
+def enable(on: bool = True) -> None:
+    global _enabled, _active
+    _enabled = bool(on)
+    _active = _enabled or _hooks is not None
+
+
+def set_stage_hooks(hooks: Optional[Tuple[Callable[[str], Any], Callable[[Any], None]]]) -> None:
+    """Install (enter, exit) callbacks run around every stage; None removes them."""
+    global _hooks, _active
+    _hooks = hooks
+    _active = _enabled or _hooks is not None
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        _hists.clear()
+
+
+def _new_hist() -> Dict:
+    return {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)}
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record one duration of stage `name`."""
+    pos = 0
+    while pos < len(BUCKETS) and seconds > BUCKETS[pos]:
+        pos += 1
+    with _lock:
+        hist = _hists.get(name)
+        if hist is None:
+            hist = _hists[name] = _new_hist()
+        hist["count"] += 1
+        hist["sum"] += seconds
+        if seconds > hist["max"]:
+            hist["max"] = seconds
+        hist["buckets"][pos] += 1
+
+
+class _Timer:
+    __slots__ = ("name", "start", "token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.token = None
+
+    def __enter__(self):
+        hooks = _hooks
+        if hooks is not None:
+            self.token = hooks[0](self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if _enabled:
+            observe(self.name, time.perf_counter() - self.start)
+        hooks = _hooks
+        if hooks is not None and self.token is not None:
+            hooks[1](self.token)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullTimer()
+
+
+def stage(name: str):
+    """Context manager timing a block as stage `name` (a no-op when disabled)."""
+    return _Timer(name) if _active else _NULL
+
+
+def timed(name: str) -> Callable:
+    """Decorator timing every call of a function as stage `name`."""
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return fn(*args, **kwargs)
+            with _Timer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def snapshot() -> Dict[str, Dict]:
+    """Copy of all histograms: {stage: {"count", "sum", "max", "buckets"}}."""
+    with _lock:
+        return {name: dict(h, buckets=list(h["buckets"])) for name, h in _hists.items()}
+
+
+def drain() -> Optional[Dict[str, Dict]]:
+    """Snapshot and reset (used by worker processes); None when nothing was recorded."""
+    with _lock:
+        if not _hists:
+            return None
+        data = {name: dict(h, buckets=list(h["buckets"])) for name, h in _hists.items()}
+        _hists.clear()
+    return data
+
+
+def merge(data: Optional[Dict[str, Dict]]) -> None:
+    """Fold histograms from `drain`/`snapshot` (e.g. of a worker) into this process."""
+    if not data:
+        return
+    with _lock:
+        for name, other in data.items():
+            hist = _hists.get(name)
+            if hist is None:
+                hist = _hists[name] = _new_hist()
+            hist["count"] += other["count"]
+            hist["sum"] += other["sum"]
+            hist["max"] = max(hist["max"], other["max"])
+            hist["buckets"] = [a + b for a, b in zip(hist["buckets"], other["buckets"])]
+
+
+def _ordered(data: Dict[str, Dict]) -> List[str]:
+    known = [name for name in STAGE_ORDER if name in data]
+    return known + sorted(name for name in data if name not in STAGE_ORDER)
+
+
+def quantile(hist: Dict, q: float) -> float:
+    """Estimate of quantile `q` (0-1) by linear interpolation inside the histogram bucket."""
+    if not hist["count"]:
+        return 0.0
+    target = q * hist["count"]
+    seen = 0
+    lower = 0.0
+    for i, n in enumerate(hist["buckets"]):
+        upper = BUCKETS[i] if i < len(BUCKETS) else hist["max"]
+        if n and seen + n >= target:
+            return min(hist["max"], lower + (upper - lower) * (target - seen) / n)
+        seen += n
+        lower = upper
+    return hist["max"]
+
+
+def to_json(data: Optional[Dict[str, Dict]] = None) -> str:
+    data = snapshot() if data is None else data
+    return json.dumps({"buckets": list(BUCKETS), "stages": data}, indent=2)
+
+
+def to_prometheus(data: Optional[Dict[str, Dict]] = None, metric: str = "watermark_stage_seconds") -> str:
+    """Prometheus text exposition of the stage histograms."""
+    data = snapshot() if data is None else data
+    lines = [f"# HELP {metric} Time spent per export pipeline stage.", f"# TYPE {metric} histogram"]
+    for name in _ordered(data):
+        hist = data[name]
+        cumulative = 0
+        for bound, n in zip(list(BUCKETS) + ["+Inf"], hist["buckets"]):
+            cumulative += n
+            le = bound if isinstance(bound, str) else repr(float(bound))
+            lines.append(f'{metric}_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{stage="{name}"}} {hist["sum"]:.6f}')
+        lines.append(f'{metric}_count{{stage="{name}"}} {hist["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def summary_lines(data: Optional[Dict[str, Dict]] = None) -> List[str]:
+    """One human-readable line per stage: count, total, mean, p95 and max."""
+    data = snapshot() if data is None else data
+    lines = []
+    for name in _ordered(data):
+        hist = data[name]
+        if not hist["count"]:
+            continue
+        mean = hist["sum"] / hist["count"]
+        lines.append(f"{name:<12} n={hist['count']:<5} total {hist['sum']:8.2f}s  mean {mean * 1000:8.1f}ms  "
+                     f"p95 {quantile(hist, 0.95) * 1000:8.1f}ms  max {hist['max'] * 1000:8.1f}ms")
+    return lines
+
+
+def dump(path: str, data: Optional[Dict[str, Dict]] = None) -> None:
+    """Write the histograms to `path`: Prometheus text for *.prom/*.txt, JSON otherwise."""
+    data = snapshot() if data is None else data
+    text = to_prometheus(data) if path.endswith((".prom", ".txt")) else to_json(data)
+    with open(path, "w") as f:
+        f.write(text)
@@ -0,0 +1,135 @@
+"""Crash-safe job journal for batch exports.
+
+Each batch writes ``.watermark_job.jsonl`` in the output folder: one header
+line with the job (inputs and template), then one line per finished input,
+appended and fsync'ed as soon as the item's outputs are on disk. Inputs
+skipped as unchanged are written as one record of index ranges. A line is a
+single ``write`` call, so a crash leaves at most one torn trailing line,
+which is ignored when reading and cut off before a resume appends.
+`load_job` returns what is left to do.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+JOURNAL_NAME = ".watermark_job.jsonl"
+
+
+def journal_path(output_dir: str) -> str:
+    return os.path.join(output_dir, JOURNAL_NAME)
+
+
+class JobJournal:
+    """Append-only record of one batch export."""
+
+    def __init__(self, output_dir: str):
+        self.path = journal_path(output_dir)
+        self._f = None
+
+    def start(self, paths: List[str], tpl: Dict) -> None:
+        """Begin a new job, replacing any previous journal in this folder."""
+        self.close()
+        self._f = open(self.path, "w", encoding="utf-8")
+        self._append({"job": {"paths": list(paths), "template": tpl}})
+
+    def reopen(self) -> None:
+        """Continue appending to an existing journal (resume).
+
+        A torn trailing line left by a crash is cut off first, so the next
+        record starts on a line of its own.
+        """
+        self.close()
+        _truncate_torn_tail(self.path)
+        self._f = open(self.path, "a", encoding="utf-8")
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        self._f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def done(self, index: int, outputs: List[str]) -> None:
+        self._append({"done": index, "outputs": list(outputs)})
+
+    def skipped(self, indices: List[int]) -> None:
+        """Record inputs that needed no export, as [first, last] ranges in one line."""
+        ranges: List[List[int]] = []
+        for index in sorted(indices):
+            if ranges and index == ranges[-1][1] + 1:
+                ranges[-1][1] = index
+            else:
+                ranges.append([index, index])
+        if ranges:
+            self._append({"skipped": ranges})
+
+    def failed(self, index: int, error: str) -> None:
+        self._append({"failed": index, "error": error})
+
+    def finish(self) -> None:
+        self._append({"finished": True})
+        self.close()
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def _truncate_torn_tail(path: str, block: int = 65536) -> None:
+    """Truncate `path` after its last newline (no-op when it ends with one)."""
+    try:
+        f = open(path, "rb+")
+    except OSError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            cut = chunk.rfind(b"\n")
+            if cut >= 0:
+                pos = start + cut + 1
+                break
+            pos = start
+        if pos < end:
+            f.truncate(pos)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def load_job(output_dir: str) -> Optional[Dict[str, Any]]:
+    """Read the journal of `output_dir`.
+
+    Returns None when there is no readable job, otherwise a dict with
+    "paths", "template", "finished" (bool) and "pending": [(index, path)]
+    listing 1-based batch indices that have not completed. Failed items are
+    pending again so a resume retries them.
+    """
+    try:
+        with open(journal_path(output_dir), "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    job = None
+    done = set()
+    finished = False
+    for line in lines:
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue  # torn trailing line from a crash
+        if "job" in rec:
+            job = rec["job"]
+        elif "done" in rec:
+            done.add(int(rec["done"]))
+        elif "skipped" in rec:
+            for first, last in rec["skipped"]:
+                done.update(range(int(first), int(last) + 1))
+        elif rec.get("finished"):
+            finished = True
+    if not job:
+        return None
+    paths = job.get("paths") or []
+    pending: List[Tuple[int, str]] = [(i + 1, p) for i, p in enumerate(paths) if i + 1 not in done]
+    return {"paths": paths, "template": job.get("template") or {}, "finished": finished, "pending": pending}
@@ -0,0 +1,219 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image
+
+from .instrument import stage
+from .processing import render_text_stamp, render_image_stamp, resolve_font_size, flatten_stamp, blend_stamp
+from .variables import has_variables, resolve_runs
+
+
+LAYER_TYPES = ("text", "image")
+
+# Placement fields do not affect how a stamp looks, so they are left out of the cache key
+_PLACEMENT_FIELDS = {"position", "custom_x", "custom_y", "tile_spacing", "tile_stagger"}
+
+_STAMP_CACHE_MAX = 64
+_stamp_cache: "OrderedDict[Tuple, Optional[Image.Image]]" = OrderedDict()
+_stamp_lock = threading.Lock()
+
+
+def normalize_layer(layer: Dict) -> Dict:
+    """Fill a layer dict with defaults.
+
+    Style fields share names with the flat template fields; placement is per layer:
+    `position`, `custom_x`/`custom_y`, `opacity`, `rotation` and `tile_*`.
+    """
+    layer_type = layer.get("type", "text")
+    return {
+        "type": layer_type if layer_type in LAYER_TYPES else "text",
+        "position": layer.get("position", "bottom-right"),
+        "custom_x": int(layer.get("custom_x", 0)),
+        "custom_y": int(layer.get("custom_y", 0)),
+        "opacity": int(layer.get("opacity", 50)),
+        "rotation": int(layer.get("rotation", 0)),
+        "tile_spacing": int(layer.get("tile_spacing", 80)),
+        "tile_stagger": bool(layer.get("tile_stagger", True)),
+        # Text layer
+        "text": layer.get("text", ""),
+        "font_path": layer.get("font_path"),
+        "font_size": int(layer.get("font_size", 0)),
+        "font_bold": bool(layer.get("font_bold", False)),
+        "font_italic": bool(layer.get("font_italic", False)),
+        "font_color": layer.get("font_color", "#000000"),
+        "font_stroke_width": int(layer.get("font_stroke_width", 0)),
+        "font_stroke_color": layer.get("font_stroke_color", "#000000"),
+        "font_shadow_enabled": bool(layer.get("font_shadow_enabled", False)),
+        "font_shadow_offset_x": int(layer.get("font_shadow_offset_x", 2)),
+        "font_shadow_offset_y": int(layer.get("font_shadow_offset_y", 2)),
+        "font_shadow_color": layer.get("font_shadow_color", "#000000"),
+        "render_scale": int(layer.get("render_scale", 1)),
+        # Image layer
+        "image_watermark_path": layer.get("image_watermark_path"),
+        "image_scale_mode": layer.get("image_scale_mode", "percent"),
+        "image_scale_percent": int(layer.get("image_scale_percent", 50)),
+        "image_scale_width": int(layer.get("image_scale_width", 200)),
+        "image_scale_height": int(layer.get("image_scale_height", 200)),
+        "image_keep_aspect": bool(layer.get("image_keep_aspect", True)),
+    }
+
+
+def layer_from_template(tpl: Dict, custom_point: Optional[Tuple[int, int]] = None) -> Dict:
+    """Build a single layer from flat (normalized) template fields.
+
+    An image watermark without a path falls back to text, as in single-watermark mode.
+    """
+    is_image = tpl.get("watermark_type", "text") == "image" and bool(tpl.get("image_watermark_path"))
+    layer = dict(tpl)
+    layer["type"] = "image" if is_image else "text"
+    layer["rotation"] = tpl.get("watermark_rotation", 0)
+    if custom_point is not None:
+        layer["custom_x"], layer["custom_y"] = int(custom_point[0]), int(custom_point[1])
+    return normalize_layer(layer)
+
+
+def scale_layer(layer: Dict, factor: float) -> Dict:
+    """Return a copy of `layer` with all pixel-sized fields multiplied by `factor`.
+
+    Used to build the watermark directly at a rendition's target scale so it
+    looks the same as watermarking at full size and resizing afterwards.
+    """
+    out = normalize_layer(layer)
+    if factor == 1.0:
+        return out
+
+    def _px(value: int, minimum: int = 0) -> int:
+        if value == 0:
+            return 0
+        scaled = int(round(value * factor))
+        return scaled if abs(scaled) >= minimum else (minimum if value > 0 else -minimum)
+
+    out["font_size"] = _px(out["font_size"], 1)
+    out["font_stroke_width"] = _px(out["font_stroke_width"], 1)
+    out["font_shadow_offset_x"] = _px(out["font_shadow_offset_x"])
+    out["font_shadow_offset_y"] = _px(out["font_shadow_offset_y"])
+    out["custom_x"] = _px(out["custom_x"])
+    out["custom_y"] = _px(out["custom_y"])
+    out["tile_spacing"] = _px(out["tile_spacing"])
+    if out["image_scale_mode"] == "percent":
+        out["image_scale_percent"] = _px(out["image_scale_percent"], 1)
+    else:
+        out["image_scale_width"] = _px(out["image_scale_width"], 1)
+        out["image_scale_height"] = _px(out["image_scale_height"], 1)
+    return out
+
+
+def stamp_key(layer: Dict, base_size: Tuple[int, int]) -> Tuple:
+    """Cache key of the stamp `prepare_layer` returns for `layer` on a `base_size` image."""
+    style = tuple(sorted((k, v) for k, v in layer.items() if k not in _PLACEMENT_FIELDS))
+    if layer["type"] == "image":
+        path = layer["image_watermark_path"] or ""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        return style + (("_mtime", mtime),)
+    # Auto font size depends on the base image, an explicit one does not
+    return style + (("_font_px", resolve_font_size(base_size, layer["font_size"])),)
+
+
+def _render_stamp(layer: Dict, base_size: Tuple[int, int], context: Optional[Dict[str, Any]] = None) -> Optional[Image.Image]:
+    if layer["type"] == "image":
+        stamp = render_image_stamp(
+            layer["image_watermark_path"],
+            opacity_percent=layer["opacity"],
+            scale_mode=layer["image_scale_mode"],
+            scale_percent=layer["image_scale_percent"],
+            scale_width=layer["image_scale_width"],
+            scale_height=layer["image_scale_height"],
+            keep_aspect=layer["image_keep_aspect"],
+            rotation_deg=layer["rotation"],
+        )
+    else:
+        text, text_runs = layer["text"], None
+        if context is not None and has_variables(text):
+            text_runs = [run for run, _ in resolve_runs(text, context)]
+            text = "".join(text_runs)
+        if not text:
+            return None
+        stamp = render_text_stamp(
+            resolve_font_size(base_size, layer["font_size"]),
+            text,
+            opacity_percent=layer["opacity"],
+            font_path=layer["font_path"],
+            font_bold=layer["font_bold"],
+            font_italic=layer["font_italic"],
+            font_color=layer["font_color"],
+            stroke_width=layer["font_stroke_width"],
+            stroke_color=layer["font_stroke_color"],
+            shadow_enabled=layer["font_shadow_enabled"],
+            shadow_offset=(layer["font_shadow_offset_x"], layer["font_shadow_offset_y"]),
+            shadow_color=layer["font_shadow_color"],
+            render_scale=layer["render_scale"],
+            rotation_deg=layer["rotation"],
+            text_runs=text_runs,
+        )
+    return flatten_stamp(stamp) if stamp is not None else None
+
+
+def prepare_layer(
+    layer: Dict,
+    base_size: Tuple[int, int],
+    context: Optional[Dict[str, Any]] = None,
+) -> Optional[Image.Image]:
+    """Return the flattened stamp for a normalized `layer`, rendering it at most once.
+
+    Stamps are kept in a small LRU cache shared across images, so a batch with a
+    fixed font size (or same-sized images) renders every layer only once.
+    Text with per-image variables is rendered for every image (given a
+    `context`); its fixed parts still come from the renderer's run cache.
+    """
+    if context is not None and layer["type"] == "text" and has_variables(layer["text"]):
+        return _render_stamp(layer, base_size, context)
+    key = stamp_key(layer, base_size)
+    with _stamp_lock:
+        if key in _stamp_cache:
+            _stamp_cache.move_to_end(key)
+            return _stamp_cache[key]
+    stamp = _render_stamp(layer, base_size)
+    with _stamp_lock:
+        _stamp_cache[key] = stamp
+        if len(_stamp_cache) > _STAMP_CACHE_MAX:
+            _stamp_cache.popitem(last=False)
+    return stamp
+
+
+def clear_layer_cache() -> None:
+    with _stamp_lock:
+        _stamp_cache.clear()
+
+
+def apply_layers(
+    img: Image.Image,
+    layers: List[Dict],
+    context: Optional[Dict[str, Any]] = None,
+    stamps: Optional[List[Optional[Image.Image]]] = None,
+) -> Image.Image:
+    """Composite an ordered layer stack (bottom first) onto `img` in one pass.
+
+    The base is converted to RGBA once and every layer is blended into it in
+    place; anchored layers only touch their own region.
+    `context` holds per-image text variables (see `variables.build_context`).
+    `stamps` optionally supplies already prepared (flattened) stamps per layer;
+    None entries are prepared here.
+    """
+    with stage("convert"):
+        base = img.convert("RGBA")
+    for i, raw in enumerate(layers):
+        layer = normalize_layer(raw)
+        stamp = stamps[i] if stamps is not None and i < len(stamps) else None
+        if stamp is None:
+            stamp = prepare_layer(layer, base.size, context)
+        if stamp is None:
+            continue
+        blend_stamp(
+            base, stamp, layer["position"], (layer["custom_x"], layer["custom_y"]),
+            layer["tile_spacing"], layer["tile_stagger"], flattened=True,
+        )
+    return base
@@ -0,0 +1,162 @@
+"""Export manifest: skip inputs whose outputs are already up to date.
+
+The manifest lives in the output folder as ``.watermark_manifest.json`` and
+maps each input path to the key it was last exported with and the outputs it
+produced. A key combines the input's size and mtime with a digest of the
+effective settings (`spec.ExportSpec.digest` plus the stat of any font or
+watermark image files they reference), so changing either the input or the
+settings re-exports it.
+
+Recording an input appends one line to ``.watermark_manifest.jsonl`` (a
+delta log, flushed but not fsync'ed) instead of rewriting the whole file;
+`save` compacts the log into the JSON file once at the end of a batch.
+Loading replays the log, so a killed export still skips what it finished;
+a torn trailing line is ignored and at worst a few inputs are exported again.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from .spec import ExportSpec
+from .variables import has_variables
+
+MANIFEST_NAME = ".watermark_manifest.json"
+MANIFEST_LOG_NAME = ".watermark_manifest.jsonl"
+MANIFEST_VERSION = 1
+
+
+def manifest_path(output_dir: str) -> str:
+    return os.path.join(output_dir, MANIFEST_NAME)
+
+
+def _file_stamp(path: str) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _uses_index(tpl: Dict) -> bool:
+    texts = [tpl.get("text", "")] + [layer.get("text", "") for layer in tpl.get("layers") or []]
+    return any(has_variables(t) and "{index" in t for t in texts if t)
+
+
+def settings_digest(tpl: Dict) -> str:
+    """Digest of everything in `tpl` that affects the output bytes.
+
+    The settings count through their `ExportSpec.digest`: the template name
+    does not matter, and a missing field equals its default. Referenced font
+    and watermark image files contribute their size and mtime, so replacing a
+    logo re-exports the batch.
+    """
+    files = {}
+    for source in [tpl] + list(tpl.get("layers") or []):
+        for field in ("font_path", "image_watermark_path"):
+            path = source.get(field)
+            if path and path not in files:
+                files[path] = _file_stamp(path)
+    payload = json.dumps({"spec": ExportSpec.from_fields(tpl).digest, "files": files}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def input_key(input_path: str, digest: str, index: int = 0) -> Optional[str]:
+    """Key for one input: its size+mtime combined with the settings digest.
+
+    Returns None when the input cannot be stat'ed (it is then always exported).
+    `index` only matters for templates that use the `{index}` variable.
+    """
+    stamp = _file_stamp(input_path)
+    if stamp is None:
+        return None
+    raw = f"{digest}:{stamp[0]}:{stamp[1]}:{index}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ExportManifest:
+    """Per-output-folder record of input keys and produced outputs."""
+
+    def __init__(self, output_dir: str, tpl: Dict):
+        self.path = manifest_path(output_dir)
+        self.log_path = os.path.join(output_dir, MANIFEST_LOG_NAME)
+        self.digest = settings_digest(tpl)
+        self.uses_index = _uses_index(tpl)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+        self._log = None
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if isinstance(data, dict) and data.get("version") == MANIFEST_VERSION:
+            self.entries = data.get("entries") or {}
+        try:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn trailing line from a crash
+            if isinstance(rec, dict) and rec.get("path"):
+                self.entries[rec["path"]] = {"key": rec.get("key"), "outputs": rec.get("outputs") or []}
+        # Fold the replayed records into the JSON file on the next save
+        self.dirty = bool(lines)
+
+    def key_for(self, input_path: str, index: int) -> Optional[str]:
+        return input_key(input_path, self.digest, index if self.uses_index else 0)
+
+    def is_current(self, input_path: str, key: Optional[str]) -> bool:
+        """True when `input_path` was exported with `key` and all outputs still exist."""
+        if key is None:
+            return False
+        entry = self.entries.get(os.path.abspath(input_path))
+        if not entry or entry.get("key") != key:
+            return False
+        outputs = entry.get("outputs") or []
+        return bool(outputs) and all(os.path.exists(p) for p in outputs)
+
+    def record(self, input_path: str, key: Optional[str], outputs: List[str]) -> None:
+        """Remember `input_path`'s outputs and append the record to the delta log."""
+        if key is None:
+            return
+        path = os.path.abspath(input_path)
+        self.entries[path] = {"key": key, "outputs": list(outputs)}
+        self.dirty = True
+        line = json.dumps({"path": path, "key": key, "outputs": list(outputs)}, ensure_ascii=False) + "\n"
+        try:
+            if self._log is None:
+                self._log = open(self.log_path, "a", encoding="utf-8")
+                # Start on a fresh line if the previous run left a torn one
+                if self._log.tell() > 0:
+                    line = "\n" + line
+            self._log.write(line)
+            self._log.flush()
+        except OSError:
+            pass  # the final save still writes the entry
+
+    def save(self) -> None:
+        """Compact the entries into the JSON file (temp file + rename) and drop the delta log."""
+        if not self.dirty:
+            return
+        data = json.dumps({"version": MANIFEST_VERSION, "entries": self.entries}, ensure_ascii=False,
+                          separators=(",", ":"))
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        try:
+            os.remove(self.log_path)
+        except OSError:
+            pass
+        self.dirty = False
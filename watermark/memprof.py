@@ -0,0 +1,267 @@
+"""Peak-memory accounting per pipeline stage and per image.
+
+Optional profiling mode for sizing worker memory budgets. When enabled it
+hooks the `instrument` stage points (decode, convert, tile_layer, composite,
+resize, convert_rgb, encode, ...) and records for every stage run:
+
+- RSS peak: resident set size sampled by a background thread every
+  `interval` seconds and at every stage entry/exit, minus the RSS at entry.
+  Pillow's pixel buffers live outside the Python allocator, so for large
+  images this is the number that matters.
+- Python peak: tracemalloc's traced peak above the traced size at entry.
+
+A stage's peak includes its nested stages. RSS is per process, so the
+attribution is exact with one export at a time per process (in-process or
+on the process pool) and approximate on a thread pool.
+
+Per stage the count, max/mean peak and the highest absolute RSS seen are
+kept; per image the peak of its whole export and of each stage in it.
+`report_lines` names the top offenders.
+"""
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from . import instrument
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_active: Dict[int, List["_Frame"]] = {}
+_stages: Dict[str, Dict[str, float]] = {}
+_images: Dict[str, Dict[str, Any]] = {}
+_sampler: Optional[threading.Thread] = None
+_started_tracemalloc = False
+_statm_fd: Optional[int] = None
+_statm_pid = 0
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (0 when unknown)."""
+    global _statm_fd, _statm_pid
+    try:
+        # A forked child inherits the descriptor, which still reads the parent's /proc entry
+        if _statm_fd is None or _statm_pid != os.getpid():
+            _statm_fd = os.open("/proc/self/statm", os.O_RDONLY)
+            _statm_pid = os.getpid()
+        return int(os.pread(_statm_fd, 128, 0).split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+class _Frame:
+    __slots__ = ("name", "image", "rss0", "rss_peak", "py0", "py_peak")
+
+    def __init__(self, name: str, image: Optional[str], rss: int, py: int):
+        self.name = name
+        self.image = image
+        self.rss0 = self.rss_peak = rss
+        self.py0 = self.py_peak = py
+
+
+def _fold(rss: int, py_peak: int) -> None:
+    """Raise the peaks of every open stage (lock held)."""
+    for frames in _active.values():
+        for frame in frames:
+            if rss > frame.rss_peak:
+                frame.rss_peak = rss
+            if py_peak > frame.py_peak:
+                frame.py_peak = py_peak
+
+
+def _traced() -> tuple:
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()
+    return 0, 0
+
+
+def _enter(name: str) -> _Frame:
+    rss = current_rss()
+    with _lock:
+        current, peak = _traced()
+        _fold(rss, peak)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        frame = _Frame(name, getattr(_local, "image", None), rss, current)
+        _active.setdefault(threading.get_ident(), []).append(frame)
+    return frame
+
+
+def _exit(frame: _Frame) -> None:
+    rss = current_rss()
+    with _lock:
+        _, peak = _traced()
+        _fold(rss, peak)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        frames = _active.get(threading.get_ident())
+        if frames and frame in frames:
+            frames.remove(frame)
+            if not frames:
+                del _active[threading.get_ident()]
+        rss_delta = frame.rss_peak - frame.rss0
+        py_delta = frame.py_peak - frame.py0
+        stats = _stages.get(frame.name)
+        if stats is None:
+            stats = _stages[frame.name] = {"count": 0, "rss_peak_max": 0, "rss_peak_sum": 0, "py_peak_max": 0,
+                                           "rss_max": 0}
+        stats["count"] += 1
+        stats["rss_peak_sum"] += rss_delta
+        stats["rss_peak_max"] = max(stats["rss_peak_max"], rss_delta)
+        stats["py_peak_max"] = max(stats["py_peak_max"], py_delta)
+        stats["rss_max"] = max(stats["rss_max"], frame.rss_peak)
+        if frame.image is not None:
+            entry = _images.setdefault(frame.image, {"rss_peak": 0, "py_peak": 0, "rss_max": 0, "stages": {}})
+            if frame.name == "image_total":
+                entry["rss_peak"] = max(entry["rss_peak"], rss_delta)
+                entry["py_peak"] = max(entry["py_peak"], py_delta)
+                entry["rss_max"] = max(entry["rss_max"], frame.rss_peak)
+            else:
+                entry["stages"][frame.name] = max(entry["stages"].get(frame.name, 0), rss_delta)
+
+
+def _sample_loop(interval: float) -> None:
+    while _enabled:
+        time.sleep(interval)
+        rss = current_rss()
+        with _lock:
+            _fold(rss, 0)
+
+
+def enable(on: bool = True, interval: float = 0.005) -> None:
+    """Start (or stop) memory profiling: tracemalloc, the RSS sampler and the stage hooks."""
+    global _enabled, _sampler, _started_tracemalloc
+    # A forked worker inherits the flag but not the sampler thread
+    if on == _enabled and (not on or (_sampler is not None and _sampler.is_alive())):
+        return
+    _enabled = on
+    if on:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracemalloc = True
+        _sampler = threading.Thread(target=_sample_loop, args=(interval,), name="memprof-sampler", daemon=True)
+        _sampler.start()
+        instrument.set_stage_hooks((_enter, _exit))
+    else:
+        instrument.set_stage_hooks(None)
+        if _sampler is not None:
+            _sampler.join()
+            _sampler = None
+        if _started_tracemalloc:
+            tracemalloc.stop()
+            _started_tracemalloc = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class _ImageLabel:
+    __slots__ = ("path", "previous")
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __enter__(self):
+        self.previous = getattr(_local, "image", None)
+        _local.image = self.path
+        return self
+
+    def __exit__(self, *exc):
+        _local.image = self.previous
+        return False
+
+
+class _NullLabel:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullLabel()
+
+
+def image(path: str):
+    """Attribute the stages run in this block (on this thread) to input `path`."""
+    return _ImageLabel(path) if _enabled else _NULL
+
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _images.clear()
+
+
+def snapshot() -> Dict[str, Dict]:
+    """{"stages": {stage: peaks}, "images": {path: peaks}}; byte values."""
+    with _lock:
+        return {"stages": {k: dict(v) for k, v in _stages.items()},
+                "images": {k: dict(v, stages=dict(v["stages"])) for k, v in _images.items()}}
+
+
+def drain() -> Optional[Dict[str, Dict]]:
+    """Snapshot and reset (used by worker processes); None when nothing was recorded."""
+    data = snapshot()
+    if not data["stages"] and not data["images"]:
+        return None
+    reset()
+    return data
+
+
+def merge(data: Optional[Dict[str, Dict]]) -> None:
+    """Fold a worker's `drain` into this process."""
+    if not data:
+        return
+    with _lock:
+        for name, other in data["stages"].items():
+            stats = _stages.setdefault(name, {"count": 0, "rss_peak_max": 0, "rss_peak_sum": 0, "py_peak_max": 0,
+                                              "rss_max": 0})
+            stats["count"] += other["count"]
+            stats["rss_peak_sum"] += other["rss_peak_sum"]
+            for key in ("rss_peak_max", "py_peak_max", "rss_max"):
+                stats[key] = max(stats[key], other[key])
+        for path, other in data["images"].items():
+            entry = _images.setdefault(path, {"rss_peak": 0, "py_peak": 0, "rss_max": 0, "stages": {}})
+            for key in ("rss_peak", "py_peak", "rss_max"):
+                entry[key] = max(entry[key], other[key])
+            for name, peak in other["stages"].items():
+                entry["stages"][name] = max(entry["stages"].get(name, 0), peak)
+
+
+def _mb(n: float) -> str:
+    return f"{n / 1048576.0:,.1f} MB"
+
+
+def report_lines(data: Optional[Dict[str, Dict]] = None, top: int = 5) -> List[str]:
+    """Top offenders: stages by peak growth, then the images with the highest peaks."""
+    data = snapshot() if data is None else data
+    lines = ["peak memory by stage (max growth above stage entry, mean, python objects, highest process RSS):"]
+    stages = sorted(((k, v) for k, v in data["stages"].items() if k != "image_total"),
+                    key=lambda kv: kv[1]["rss_peak_max"], reverse=True)
+    for name, s in stages[:top]:
+        mean = s["rss_peak_sum"] / s["count"] if s["count"] else 0
+        lines.append(f"  {name:<12} n={s['count']:<5} max +{_mb(s['rss_peak_max']):>12}  mean +{_mb(mean):>12}  "
+                     f"py +{_mb(s['py_peak_max']):>10}  rss {_mb(s['rss_max']):>12}")
+    total = data["stages"].get("image_total")
+    if total:
+        lines.append(f"  {'whole image':<12} n={total['count']:<5} max +{_mb(total['rss_peak_max']):>12}  "
+                     f"rss {_mb(total['rss_max'])}")
+    images = sorted(data["images"].items(), key=lambda kv: kv[1]["rss_peak"], reverse=True)[:top]
+    if images:
+        lines.append("largest images (peak growth during export, worst stage):")
+        for path, entry in images:
+            worst = max(entry["stages"].items(), key=lambda kv: kv[1], default=None)
+            worst_text = f"{worst[0]} +{_mb(worst[1])}" if worst else "-"
+            lines.append(f"  +{_mb(entry['rss_peak']):>12}  {worst_text:<24} {path}")
+    return lines
@@ -0,0 +1,146 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from PIL import Image
+
+
+# EXIF tags
+_TAG_MAKE = 271
+_TAG_MODEL = 272
+_TAG_ORIENTATION = 274
+_TAG_DATETIME = 306
+_TAG_XMP = 700
+_IFD_EXIF = 0x8769
+_TAG_DATETIME_ORIGINAL = 36867
+
+_XMP_DATE_RE = re.compile(
+    rb'(?:exif:DateTimeOriginal|xmp:CreateDate|photoshop:DateCreated)'
+    rb'(?:\s*=\s*"([^"]+)"|>([^<]+)<)'
+)
+
+# Orientation value -> transpose operations (same mapping as ImageOps.exif_transpose)
+_ORIENTATION_OPS = {
+    2: (Image.FLIP_LEFT_RIGHT,),
+    3: (Image.ROTATE_180,),
+    4: (Image.FLIP_TOP_BOTTOM,),
+    5: (Image.TRANSPOSE,),
+    6: (Image.ROTATE_270,),
+    7: (Image.TRANSVERSE,),
+    8: (Image.ROTATE_90,),
+}
+
+_CACHE_MAX = 4096
+_cache: "OrderedDict[str, Tuple[Tuple[int, int], Dict[str, Any]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _normalize_date(value: Any) -> str:
+    """"YYYY:MM:DD HH:MM:SS" or ISO "YYYY-MM-DDTHH:MM" -> "YYYY-MM-DD"."""
+    if isinstance(value, bytes):
+        value = value.decode("ascii", "ignore")
+    text = str(value or "").strip()
+    if len(text) < 10 or not text[:4].isdigit():
+        return ""
+    return text[:10].replace(":", "-")
+
+
+def _xmp_bytes(img: Image.Image) -> bytes:
+    xmp = img.info.get("xmp") or img.info.get("XML:com.adobe.xmp")
+    if xmp is None:
+        tag_v2 = getattr(img, "tag_v2", None)
+        if tag_v2 is not None:
+            xmp = tag_v2.get(_TAG_XMP)
+    if isinstance(xmp, str):
+        return xmp.encode("utf-8", "ignore")
+    return bytes(xmp) if xmp else b""
+
+
+def _read_uncached(path: str) -> Dict[str, Any]:
+    # Image.open only parses the header; pixel data is never decoded here
+    with Image.open(path) as img:
+        return image_metadata(img)
+
+
+def image_metadata(img: Image.Image) -> Dict[str, Any]:
+    """Metadata of an already opened (not necessarily decoded) image."""
+    meta: Dict[str, Any] = {
+        "width": img.size[0],
+        "height": img.size[1],
+        "format": img.format or "",
+        "mode": img.mode,
+        "orientation": 1,
+        "date_taken": "",
+        "camera_make": "",
+        "camera_model": "",
+    }
+    try:
+        exif = img.getexif()
+    except Exception:
+        exif = None
+    if exif:
+        try:
+            orientation = int(exif.get(_TAG_ORIENTATION, 1))
+        except (TypeError, ValueError):
+            orientation = 1
+        meta["orientation"] = orientation if orientation in _ORIENTATION_OPS else 1
+        meta["camera_make"] = str(exif.get(_TAG_MAKE, "") or "").strip("\x00 ")
+        meta["camera_model"] = str(exif.get(_TAG_MODEL, "") or "").strip("\x00 ")
+        try:
+            date = exif.get_ifd(_IFD_EXIF).get(_TAG_DATETIME_ORIGINAL)
+        except Exception:
+            date = None
+        meta["date_taken"] = _normalize_date(date or exif.get(_TAG_DATETIME))
+    if not meta["date_taken"]:
+        m = _XMP_DATE_RE.search(_xmp_bytes(img))
+        if m:
+            meta["date_taken"] = _normalize_date(m.group(1) or m.group(2))
+    return meta
+
+
+def read_metadata(path: str) -> Dict[str, Any]:
+    """Read size, orientation, capture date and camera from the file header.
+
+    Results are cached per (path, mtime, size); unreadable files yield defaults.
+    Keys: width, height, format, mode, orientation, date_taken, camera_make, camera_model.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {"width": 0, "height": 0, "format": "", "mode": "", "orientation": 1,
+                "date_taken": "", "camera_make": "", "camera_model": ""}
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        hit = _cache.get(path)
+        if hit is not None and hit[0] == stamp:
+            _cache.move_to_end(path)
+            return dict(hit[1])
+    try:
+        meta = _read_uncached(path)
+    except Exception:
+        meta = {"width": 0, "height": 0, "format": "", "mode": "", "orientation": 1,
+                "date_taken": "", "camera_make": "", "camera_model": ""}
+    with _cache_lock:
+        _cache[path] = (stamp, meta)
+        if len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+    return dict(meta)
+
+
+def oriented_size(meta: Dict[str, Any]) -> Tuple[int, int]:
+    """Image size after applying the EXIF orientation."""
+    w, h = int(meta.get("width", 0)), int(meta.get("height", 0))
+    return (h, w) if meta.get("orientation", 1) in (5, 6, 7, 8) else (w, h)
+
+
+def apply_orientation(img: Image.Image, orientation: Optional[int]) -> Image.Image:
+    """Return `img` rotated/flipped upright for an EXIF orientation value (1-8)."""
+    for op in _ORIENTATION_OPS.get(int(orientation or 1), ()):
+        img = img.transpose(op)
+    return img
+
+
+def clear_metadata_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
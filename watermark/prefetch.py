@@ -0,0 +1,206 @@
+"""Read-ahead of input files so decoding never waits on slow storage.
+
+`ReadAhead` is given the order in which inputs will be consumed and keeps
+the next `depth` files loaded in the background (thread pool), bounded by
+`byte_budget` bytes held at once. Files on network mounts (NFS, SMB/CIFS,
+sshfs, ...) are read into memory; local files are mapped with `mmap` and
+the kernel is asked to page them in (`MADV_WILLNEED`), which costs no copy.
+Network mounts are found via /proc/mounts (Linux), `mount` (macOS) or the
+drive type (Windows); anything that cannot be classified counts as local.
+Either way the consumer gets a seekable buffer that `Image.open` can read.
+
+Counters: bytes/files read ahead, hits (buffer ready or in flight), misses
+(read on demand) and stall time (seconds the consumer waited for data).
+"""
+import io
+import mmap
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from . import instrument
+
+DEFAULT_READ_AHEAD_BYTES = 256 * 1024 * 1024
+
+_NETWORK_FS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "ceph", "glusterfs",
+               "fuse.glusterfs", "afs", "lustre", "fuse.rclone", "davfs", "fuse.s3fs",
+               "afpfs", "webdav", "macfuse", "osxfuse"}
+_DRIVE_REMOTE = 4  # GetDriveTypeW
+_mounts_cache: Optional[List] = None
+
+Buffer = Union[io.BytesIO, mmap.mmap]
+
+
+def _mounts() -> List:
+    """[(mount point, fs type)] from /proc/mounts, or `mount` output on macOS; [] if unknown."""
+    global _mounts_cache
+    if _mounts_cache is None:
+        mounts = []
+        try:
+            with open("/proc/mounts", "r") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 3:
+                        mounts.append((parts[1].replace("\\040", " "), parts[2]))
+        except OSError:
+            pass
+        if not mounts and sys.platform == "darwin":
+            # "//user@host/share on /Volumes/share (smbfs, nodev, nosuid, mounted by user)"
+            try:
+                out = subprocess.run(["/sbin/mount"], capture_output=True, text=True, timeout=5).stdout
+            except (OSError, subprocess.SubprocessError):
+                out = ""
+            for line in out.splitlines():
+                head, sep, opts = line.rpartition(" (")
+                point = head.partition(" on ")[2]
+                if sep and point:
+                    mounts.append((point, opts.split(",")[0].rstrip(")").strip()))
+        # Longest mount point first so nested mounts win
+        _mounts_cache = sorted(mounts, key=lambda m: len(m[0]), reverse=True)
+    return _mounts_cache
+
+
+def _is_remote_drive(path: str) -> bool:
+    """Windows: UNC shares and mapped network drives."""
+    real = os.path.abspath(path)
+    if real.startswith("\\\\") and not real.startswith("\\\\?\\"):
+        return True
+    try:
+        import ctypes
+        return ctypes.windll.kernel32.GetDriveTypeW(os.path.splitdrive(real)[0] + "\\") == _DRIVE_REMOTE
+    except (ImportError, AttributeError, OSError):
+        return False
+
+
+def is_network_path(path: str) -> bool:
+    """True for files on a network filesystem; local when that cannot be told."""
+    if os.name == "nt":
+        return _is_remote_drive(path)
+    mounts = _mounts()
+    if not mounts:
+        return False
+    real = os.path.realpath(path)
+    for point, fstype in mounts:
+        if real == point or real.startswith(point.rstrip("/") + "/"):
+            return fstype in _NETWORK_FS or fstype.startswith("fuse.")
+    return False
+
+
+def load_buffer(path: str, use_mmap: Optional[bool] = None) -> Buffer:
+    """Load `path` into a seekable buffer: an mmap for local files, BytesIO otherwise."""
+    if use_mmap is None:
+        use_mmap = not is_network_path(path)
+    if use_mmap:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > 0:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(mm, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+                    mm.madvise(mmap.MADV_WILLNEED)
+                return mm
+    with open(path, "rb") as f:
+        return io.BytesIO(f.read())
+
+
+def buffer_size(buf: Buffer) -> int:
+    return len(buf) if isinstance(buf, mmap.mmap) else buf.getbuffer().nbytes
+
+
+def close_buffer(buf: Optional[Buffer]) -> None:
+    if buf is not None:
+        buf.close()
+
+
+class ReadAhead:
+    """Background loader for inputs consumed (roughly) in `order`."""
+
+    def __init__(self, order: List[str], depth: int = 4, byte_budget: Optional[int] = None,
+                 threads: Optional[int] = None, use_mmap: Optional[bool] = None):
+        self.order = list(order)
+        self.depth = max(0, int(depth))
+        self.byte_budget = DEFAULT_READ_AHEAD_BYTES if byte_budget is None else max(0, int(byte_budget))
+        self.use_mmap = use_mmap
+        self._positions: Dict[str, int] = {}
+        for i, p in enumerate(self.order):
+            self._positions.setdefault(p, i)
+        self._sizes: Dict[str, int] = {}
+        self._cursor = 0
+        self._pending: Dict[str, Future] = {}
+        self._held = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads or min(4, self.depth or 1)))
+        self.counters = {"bytes_read_ahead": 0, "files_read_ahead": 0, "hits": 0, "misses": 0,
+                         "stall_seconds": 0.0}
+        with self._lock:
+            self._top_up()
+
+    def _size(self, path: str) -> int:
+        size = self._sizes.get(path)
+        if size is None:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                size = 0
+            self._sizes[path] = size
+        return size
+
+    def _top_up(self) -> None:
+        """Start loads for the next inputs after the cursor (lock held)."""
+        pos = self._cursor
+        while pos < len(self.order) and len(self._pending) < self.depth:
+            path = self.order[pos]
+            pos += 1
+            if path in self._pending:
+                continue
+            size = self._size(path)
+            if self._pending and self._held + size > self.byte_budget:
+                break
+            self._held += size
+            self._pending[path] = self._pool.submit(load_buffer, path, self.use_mmap)
+            self.counters["bytes_read_ahead"] += size
+            self.counters["files_read_ahead"] += 1
+
+    def get(self, path: str) -> Buffer:
+        """Return the buffer for `path`, waiting for (or doing) the read if needed.
+
+        The caller owns the buffer and should `close_buffer` it when done.
+        """
+        with self._lock:
+            fut = self._pending.pop(path, None)
+            pos = self._positions.get(path)
+            if pos is not None and pos >= self._cursor:
+                self._cursor = pos + 1
+            if fut is not None:
+                self._held -= self._size(path)
+                self.counters["hits"] += 1
+            else:
+                self.counters["misses"] += 1
+            self._top_up()
+        start = time.perf_counter()
+        try:
+            return fut.result() if fut is not None else load_buffer(path, self.use_mmap)
+        finally:
+            waited = time.perf_counter() - start
+            with self._lock:
+                self.counters["stall_seconds"] += waited
+            if instrument.is_enabled():
+                instrument.observe("read", waited)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.counters)
+
+    def close(self) -> None:
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+        for fut in pending:
+            if not fut.cancel():
+                try:
+                    close_buffer(fut.result())
+                except Exception:
+                    pass
+        self._pool.shutdown(wait=True)
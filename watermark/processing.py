@@ -1,6 +1,182 @@
-from typing import Tuple, Optional
-from PIL import Image, ImageDraw, ImageFilter
-from .fonts import load_font
+import threading
+from collections import OrderedDict
+from typing import Tuple, Optional, Sequence
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+from .fonts import font_runs
+from .instrument import stage, timed
+
+
+ANCHOR_MARGIN = 10
+
+# Rasterized high-res text runs, keyed by run text + font + style
+_RUN_CACHE_MAX = 256
+_run_cache: "OrderedDict[Tuple, Image.Image]" = OrderedDict()
+_run_lock = threading.Lock()
+
+# Finished (downscaled, rotated) text stamps, keyed by all rendering arguments
+_STAMP_CACHE_MAX = 64
+_stamp_cache: "OrderedDict[Tuple, Image.Image]" = OrderedDict()
+
+# render_scale 0 ("auto"): the measured scale per font, pixel size and glyph style
+MAX_RENDER_SCALE = 4
+_SCALE_PROBE = "Hag8@"
+_SCALE_TOLERANCE = 0.1
+_SCALE_CACHE_MAX = 256
+_scale_cache: "OrderedDict[Tuple, int]" = OrderedDict()
+
+
+def resolve_anchor(
+    position: str,
+    custom_point: Optional[Tuple[int, int]],
+    base_size: Tuple[int, int],
+    layer_size: Tuple[int, int],
+) -> Tuple[int, int]:
+    """Resolve the top-left paste point of a layer for a nine-grid anchor or custom point."""
+    width, height = base_size
+    lw, lh = layer_size
+    m = ANCHOR_MARGIN
+    if position == "top-left":
+        return (m, m)
+    elif position == "top":
+        return ((width - lw) // 2, m)
+    elif position == "top-right":
+        return (width - lw - m, m)
+    elif position == "left":
+        return (m, (height - lh) // 2)
+    elif position == "center":
+        return ((width - lw) // 2, (height - lh) // 2)
+    elif position == "right":
+        return (width - lw - m, (height - lh) // 2)
+    elif position == "bottom-left":
+        return (m, height - lh - m)
+    elif position == "bottom":
+        return ((width - lw) // 2, height - lh - m)
+    elif position == "bottom-right":
+        return (width - lw - m, height - lh - m)
+    # custom
+    if custom_point is None:
+        return (0, 0)
+    return (max(0, min(width - lw, int(custom_point[0]))),
+            max(0, min(height - lh, int(custom_point[1]))))
+
+
+def _build_tile_layer(size: Tuple[int, int], stamp: Image.Image, spacing: int, stagger: bool) -> Image.Image:
+    """Repeat `stamp` over a layer of `size`.
+
+    The stamp is pasted once into a cell; the cell is doubled into one full-row
+    strip, and the (optionally staggered) row pair is doubled down the layer, so
+    the number of paste calls grows with log(size) instead of the stamp count.
+    """
+    width, height = size
+    sw, sh = stamp.size
+    gap = max(0, int(spacing))
+    step_x = sw + gap
+    step_y = sh + gap
+    half = step_x // 2 if stagger else 0
+
+    # One full-row strip, wide enough to be shifted by half a step
+    strip_w = width + step_x
+    strip = Image.new('RGBA', (strip_w, step_y), (0, 0, 0, 0))
+    strip.paste(stamp, (0, 0))
+    filled = step_x
+    while filled < strip_w:
+        strip.paste(strip.crop((0, 0, filled, step_y)), (filled, 0))
+        filled *= 2
+
+    # Period block: one row, or an even/odd row pair when staggered
+    origin_x = gap // 2
+    rows = 2 if stagger else 1
+    block_h = step_y * rows
+    block = Image.new('RGBA', (width, block_h), (0, 0, 0, 0))
+    block.paste(strip.crop((step_x - origin_x, 0, step_x - origin_x + width, step_y)), (0, 0))
+    if stagger:
+        shift = (step_x - origin_x - half) % step_x
+        block.paste(strip.crop((shift, 0, shift + width, step_y)), (0, step_y))
+
+    layer = Image.new('RGBA', size, (0, 0, 0, 0))
+    origin_y = gap // 2
+    layer.paste(block, (0, origin_y))
+    filled = block_h
+    while origin_y + filled < height:
+        layer.paste(layer.crop((0, origin_y, width, origin_y + filled)), (0, origin_y + filled))
+        filled *= 2
+    return layer
+
+
+def flatten_stamp(stamp: Image.Image) -> Image.Image:
+    """Return `stamp` as it looks after a self-masked paste onto a transparent layer.
+
+    This is how watermarks have always been placed, so blending the flattened
+    stamp directly into the base keeps the established opacity.
+    """
+    flat = Image.new('RGBA', stamp.size, (0, 0, 0, 0))
+    flat.paste(stamp, (0, 0), stamp)
+    return flat
+
+
+def _alpha_composite_at(base: Image.Image, stamp: Image.Image, pos: Tuple[int, int]) -> None:
+    """Alpha-composite `stamp` into `base` in place at `pos`, clipping to the base bounds."""
+    bw, bh = base.size
+    sw, sh = stamp.size
+    x, y = int(pos[0]), int(pos[1])
+    sx0, sy0 = max(0, -x), max(0, -y)
+    sx1, sy1 = min(sw, bw - x), min(sh, bh - y)
+    if sx1 <= sx0 or sy1 <= sy0:
+        return
+    base.alpha_composite(stamp, (x + sx0, y + sy0), (sx0, sy0, sx1, sy1))
+
+
+@timed("composite")
+def blend_stamp(
+    base: Image.Image,
+    stamp: Image.Image,
+    position: str,
+    custom_point: Optional[Tuple[int, int]],
+    tile_spacing: int = 80,
+    tile_stagger: bool = True,
+    flattened: bool = False,
+) -> None:
+    """Blend a prepared RGBA `stamp` into the RGBA `base` in place.
+
+    - `position == "tile"` repeats the stamp across the whole image.
+    - Any other value is resolved via `resolve_anchor`; only the stamp region is touched.
+    - `flattened`: the stamp already went through `flatten_stamp` (e.g. cached).
+    """
+    flat = stamp if flattened else flatten_stamp(stamp)
+    if position == "tile":
+        with stage("tile_layer"):
+            layer = _build_tile_layer(base.size, flat, tile_spacing, tile_stagger)
+        base.alpha_composite(layer)
+    else:
+        _alpha_composite_at(base, flat, resolve_anchor(position, custom_point, base.size, flat.size))
+
+
+def composite_stamp(
+    img: Image.Image,
+    stamp: Image.Image,
+    position: str,
+    custom_point: Optional[Tuple[int, int]],
+    tile_spacing: int = 80,
+    tile_stagger: bool = True,
+) -> Image.Image:
+    """Place a prepared RGBA `stamp` onto `img` and return the composited RGBA image."""
+    with stage("convert"):
+        base = img.convert("RGBA")
+    blend_stamp(base, stamp, position, custom_point, tile_spacing, tile_stagger)
+    return base
+
+
+def clear_run_cache() -> None:
+    with _run_lock:
+        _run_cache.clear()
+        _stamp_cache.clear()
+
+
+def resolve_font_size(base_size: Tuple[int, int], font_size_user: int) -> int:
+    """Return the pixel font size: `font_size_user`, or auto size when it is 0."""
+    width, height = base_size
+    auto_size = int(min(width, height) / 15) if min(width, height) > 0 else 20
+    return int(font_size_user) if int(font_size_user) > 0 else auto_size
 
 
 def apply_text_watermark(
@@ -21,24 +197,179 @@ def apply_text_watermark(
     shadow_color: Optional[str] = None,
     render_scale: int = 1,
     rotation_deg: int = 0,
+    tile_spacing: int = 80,
+    tile_stagger: bool = True,
 ) -> Image.Image:
     """Apply a text watermark to `img` and return a new image.
 
-    - `position`: one of predefined anchors or "custom".
+    - `position`: one of predefined anchors, "custom" or "tile".
     - `custom_point`: (x, y) for text top-left when position == "custom".
+    - `tile_spacing`/`tile_stagger`: gap between repeats and half-step offset of
+      every other row when position == "tile".
     - `opacity_percent`: 0-100.
     - `font_size_user`: 0 means auto size based on image dimensions.
     """
-    width, height = img.size
+    text_layer = render_text_stamp(
+        resolve_font_size(img.size, font_size_user), text, opacity_percent, font_path,
+        font_bold, font_italic, font_color, stroke_width, stroke_color,
+        shadow_enabled, shadow_offset, shadow_color, render_scale, rotation_deg,
+    )
+    return composite_stamp(img, text_layer, position, custom_point, tile_spacing, tile_stagger)
 
-    # Determine font size and load font
-    auto_size = int(min(width, height) / 15) if min(width, height) > 0 else 20
-    font_size = int(font_size_user) if int(font_size_user) > 0 else auto_size
+
+@timed("text_raster")
+def render_text_stamp(
+    font_size: int,
+    text: str,
+    opacity_percent: int,
+    font_path: Optional[str],
+    font_bold: bool,
+    font_italic: bool,
+    font_color: Optional[str] = None,
+    stroke_width: int = 0,
+    stroke_color: Optional[str] = None,
+    shadow_enabled: bool = False,
+    shadow_offset: Tuple[int, int] = (2, 2),
+    shadow_color: Optional[str] = None,
+    render_scale: int = 1,
+    rotation_deg: int = 0,
+    text_runs: Optional[Sequence[str]] = None,
+) -> Image.Image:
+    """Render the styled, rotated text watermark as a standalone RGBA stamp.
+
+    The stamp only depends on the style arguments, so callers may cache it and
+    place it on any number of images via `blend_stamp`/`composite_stamp`.
+    Recent stamps are kept in an LRU cache and returned as is (treat them as
+    read-only), so supersampling is paid once per text and style.
+
+    - `render_scale`: supersampling factor; 0 picks the lowest scale that looks
+      the same as `MAX_RENDER_SCALE` for this font and size (see
+      `resolve_render_scale`).
+
+    - `text_runs`: optional split of `text` (e.g. fixed prefix + per-image value).
+      Each run is rasterized separately and cached, so only runs not seen
+      before are drawn; the runs are then laid out along one baseline.
+    - Characters `font_path` (or the default font) cannot render are drawn
+      with a fallback font that covers them (see `fonts.plan_font_runs`);
+      such text is split into runs per font the same way.
+    - `font_bold`/`font_italic` use the family's real Bold/Italic faces when
+      the font index has them; only otherwise is bold drawn in several offset
+      passes and italic made by skewing the layer.
+    """
+    key = (int(font_size), text, int(opacity_percent), font_path, bool(font_bold), bool(font_italic),
+           font_color, int(stroke_width), stroke_color, bool(shadow_enabled), tuple(shadow_offset),
+           shadow_color, int(render_scale), int(rotation_deg), tuple(text_runs) if text_runs is not None else None)
+    with _run_lock:
+        cached = _stamp_cache.get(key)
+        if cached is not None:
+            _stamp_cache.move_to_end(key)
+            return cached
+    scale = int(render_scale)
+    if scale <= 0:
+        scale = resolve_render_scale(font_size, font_path, font_bold, font_italic, stroke_width)
+    stamp = _render_text_stamp(
+        font_size, text, opacity_percent, font_path, font_bold, font_italic, font_color,
+        stroke_width, stroke_color, shadow_enabled, shadow_offset, shadow_color, scale,
+        rotation_deg, text_runs,
+    )
+    with _run_lock:
+        _stamp_cache[key] = stamp
+        if len(_stamp_cache) > _STAMP_CACHE_MAX:
+            _stamp_cache.popitem(last=False)
+    return stamp
+
+
+def resolve_render_scale(
+    font_size: int,
+    font_path: Optional[str] = None,
+    font_bold: bool = False,
+    font_italic: bool = False,
+    stroke_width: int = 0,
+) -> int:
+    """Return the lowest render scale whose glyphs look the same as at `MAX_RENDER_SCALE`.
+
+    Measured once per font, pixel size and glyph style: the probe glyphs are
+    rendered at every scale and compared with the highest one after aligning
+    their centroids (sub-pixel placement is not a visible difference). The
+    first scale whose ink differs by at most `_SCALE_TOLERANCE` (relative L1)
+    for every probe glyph wins. Hinting makes 1x glyphs visibly thinner or
+    wider at most sizes, while large text usually settles at 2x.
+    """
+    key = (int(font_size), font_path, bool(font_bold), bool(font_italic), max(0, int(stroke_width)))
+    with _run_lock:
+        scale = _scale_cache.get(key)
+        if scale is not None:
+            _scale_cache.move_to_end(key)
+            return scale
+
+    def probe(scale: int):
+        return [
+            _render_text_stamp(font_size, ch, 100, font_path, font_bold, font_italic,
+                               stroke_width=stroke_width, render_scale=scale).getchannel("A")
+            for ch in _SCALE_PROBE
+        ]
+
+    reference = probe(MAX_RENDER_SCALE)
+    scale = MAX_RENDER_SCALE
+    for candidate in range(1, MAX_RENDER_SCALE):
+        if all(_mask_error(mask, ref) <= _SCALE_TOLERANCE for mask, ref in zip(probe(candidate), reference)):
+            scale = candidate
+            break
+    with _run_lock:
+        _scale_cache[key] = scale
+        if len(_scale_cache) > _SCALE_CACHE_MAX:
+            _scale_cache.popitem(last=False)
+    return scale
+
+
+def _centroid(mask: Image.Image) -> Tuple[float, float]:
+    w, h = mask.size
+    cols = mask.resize((w, 1), Image.BOX).tobytes()
+    rows = mask.resize((1, h), Image.BOX).tobytes()
+    return (sum((i + 0.5) * v for i, v in enumerate(cols)) / max(1, sum(cols)),
+            sum((i + 0.5) * v for i, v in enumerate(rows)) / max(1, sum(rows)))
+
+
+def _mask_error(mask: Image.Image, reference: Image.Image) -> float:
+    """Sum of |mask - reference| relative to the reference ink, centroids aligned."""
+    (mx, my), (rx, ry) = _centroid(mask), _centroid(reference)
+    size = (max(mask.size[0], reference.size[0]) + 4, max(mask.size[1], reference.size[1]) + 4)
+    ref = Image.new("L", size, 0)
+    ref.paste(reference, (2, 2))
+    moved = Image.new("L", size, 0)
+    moved.paste(mask, (2, 2))
+    moved = moved.transform(size, Image.AFFINE, (1, 0, mx - rx, 0, 1, my - ry), resample=Image.BILINEAR)
+    diff = ImageChops.difference(moved, ref).histogram()
+    ink = reference.histogram()
+    return sum(i * n for i, n in enumerate(diff)) / max(1, sum(i * n for i, n in enumerate(ink)))
+
+
+def _render_text_stamp(
+    font_size: int,
+    text: str,
+    opacity_percent: int,
+    font_path: Optional[str],
+    font_bold: bool,
+    font_italic: bool,
+    font_color: Optional[str] = None,
+    stroke_width: int = 0,
+    stroke_color: Optional[str] = None,
+    shadow_enabled: bool = False,
+    shadow_offset: Tuple[int, int] = (2, 2),
+    shadow_color: Optional[str] = None,
+    render_scale: int = 1,
+    rotation_deg: int = 0,
+    text_runs: Optional[Sequence[str]] = None,
+) -> Image.Image:
+    # Load font(s) at render scale
     scale = max(1, int(render_scale))
-    font = load_font(font_size * scale, font_path)
+    runs = list(text_runs) if text_runs is not None and len(text_runs) > 1 else [text]
+    segments, synth_italic = font_runs(runs, font_size * scale, font_path, font_bold, font_italic)
+    font = segments[0][1]
 
     # Measure text size at high-res
-    left, top, right, bottom = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+    sw_scaled = max(0, int(stroke_width)) * scale
+    left, top, right, bottom = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font, stroke_width=sw_scaled)
     text_width_hr = max(0, right - left)
     text_height_hr = max(0, bottom - top)
     # Final low-res size after downscale
@@ -46,7 +377,6 @@ def apply_text_watermark(
     text_height = max(1, text_height_hr // scale)
 
     # Prepare layers
-    watermark = Image.new('RGBA', img.size, (0, 0, 0, 0))
     opacity = int(255 * max(0, min(100, opacity_percent)) / 100.0)
 
     def _parse_hex_color(hex_str: Optional[str]) -> Tuple[int, int, int]:
@@ -68,36 +398,29 @@ def apply_text_watermark(
     shr, shg, shb = _parse_hex_color(shadow_color)
     shadow_fill = (shr, shg, shb, max(0, min(255, int(opacity * 0.5))))
 
-    # Draw text to its own layer to simulate bold/italic
-    # Create high-res layer and draw with optional stroke/shadow
-    text_layer_hr = Image.new('RGBA', (text_width_hr + 8 * scale, text_height_hr + 8 * scale), (0, 0, 0, 0))
-    tdraw = ImageDraw.Draw(text_layer_hr)
-    base_pos = (4 * scale, 4 * scale)
-    sw_scaled = max(0, int(stroke_width)) * scale
     off_x = int(shadow_offset[0]) * scale
     off_y = int(shadow_offset[1]) * scale
+    style = (fill_color, stroke_fill, shadow_fill if shadow_enabled else None, sw_scaled, off_x, off_y, segments[0][3], scale)
 
-    # Shadow first
-    if shadow_enabled:
-        tdraw.text((base_pos[0] + off_x, base_pos[1] + off_y), text, font=font, fill=shadow_fill, stroke_width=sw_scaled, stroke_fill=shadow_fill)
-
-    # Bold simulation at high-res
-    if font_bold:
-        tdraw.text(base_pos, text, font=font, fill=fill_color, stroke_width=sw_scaled, stroke_fill=stroke_fill)
-        tdraw.text((base_pos[0] + 1 * scale, base_pos[1]), text, font=font, fill=fill_color, stroke_width=sw_scaled, stroke_fill=stroke_fill)
-        tdraw.text((base_pos[0], base_pos[1] + 1 * scale), text, font=font, fill=fill_color, stroke_width=sw_scaled, stroke_fill=stroke_fill)
+    if len(segments) > 1:
+        text_layer_hr = _compose_runs_hr(segments, style)
     else:
-        tdraw.text(base_pos, text, font=font, fill=fill_color, stroke_width=sw_scaled, stroke_fill=stroke_fill)
+        # Draw text to its own layer to simulate bold/italic
+        # Create high-res layer and draw with optional stroke/shadow
+        text_layer_hr = Image.new('RGBA', (text_width_hr + 8 * scale, text_height_hr + 8 * scale), (0, 0, 0, 0))
+        _draw_text_passes(ImageDraw.Draw(text_layer_hr), (4 * scale - left, 4 * scale - top), text, font, style)
 
-    if font_italic:
+    if synth_italic:
         skew = 0.25
         w, h = text_layer_hr.size
         new_w = int(w + skew * h)
         text_layer_hr = text_layer_hr.transform((new_w, h), Image.AFFINE, (1, skew, 0, 0, 1, 0), resample=Image.BICUBIC)
 
-    # Downscale for high-definition edges
-    dest_w = max(1, text_layer_hr.size[0] // scale)
-    dest_h = max(1, text_layer_hr.size[1] // scale)
+    # Downscale for high-definition edges (pad to whole pixels so glyphs are not squashed)
+    dest_w = max(1, -(-text_layer_hr.size[0] // scale))
+    dest_h = max(1, -(-text_layer_hr.size[1] // scale))
+    if (dest_w * scale, dest_h * scale) != text_layer_hr.size:
+        text_layer_hr = text_layer_hr.crop((0, 0, dest_w * scale, dest_h * scale))
     text_layer = text_layer_hr.resize((dest_w, dest_h), Image.LANCZOS)
 
     # Apply rotation if requested
@@ -105,36 +428,94 @@ def apply_text_watermark(
     if angle:
         text_layer = text_layer.rotate(angle, expand=True, resample=Image.BICUBIC)
 
-    # Resolve position based on final layer size
-    lw, lh = text_layer.size
-    if position == "top-left":
-        pos = (10, 10)
-    elif position == "top":
-        pos = ((width - lw) // 2, 10)
-    elif position == "top-right":
-        pos = (width - lw - 10, 10)
-    elif position == "left":
-        pos = (10, (height - lh) // 2)
-    elif position == "center":
-        pos = ((width - lw) // 2, (height - lh) // 2)
-    elif position == "right":
-        pos = (width - lw - 10, (height - lh) // 2)
-    elif position == "bottom-left":
-        pos = (10, height - lh - 10)
-    elif position == "bottom":
-        pos = ((width - lw) // 2, height - lh - 10)
-    elif position == "bottom-right":
-        pos = (width - lw - 10, height - lh - 10)
+    return text_layer
+
+
+def _draw_text_passes(tdraw: ImageDraw.ImageDraw, base_pos: Tuple[int, int], text: str, font, style: Tuple) -> None:
+    """Draw shadow, (simulated bold) fill and stroke passes of `text` at `base_pos`."""
+    fill_color, stroke_fill, shadow_fill, sw_scaled, off_x, off_y, bold, scale = style
+
+    # Shadow first
+    if shadow_fill is not None:
+        tdraw.text((base_pos[0] + off_x, base_pos[1] + off_y), text, font=font, fill=shadow_fill, stroke_width=sw_scaled, stroke_fill=shadow_fill)
+
+    # Bold simulation at high-res
+    if bold:
+        tdraw.text(base_pos, text, font=font, fill=fill_color, stroke_width=sw_scaled, stroke_fill=stroke_fill)
+        tdraw.text((base_pos[0] + 1 * scale, base_pos[1]), text, font=font, fill=fill_color, stroke_width=sw_scaled, stroke_fill=stroke_fill)
+        tdraw.text((base_pos[0], base_pos[1] + 1 * scale), text, font=font, fill=fill_color, stroke_width=sw_scaled, stroke_fill=stroke_fill)
     else:
-        # custom
-        if custom_point is None:
-            pos = (0, 0)
-        else:
-            pos = (max(0, min(width - lw, int(custom_point[0]))),
-                   max(0, min(height - lh, int(custom_point[1]))))
+        tdraw.text(base_pos, text, font=font, fill=fill_color, stroke_width=sw_scaled, stroke_fill=stroke_fill)
 
-    watermark.paste(text_layer, pos, text_layer)
-    return Image.alpha_composite(img.convert("RGBA"), watermark)
+
+def _run_margin(style: Tuple) -> int:
+    _, _, _, sw_scaled, off_x, off_y, _, scale = style
+    return 4 * scale + sw_scaled + max(abs(off_x), abs(off_y)) + scale
+
+
+def _render_run_hr(run: str, font, font_key: Tuple, style: Tuple) -> Image.Image:
+    """Rasterize one text run at high-res on a margin-padded canvas (LRU cached).
+
+    The canvas height only depends on the font metrics, so runs of the same
+    font share a baseline at y == margin.
+    """
+    key = (run, font_key, style)
+    with _run_lock:
+        cached = _run_cache.get(key)
+        if cached is not None:
+            _run_cache.move_to_end(key)
+            return cached
+    margin = _run_margin(style)
+    try:
+        ascent, descent = font.getmetrics()
+    except Exception:
+        ascent, descent = font.getbbox("Ag")[3], 0
+    advance = int(round(font.getlength(run))) if hasattr(font, "getlength") else font.getbbox(run)[2]
+    layer = Image.new('RGBA', (max(1, advance) + 2 * margin, ascent + descent + 2 * margin), (0, 0, 0, 0))
+    _draw_text_passes(ImageDraw.Draw(layer), (margin, margin), run, font, style)
+    with _run_lock:
+        _run_cache[key] = layer
+        if len(_run_cache) > _RUN_CACHE_MAX:
+            _run_cache.popitem(last=False)
+    return layer
+
+
+def _ascent(font) -> int:
+    try:
+        return font.getmetrics()[0]
+    except Exception:
+        return font.getbbox("Ag")[3]
+
+
+def _compose_runs_hr(segments: Sequence[Tuple[str, object, Tuple, bool]], style: Tuple) -> Image.Image:
+    """Lay out cached run rasters along one baseline and trim to the inked area.
+
+    `segments` are (run, font, font key, synthetic bold); runs in different
+    fonts are shifted so their baselines line up.
+    """
+    layers = []
+    x = 0
+    for run, font, font_key, synth_bold in segments:
+        if not run:
+            continue
+        run_style = style[:6] + (synth_bold,) + style[7:]
+        layers.append((x, _ascent(font), _render_run_hr(run, font, font_key, run_style)))
+        x += int(round(font.getlength(run))) if hasattr(font, "getlength") else font.getbbox(run)[2]
+    if not layers:
+        return Image.new('RGBA', (1, 1), (0, 0, 0, 0))
+    baseline = max(ascent for _, ascent, _ in layers)
+    height = max(baseline - ascent + layer.size[1] for _, ascent, layer in layers)
+    width = max(px + layer.size[0] for px, _, layer in layers)
+    canvas = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    for px, ascent, layer in layers:
+        canvas.alpha_composite(layer, (px, baseline - ascent))
+    # Keep the usual 4px (at 1x) padding around the ink
+    bbox = canvas.getbbox()
+    if bbox is None:
+        return canvas
+    pad = 4 * style[-1]
+    return canvas.crop((max(0, bbox[0] - pad), max(0, bbox[1] - pad),
+                        min(width, bbox[2] + pad), min(height, bbox[3] + pad)))
 
 
 def apply_image_watermark(
@@ -149,6 +530,8 @@ def apply_image_watermark(
     scale_height: int = 0,
     keep_aspect: bool = True,
     rotation_deg: int = 0,
+    tile_spacing: int = 80,
+    tile_stagger: bool = True,
 ) -> Image.Image:
     """Overlay an image watermark onto `img`.
 
@@ -156,14 +539,37 @@ def apply_image_watermark(
     - `opacity_percent`: 0-100 overall watermark transparency.
     - `scale_mode`: "percent" (relative) or "free" (explicit width/height).
     - `keep_aspect` applies when `scale_mode == "free"`.
-    - `position`/`custom_point` follow the same rules as text watermark.
+    - `position`/`custom_point`/`tile_*` follow the same rules as text watermark.
+    """
+    wm_resized = render_image_stamp(
+        watermark_path, opacity_percent, scale_mode, scale_percent,
+        scale_width, scale_height, keep_aspect, rotation_deg,
+    )
+    if wm_resized is None:
+        # If opening watermark fails, just return original image
+        return img.convert("RGBA")
+    return composite_stamp(img, wm_resized, position, custom_point, tile_spacing, tile_stagger)
+
+
+@timed("image_stamp")
+def render_image_stamp(
+    watermark_path: str,
+    opacity_percent: int,
+    scale_mode: str = "percent",
+    scale_percent: int = 100,
+    scale_width: int = 0,
+    scale_height: int = 0,
+    keep_aspect: bool = True,
+    rotation_deg: int = 0,
+) -> Optional[Image.Image]:
+    """Load, scale, rotate and fade an image watermark into a standalone RGBA stamp.
+
+    Returns None when the watermark file cannot be opened.
     """
-    base = img.convert("RGBA")
     try:
         wm = Image.open(watermark_path).convert("RGBA")
     except Exception:
-        # If opening watermark fails, just return original image
-        return base
+        return None
 
     # Compute target size
     ow, oh = wm.size
@@ -201,36 +607,4 @@ def apply_image_watermark(
     overall_alpha = int(255 * max(0, min(100, int(opacity_percent))) / 100.0)
     r, g, b, a = wm_resized.split()
     a = a.point(lambda x: int(x * overall_alpha / 255))
-    wm_resized = Image.merge("RGBA", (r, g, b, a))
-
-    bw, bh = base.size
-    rw, rh = wm_resized.size
-    # Resolve position
-    if position == "top-left":
-        pos = (10, 10)
-    elif position == "top":
-        pos = ((bw - rw) // 2, 10)
-    elif position == "top-right":
-        pos = (bw - rw - 10, 10)
-    elif position == "left":
-        pos = (10, (bh - rh) // 2)
-    elif position == "center":
-        pos = ((bw - rw) // 2, (bh - rh) // 2)
-    elif position == "right":
-        pos = (bw - rw - 10, (bh - rh) // 2)
-    elif position == "bottom-left":
-        pos = (10, bh - rh - 10)
-    elif position == "bottom":
-        pos = ((bw - rw) // 2, bh - rh - 10)
-    elif position == "bottom-right":
-        pos = (bw - rw - 10, bh - rh - 10)
-    else:
-        if custom_point is None:
-            pos = (0, 0)
-        else:
-            pos = (max(0, min(bw - rw, int(custom_point[0]))),
-                   max(0, min(bh - rh, int(custom_point[1]))))
-
-    layer = Image.new("RGBA", base.size, (0, 0, 0, 0))
-    layer.paste(wm_resized, pos, wm_resized)
-    return Image.alpha_composite(base, layer)
\ No newline at end of file
+    return Image.merge("RGBA", (r, g, b, a))
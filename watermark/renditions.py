@@ -0,0 +1,86 @@
+"""Rendition sets: several sizes/formats exported from one decoded input.
+
+A rendition is a dict with the same resize/format fields as a template plus a
+naming `suffix`. The compact spec form used by the CLI and GUI is
+``SIZE[:FORMAT[:QUALITY[:SUFFIX]]]`` where SIZE is ``1920w``, ``1080h``,
+``50%`` or ``orig``, e.g. ``2048w:jpeg:90:_l``.
+"""
+from typing import Dict, List, Tuple
+
+from .exporting import compute_target_size
+
+
+def normalize_rendition(r: Dict) -> Dict:
+    fmt = str(r.get("format", "jpeg")).lower()
+    return {
+        "resize_mode": r.get("resize_mode", "none"),
+        "resize_width": int(r.get("resize_width", 0)),
+        "resize_height": int(r.get("resize_height", 0)),
+        "resize_percent": int(r.get("resize_percent", 0)),
+        "format": "jpeg" if fmt in ("jpeg", "jpg") else "png",
+        "jpeg_quality": int(r.get("jpeg_quality", 90)),
+        "suffix": str(r.get("suffix", "")),
+    }
+
+
+def parse_rendition_spec(spec: str) -> Dict:
+    """Parse ``SIZE[:FORMAT[:QUALITY[:SUFFIX]]]`` into a rendition dict.
+
+    Raises ValueError on an unknown size token.
+    """
+    parts = [p.strip() for p in spec.strip().split(":")]
+    size = parts[0].lower()
+    r: Dict = {}
+    if size in ("", "orig", "original"):
+        r["resize_mode"] = "none"
+    elif size.endswith("%"):
+        r["resize_mode"], r["resize_percent"] = "percent", int(size[:-1])
+    elif size.endswith("w"):
+        r["resize_mode"], r["resize_width"] = "width", int(size[:-1])
+    elif size.endswith("h"):
+        r["resize_mode"], r["resize_height"] = "height", int(size[:-1])
+    else:
+        raise ValueError(f"invalid rendition size: {parts[0]!r}")
+    if len(parts) > 1 and parts[1]:
+        r["format"] = parts[1]
+    if len(parts) > 2 and parts[2]:
+        r["jpeg_quality"] = int(parts[2])
+    if len(parts) > 3:
+        r["suffix"] = parts[3]
+    elif r["resize_mode"] != "none":
+        r["suffix"] = "_" + size.rstrip("%")
+    return normalize_rendition(r)
+
+
+def format_rendition_spec(r: Dict) -> str:
+    r = normalize_rendition(r)
+    mode = r["resize_mode"]
+    if mode == "width":
+        size = f"{r['resize_width']}w"
+    elif mode == "height":
+        size = f"{r['resize_height']}h"
+    elif mode == "percent":
+        size = f"{r['resize_percent']}%"
+    else:
+        size = "orig"
+    return f"{size}:{r['format']}:{r['jpeg_quality']}:{r['suffix']}"
+
+
+def parse_rendition_list(text: str) -> List[Dict]:
+    """Parse a comma-separated list of rendition specs (empty items are ignored)."""
+    return [parse_rendition_spec(item) for item in (text or "").split(",") if item.strip()]
+
+
+def plan_renditions(size: Tuple[int, int], renditions: List[Dict]) -> List[Tuple[Tuple[int, int], List[Dict]]]:
+    """Group renditions by target size, largest first.
+
+    Each size is rendered once and then encoded for every rendition in its
+    group; walking sizes in descending order lets every size be resized
+    from the previous, larger intermediate.
+    """
+    groups: Dict[Tuple[int, int], List[Dict]] = {}
+    for raw in renditions:
+        r = normalize_rendition(raw)
+        target = compute_target_size(size, r["resize_mode"], r["resize_width"], r["resize_height"], r["resize_percent"])
+        groups.setdefault(target, []).append(r)
+    return sorted(groups.items(), key=lambda item: item[0][0] * item[0][1], reverse=True)
@@ -0,0 +1,400 @@
+"""Optional HTTP service: watermark images for other local services.
+
+Endpoints (stdlib `http.server`, meant for localhost):
+
+- ``POST /watermark?template=NAME[&format=jpeg|png][&quality=90][&filename=a.jpg]``
+  with the image bytes as the request body; responds with the watermarked
+  image. Without `template` the last-session settings are used.
+- ``GET /metrics``: request counters, queue depth and p50/p99 latency in the
+  Prometheus text format.
+- ``GET /healthz``: ``ok``.
+
+Rendering runs in a process pool that is warmed up at start (fonts, logos
+and stamp caches of every saved template). Workers keep the templates keyed
+by `ExportSpec.digest`, so a request only sends the digest (plus the spec
+itself for templates saved after start). At most `queue_size` requests
+are accepted at once; further requests get ``503`` with ``Retry-After``
+instead of piling up. Bodies that cannot be decoded get ``400``; server-side
+failures get ``500``, and a pool whose worker died is replaced.
+
+Batching: small bodies (up to `batch_max_bytes`) are queued and sent to the
+pool as one task of up to `batch_size` requests, so a burst of thumbnails
+pays one pickle/IPC round-trip per batch instead of per request. At most
+one batch per worker is in flight; a request never waits for a batch to
+fill, it only rides along with others that arrived while every worker was
+busy. Larger bodies are submitted on their own.
+"""
+import io
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from PIL import Image
+
+from .engine import render_watermarked
+from .exporting import encode_image, resize_image_proportionally
+from .metadata import apply_orientation, image_metadata
+from .settings_io import default_settings_path, read_settings
+from .spec import ExportSpec
+from .templates_io import template_from_settings
+from .variables import build_context
+
+MAX_BODY_BYTES = 256 * 1024 * 1024
+_WARMUP_SIZES = ((1920, 1080), (1080, 1920), (4000, 3000))
+
+
+class UndecodableImage(ValueError):
+    """The request body is not an image Pillow can decode."""
+
+
+def watermark_bytes(data: bytes, tpl: Dict, filename: str = "upload", output_format: Optional[str] = None,
+                    jpeg_quality: Optional[int] = None) -> Tuple[bytes, str]:
+    """Watermark an encoded image with template fields `tpl`; returns (bytes, content type).
+
+    Raises `UndecodableImage` when `data` cannot be decoded.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as src:
+            meta = image_metadata(src)
+            img = apply_orientation(src, meta["orientation"])
+            img.load()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise UndecodableImage(f"cannot decode image: {e}") from None
+    context = build_context(filename, 1, img, meta)
+    out = render_watermarked(img, tpl, context)
+    out = resize_image_proportionally(
+        out,
+        mode=tpl.get("resize_mode", "none"),
+        resize_width=int(tpl.get("resize_width", 0)),
+        resize_height=int(tpl.get("resize_height", 0)),
+        resize_percent=int(tpl.get("resize_percent", 0)),
+    )
+    fmt = (output_format or tpl.get("format", "png")).lower()
+    fmt = "jpeg" if fmt in ("jpeg", "jpg") else "png"
+    buf = io.BytesIO()
+    encode_image(out, fmt, int(jpeg_quality or tpl.get("jpeg_quality", 90)), buf)
+    return buf.getvalue(), "image/jpeg" if fmt == "jpeg" else "image/png"
+
+
+# Worker process state: template fields by spec digest
+_w_templates: Dict[str, Dict] = {}
+
+
+def _warm_worker(specs: List[ExportSpec]) -> None:
+    """Process-pool initializer: load fonts/logos and fill the stamp caches."""
+    for spec in specs:
+        tpl = _w_templates[spec.digest] = spec.to_fields()
+        for size in _WARMUP_SIZES:
+            try:
+                render_watermarked(Image.new("RGBA", size), tpl)
+            except Exception:
+                pass
+
+
+def _watermark_task(data: bytes, key: str, spec: Optional[ExportSpec], filename: str,
+                    output_format: Optional[str], jpeg_quality: Optional[int]) -> Tuple[bytes, str]:
+    """Worker: `watermark_bytes` with the template looked up by digest (`spec` only when new)."""
+    tpl = _w_templates.get(key)
+    if tpl is None:
+        tpl = _w_templates[key] = spec.to_fields()
+    return watermark_bytes(data, tpl, filename, output_format, jpeg_quality)
+
+
+def _watermark_batch(tasks: List[Tuple]) -> List[Tuple[bool, object]]:
+    """Worker: several `_watermark_task` calls in one round-trip; [(ok, result or exception)]."""
+    results: List[Tuple[bool, object]] = []
+    for args in tasks:
+        try:
+            results.append((True, _watermark_task(*args)))
+        except UndecodableImage as e:
+            results.append((False, e))
+        except Exception as e:
+            # Arbitrary exceptions may not pickle; keep their text
+            results.append((False, RuntimeError(f"{type(e).__name__}: {e}")))
+    return results
+
+
+def _ping(delay: float) -> int:
+    time.sleep(delay)
+    return os.getpid()
+
+
+class TemplateStore:
+    """Template specs from the settings file, rebuilt only when it changes."""
+
+    def __init__(self, settings_path: Optional[str] = None):
+        self.path = settings_path or default_settings_path()
+        # Sentinel: the first refresh always builds the specs, even without a settings file
+        self._stamp: object = object()
+        self._specs: Dict[str, ExportSpec] = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> Dict[str, ExportSpec]:
+        """Specs by template name; "" is the last-session settings."""
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        with self._lock:
+            if stamp != self._stamp:
+                settings = read_settings(self.path) or {}
+                try:
+                    specs = {"": ExportSpec.from_fields(template_from_settings(settings))}
+                except (TypeError, ValueError, AttributeError):
+                    specs = {"": ExportSpec()}
+                for tpl in settings.get("templates", []):
+                    if isinstance(tpl, dict) and tpl.get("name") and tpl["name"] not in specs:
+                        # One broken template must not take the others down
+                        try:
+                            specs[tpl["name"]] = ExportSpec.from_fields(tpl)
+                        except (TypeError, ValueError, AttributeError):
+                            continue
+                self._specs, self._stamp = specs, stamp
+            return self._specs
+
+    def get(self, name: Optional[str]) -> Optional[ExportSpec]:
+        return self._refresh().get(name or "")
+
+    def all(self) -> List[ExportSpec]:
+        return list(self._refresh().values())
+
+
+class _Batcher:
+    """Collects small requests and submits them to the service's pool in batches."""
+
+    def __init__(self, service: "WatermarkService", batch_size: int):
+        self.service = service
+        self.batch_size = batch_size
+        self._cond = threading.Condition()
+        self._queue: "deque[Tuple[Tuple, Future]]" = deque()
+        self._free = threading.Semaphore(service.workers)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="watermark-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, args: Tuple) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._queue.append((args, future))
+            self._cond.notify()
+        return future
+
+    def _run(self) -> None:
+        while True:
+            # One batch per worker in flight; requests arriving meanwhile form the next batch
+            self._free.acquire()
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    break
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            try:
+                pool_future = self.service.pool.submit(_watermark_batch, [args for args, _ in batch])
+            except Exception as e:
+                self._free.release()
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            pool_future.add_done_callback(lambda f, batch=batch: self._finish(f, batch))
+        with self._cond:
+            pending, self._queue = list(self._queue), deque()
+        for _, future in pending:
+            future.set_exception(RuntimeError("service is shutting down"))
+
+    def _finish(self, pool_future: Future, batch: List[Tuple[Tuple, Future]]) -> None:
+        self._free.release()
+        try:
+            results = pool_future.result()
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), (ok, value) in zip(batch, results):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._free.release()
+
+
+class _Metrics:
+    def __init__(self, window: int = 10000):
+        self.lock = threading.Lock()
+        self.latencies: "deque[float]" = deque(maxlen=window)
+        self.ok = 0
+        self.errors = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    def quantile(self, q: float) -> float:
+        values = sorted(self.latencies)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+    def render(self, queue_size: int) -> str:
+        with self.lock:
+            lines = [
+                f'watermark_requests_total{{result="ok"}} {self.ok}',
+                f'watermark_requests_total{{result="error"}} {self.errors}',
+                f'watermark_requests_total{{result="rejected"}} {self.rejected}',
+                f"watermark_in_flight {self.in_flight}",
+                f"watermark_queue_limit {queue_size}",
+                f'watermark_latency_seconds{{quantile="0.5"}} {self.quantile(0.5):.6f}',
+                f'watermark_latency_seconds{{quantile="0.99"}} {self.quantile(0.99):.6f}',
+                f"watermark_latency_seconds_count {len(self.latencies)}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+class WatermarkService:
+    """Process pool + bounded admission + HTTP front end."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, workers: Optional[int] = None,
+                 queue_size: int = 32, settings_path: Optional[str] = None, batch_size: int = 8,
+                 batch_max_bytes: int = 1024 * 1024):
+        self.templates = TemplateStore(settings_path)
+        self.workers = max(1, workers or (os.cpu_count() or 1))
+        self.queue_size = max(1, queue_size)
+        self.metrics = _Metrics()
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._pool_lock = threading.Lock()
+        self.pool = self._start_pool()
+        self.batch_max_bytes = max(0, int(batch_max_bytes))
+        self._batcher = _Batcher(self, int(batch_size)) if batch_size > 1 and self.batch_max_bytes else None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    def _start_pool(self) -> ProcessPoolExecutor:
+        """A new process pool, warmed up with every current template."""
+        specs = self.templates.all()
+        self._warm_keys = {spec.digest for spec in specs}
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker, initargs=(specs,))
+        # Start every worker now so the first requests do not pay for spawning/warm-up
+        list(pool.map(_ping, [0.2] * self.workers))
+        return pool
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> None:
+        """Swap in a fresh pool after a worker died (once, however many requests saw it)."""
+        with self._pool_lock:
+            if self.pool is broken:
+                self.pool = self._start_pool()
+        broken.shutdown(wait=False)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def _reply(self, code: int, body: bytes, ctype: str = "text/plain; charset=utf-8", headers=None):
+                self.send_response(code)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path == "/metrics":
+                    self._reply(200, service.metrics.render(service.queue_size).encode("utf-8"),
+                                "text/plain; version=0.0.4")
+                elif path == "/healthz":
+                    self._reply(200, b"ok\n")
+                else:
+                    self._reply(404, b"not found\n")
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                if url.path != "/watermark":
+                    self._reply(404, b"not found\n")
+                    return
+                if length <= 0 or length > MAX_BODY_BYTES:
+                    self.close_connection = True
+                    self._reply(413 if length > 0 else 411, b"image body required\n")
+                    return
+                data = self.rfile.read(length)
+                status, body, ctype, headers = service.handle(data, parse_qs(url.query))
+                self._reply(status, body, ctype, headers)
+
+        return Handler
+
+    def handle(self, data: bytes, query: Dict[str, List[str]]):
+        """Run one request; returns (status, body, content type, headers)."""
+        name = (query.get("template") or [None])[0]
+        spec = self.templates.get(name)
+        if spec is None:
+            return 404, f"template not found: {name}\n".encode("utf-8"), "text/plain; charset=utf-8", {}
+        if not self._slots.acquire(blocking=False):
+            with self.metrics.lock:
+                self.metrics.rejected += 1
+            return 503, b"busy, retry later\n", "text/plain; charset=utf-8", {"Retry-After": "1"}
+        started = time.perf_counter()
+        with self.metrics.lock:
+            self.metrics.in_flight += 1
+        pool = self.pool
+        try:
+            fmt = (query.get("format") or [None])[0]
+            quality = (query.get("quality") or [None])[0]
+            filename = (query.get("filename") or ["upload"])[0]
+            try:
+                quality = int(quality) if quality else None
+            except ValueError:
+                raise UndecodableImage(f"bad quality: {quality}") from None
+            key = spec.digest
+            args = (data, key, None if key in self._warm_keys else spec, filename, fmt, quality)
+            if self._batcher is not None and len(data) <= self.batch_max_bytes:
+                future = self._batcher.submit(args)
+            else:
+                future = pool.submit(_watermark_task, *args)
+            body, ctype = future.result()
+        except Exception as e:
+            with self.metrics.lock:
+                self.metrics.errors += 1
+            if isinstance(e, UndecodableImage):
+                return 400, f"{e}\n".encode("utf-8"), "text/plain; charset=utf-8", {}
+            if isinstance(e, BrokenProcessPool):
+                self._replace_pool(pool)
+            return 500, f"{type(e).__name__}: {e}\n".encode("utf-8"), "text/plain; charset=utf-8", {}
+        finally:
+            self._slots.release()
+            with self.metrics.lock:
+                self.metrics.in_flight -= 1
+        with self.metrics.lock:
+            self.metrics.ok += 1
+            self.metrics.latencies.append(time.perf_counter() - started)
+        return 200, body, ctype, {}
+
+    def serve_forever(self) -> None:
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.httpd.server_close()
+        if self._batcher is not None:
+            self._batcher.close()
+        self.pool.shutdown(wait=False)
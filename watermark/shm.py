@@ -0,0 +1,213 @@
+"""Shared-memory image transport between the export process and its workers.
+
+An image is stored as raw pixels in a `multiprocessing.shared_memory` block
+and described by a small picklable tuple ``(name, mode, (w, h))``; only that
+tuple crosses process boundaries. Pillow images are mapped straight onto the
+block with `Image.frombuffer`, so writing or reading the pixels never goes
+through pickle or an intermediate bytes object.
+
+Encoded input files travel the same way (`SharedBytes`, ref ``(name,
+size)``); the parent creates and unlinks those blocks.
+
+Ownership: the process that creates a block for a result hands it over with
+`SharedImage.detach` (the receiver unlinks it); blocks published by the
+parent (watermark stamps) are unlinked by the parent when they are evicted
+or the batch ends, and workers drop their views of evicted blocks.
+"""
+import io
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Hashable, Iterable, Tuple
+from PIL import Image
+
+ImageRef = Tuple[str, str, Tuple[int, int]]
+BytesRef = Tuple[str, int]
+
+_BYTES_PER_PIXEL = {"RGBA": 4, "RGB": 3, "L": 1, "LA": 2}
+
+
+class SharedImage:
+    """A Pillow image whose pixel buffer lives in shared memory."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, mode: str, size: Tuple[int, int]):
+        self.shm = shm
+        self.mode = mode
+        self.size = size
+        self._view = None
+
+    @classmethod
+    def create(cls, mode: str, size: Tuple[int, int]) -> "SharedImage":
+        if mode not in _BYTES_PER_PIXEL:
+            raise ValueError(f"unsupported shared image mode: {mode}")
+        nbytes = max(1, size[0] * size[1] * _BYTES_PER_PIXEL[mode])
+        return cls(shared_memory.SharedMemory(create=True, size=nbytes), mode, size)
+
+    @classmethod
+    def from_image(cls, img: Image.Image) -> "SharedImage":
+        """Copy `img` into a new shared block (one pixel copy, no pickling)."""
+        if img.mode not in _BYTES_PER_PIXEL:
+            img = img.convert("RGBA")
+        shared = cls.create(img.mode, img.size)
+        view = shared.image(writable=True)
+        view.paste(img, (0, 0))
+        return shared
+
+    @classmethod
+    def attach(cls, ref: ImageRef) -> "SharedImage":
+        name, mode, size = ref
+        return cls(shared_memory.SharedMemory(name=name), mode, tuple(size))
+
+    @property
+    def ref(self) -> ImageRef:
+        return (self.shm.name, self.mode, self.size)
+
+    def image(self, writable: bool = False) -> Image.Image:
+        """Zero-copy Pillow view of the block."""
+        if self._view is None:
+            self._view = Image.frombuffer(self.mode, self.size, self.shm.buf, "raw", self.mode, 0, 1)
+        if writable:
+            # frombuffer views are flagged read-only; writes then land in the shared block
+            self._view.readonly = 0
+        return self._view
+
+    def detach(self) -> ImageRef:
+        """Hand the block to another process: close it here without unlinking.
+
+        The creator's resource tracker entry is dropped so this process does
+        not remove the block at exit while the receiver still uses it.
+        """
+        ref = self.ref
+        self._view = None
+        try:
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass
+        self.shm.close()
+        return ref
+
+    def close(self) -> None:
+        self._view = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+
+    def unlink(self) -> None:
+        self.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedBytes:
+    """Encoded file bytes in a shared memory block, created and unlinked by the parent."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, size: int):
+        self.shm = shm
+        self.size = size
+
+    @classmethod
+    def from_buffer(cls, data) -> "SharedBytes":
+        """Copy a bytes-like object (or a BytesIO's contents) into a new block."""
+        view = data.getbuffer() if isinstance(data, io.BytesIO) else memoryview(data)
+        try:
+            shared = cls(shared_memory.SharedMemory(create=True, size=max(1, view.nbytes)), view.nbytes)
+            shared.shm.buf[:view.nbytes] = view
+        finally:
+            view.release()
+        return shared
+
+    @property
+    def ref(self) -> BytesRef:
+        return (self.shm.name, self.size)
+
+    @staticmethod
+    def open(ref: BytesRef) -> io.BytesIO:
+        """Receiver side: the bytes of `ref` as a seekable buffer (the block is closed again)."""
+        name, size = ref
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            with shm.buf[:size] as view:
+                return io.BytesIO(view)
+        finally:
+            shm.close()
+
+    def unlink(self) -> None:
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class StampPublisher:
+    """Parent side: publish each prepared stamp once, reuse its ref for every task.
+
+    Blocks are keyed by the stamp's cache key (`layers.stamp_key`) and
+    bounded like the stamp cache: past `max_entries`, the least recently
+    used blocks that no queued task holds (see `release`) are unlinked.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max(1, int(max_entries))
+        self._published: "OrderedDict[Hashable, SharedImage]" = OrderedDict()
+        self._pins: Dict[Hashable, int] = {}
+
+    def publish(self, key: Hashable, stamp: Image.Image) -> ImageRef:
+        """Ref of the block for `key` (created from `stamp` on first use), pinned until `release`."""
+        shared = self._published.get(key)
+        if shared is None:
+            shared = self._published[key] = SharedImage.from_image(stamp)
+        else:
+            self._published.move_to_end(key)
+        self._pins[key] = self._pins.get(key, 0) + 1
+        self._evict()
+        return shared.ref
+
+    def release(self, keys: Iterable[Hashable]) -> None:
+        """Unpin the blocks of a finished task."""
+        for key in keys:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+        self._evict()
+
+    def _evict(self) -> None:
+        for key in list(self._published):
+            if len(self._published) <= self.max_entries:
+                break
+            if key not in self._pins:
+                self._published.pop(key).unlink()
+
+    def live(self) -> Tuple[str, ...]:
+        """Names of the blocks still published (workers keep views of these only)."""
+        return tuple(shared.shm.name for shared in self._published.values())
+
+    def close(self) -> None:
+        for shared in self._published.values():
+            shared.unlink()
+        self._published.clear()
+        self._pins.clear()
+
+
+class StampViews:
+    """Worker side: attach published stamps once and keep the views."""
+
+    def __init__(self):
+        self._attached: Dict[str, SharedImage] = {}
+
+    def retain(self, names: Iterable[str]) -> None:
+        """Detach the views of blocks the parent no longer publishes."""
+        names = set(names)
+        for name in [n for n in self._attached if n not in names]:
+            self._attached.pop(name).close()
+
+    def get(self, ref: ImageRef) -> Image.Image:
+        shared = self._attached.get(ref[0])
+        if shared is None:
+            shared = SharedImage.attach(ref)
+            self._attached[ref[0]] = shared
+        return shared.image()
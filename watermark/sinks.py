@@ -0,0 +1,321 @@
+"""Output sinks: where encoded images go.
+
+`DirectorySink` writes one file per output via `save_image`. `ArchiveSink`
+streams encoded images into a single ZIP (stored, no recompression) or TAR
+file, so delivery bundles do not need a write-then-read-back pass. Memory
+stays flat: ZIP entries are encoded straight into the archive stream, TAR
+entries (which need their size up front) go through a spooled buffer that
+spills to disk above `spool_limit` bytes.
+
+`WriteBehindSink` encodes in the calling thread and leaves the file I/O to
+a dedicated writer thread, so rendering never waits on a slow disk.
+"""
+import errno
+import io
+import os
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from PIL import Image
+
+from .exporting import encode_image, save_image
+from .instrument import timed
+
+ARCHIVE_FORMATS = ("zip", "tar")
+
+
+def archive_format_for(path: str) -> Optional[str]:
+    """"zip"/"tar" from an archive file name, None for anything else."""
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return ext if ext in ARCHIVE_FORMATS else None
+
+
+class DirectorySink:
+    """Write each output as its own file (the default)."""
+
+    def write(self, img: Image.Image, output_format: str, jpeg_quality: int, output_path: str) -> str:
+        save_image(img, output_format, jpeg_quality, output_path)
+        return output_path
+
+    def close(self) -> None:
+        pass
+
+
+class ArchiveSink:
+    """Stream outputs into one ZIP or TAR archive.
+
+    The archive is built under a temporary name and renamed on `close`, so a
+    crashed export never leaves a truncated archive at `path`. Entry names
+    are the output file names; reported output paths are `path/entry`.
+    """
+
+    def __init__(self, path: str, spool_limit: int = 16 * 1024 * 1024):
+        fmt = archive_format_for(path)
+        if fmt is None:
+            raise ValueError(f"unsupported archive type: {path!r} (use .zip or .tar)")
+        self.path = path
+        self.format = fmt
+        self.spool_limit = spool_limit
+        self._tmp_path = path + ".part"
+        if fmt == "zip":
+            self._zip = zipfile.ZipFile(self._tmp_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+            self._tar = None
+        else:
+            self._zip = None
+            self._tar = tarfile.open(self._tmp_path, "w")
+        self._names = set()
+        self._lock = threading.Lock()
+
+    def _entry_name(self, output_path: str) -> str:
+        name = os.path.basename(output_path)
+        root, ext = os.path.splitext(name)
+        n = 1
+        while name in self._names:
+            n += 1
+            name = f"{root}_{n}{ext}"
+        self._names.add(name)
+        return name
+
+    def write(self, img: Image.Image, output_format: str, jpeg_quality: int, output_path: str) -> str:
+        # One entry at a time: archive streams are sequential
+        with self._lock:
+            return self._write_entry(img, output_format, jpeg_quality, output_path)
+
+    def _write_entry(self, img: Image.Image, output_format: str, jpeg_quality: int, output_path: str) -> str:
+        name = self._entry_name(output_path)
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with self._zip.open(info, "w", force_zip64=True) as fp:
+                encode_image(img, output_format, jpeg_quality, fp)
+        else:
+            with tempfile.SpooledTemporaryFile(max_size=self.spool_limit) as buf:
+                encode_image(img, output_format, jpeg_quality, buf)
+                info = tarfile.TarInfo(name)
+                info.size = buf.tell()
+                info.mtime = int(time.time())
+                buf.seek(0)
+                self._tar.addfile(info, buf)
+        return os.path.join(self.path, name)
+
+    def close(self) -> None:
+        """Finalize the archive and move it into place."""
+        if self._zip is None and self._tar is None:
+            return
+        (self._zip or self._tar).close()
+        self._zip = self._tar = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Discard a partially written archive."""
+        if self._zip is None and self._tar is None:
+            return
+        try:
+            (self._zip or self._tar).close()
+        finally:
+            self._zip = self._tar = None
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+
+
+class WriteBehindSink:
+    """Encode in memory, write files on a background thread.
+
+    `write` returns as soon as the encoded bytes are queued; the writer
+    thread stores them as temp file + rename. Producers block only while
+    more than `max_pending_bytes` are queued (the time is counted as
+    `stall_seconds`).
+
+    Durability: with `fsync_every` (files) or `fsync_interval` (seconds)
+    set, written files and their folders are fsync'd in batches, and a file
+    only counts as completed once its batch is synced. Without a policy a
+    file is completed after the rename.
+
+    Callers that must not treat an output as done before it is on disk use
+    `outstanding` and `completed` (see `engine._run_batch`). Completion is
+    tracked by output path, so a second write to a path already used by this
+    sink (two inputs mapping to one output name) raises instead of being
+    confused with, or silently replacing, the first.
+    """
+
+    def __init__(self, max_pending_bytes: int = 256 * 1024 * 1024, fsync_every: int = 0,
+                 fsync_interval: float = 0.0):
+        self.max_pending_bytes = max(1, int(max_pending_bytes))
+        self.fsync_every = max(0, int(fsync_every))
+        self.fsync_interval = max(0.0, float(fsync_interval))
+        self._queue = deque()
+        self._pending_bytes = 0
+        self._cond = threading.Condition()
+        self._closing = False
+        self._aborted = False
+        self._tracked: Set[str] = set()
+        self._paths: Set[str] = set()
+        self._done: List[str] = []
+        self._failed: Dict[str, str] = {}
+        self._unsynced: List[str] = []
+        self._last_sync = time.monotonic()
+        self.counters = {"files": 0, "bytes": 0, "encode_seconds": 0.0, "write_seconds": 0.0,
+                         "stall_seconds": 0.0, "drain_seconds": 0.0, "fsyncs": 0, "fsync_seconds": 0.0}
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def write(self, img: Image.Image, output_format: str, jpeg_quality: int, output_path: str) -> str:
+        start = time.perf_counter()
+        buf = io.BytesIO()
+        encode_image(img, output_format, jpeg_quality, buf)
+        data = buf.getbuffer()
+        encoded = time.perf_counter()
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("write-behind sink is closed")
+            if output_path in self._paths:
+                raise ValueError(f"output {output_path} is already written by another input")
+            self._paths.add(output_path)
+            while self._pending_bytes and self._pending_bytes + data.nbytes > self.max_pending_bytes:
+                self._cond.wait()
+            self._queue.append((output_path, data))
+            self._pending_bytes += data.nbytes
+            self._tracked.add(output_path)
+            self.counters["encode_seconds"] += encoded - start
+            self.counters["stall_seconds"] += time.perf_counter() - encoded
+            self._cond.notify_all()
+        return output_path
+
+    def _sync_due(self) -> bool:
+        if not self._unsynced:
+            return False
+        if self.fsync_every and len(self._unsynced) >= self.fsync_every:
+            return True
+        return bool(self.fsync_interval) and time.monotonic() - self._last_sync >= self.fsync_interval
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    if self._unsynced and self.fsync_interval:
+                        self._cond.wait(max(0.0, self._last_sync + self.fsync_interval - time.monotonic()))
+                        if self._sync_due():
+                            break
+                    else:
+                        self._cond.wait()
+                if self._queue:
+                    output_path, data = self._queue.popleft()
+                elif self._closing:
+                    break
+                else:
+                    output_path = data = None
+            if output_path is not None:
+                self._write_file(output_path, data)
+                with self._cond:
+                    self._pending_bytes -= data.nbytes
+                    self._cond.notify_all()
+                data = None
+            if self._sync_due():
+                self._sync()
+        if self._unsynced and not self._aborted:
+            self._sync()
+
+    @timed("write")
+    def _write_file(self, output_path: str, data) -> None:
+        tmp_path = output_path + ".part"
+        start = time.perf_counter()
+        try:
+            if self._aborted:
+                raise RuntimeError("export aborted")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, output_path)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._cond:
+                self.counters["write_seconds"] += time.perf_counter() - start
+                self._failed[output_path] = str(e)
+            return
+        with self._cond:
+            self.counters["write_seconds"] += time.perf_counter() - start
+            self.counters["files"] += 1
+            self.counters["bytes"] += data.nbytes
+            if self.fsync_every or self.fsync_interval:
+                self._unsynced.append(output_path)
+            else:
+                self._done.append(output_path)
+
+    def _sync(self) -> None:
+        """fsync every file written since the last sync, then their folders."""
+        with self._cond:
+            batch, self._unsynced = self._unsynced, []
+        start = time.perf_counter()
+        failed: Dict[str, str] = {}
+        folders: Dict[str, List[str]] = {}
+        for path in batch:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                folders.setdefault(os.path.dirname(os.path.abspath(path)), []).append(path)
+            except OSError as e:
+                failed[path] = f"fsync failed: {e}"
+        for folder, paths in folders.items():
+            try:
+                fd = os.open(folder, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                # Some filesystems cannot fsync directories; the files themselves are synced
+                if e.errno not in (errno.EINVAL, errno.EBADF, errno.EACCES, errno.EISDIR):
+                    failed.update((p, f"fsync failed: {e}") for p in paths)
+        with self._cond:
+            self._done.extend(p for p in batch if p not in failed)
+            self._failed.update(failed)
+            self.counters["fsyncs"] += 1
+            self.counters["fsync_seconds"] += time.perf_counter() - start
+        self._last_sync = time.monotonic()
+
+    def outstanding(self, paths: Iterable[str]) -> Set[str]:
+        """The `paths` accepted by this sink and not yet reported by `completed`."""
+        with self._cond:
+            return {p for p in paths if p in self._tracked}
+
+    def completed(self) -> Tuple[List[str], Dict[str, str]]:
+        """(written paths, {path: error}) since the previous call."""
+        with self._cond:
+            done, self._done = self._done, []
+            failed, self._failed = self._failed, {}
+            self._tracked.difference_update(done)
+            self._tracked.difference_update(failed)
+        return done, failed
+
+    def flush(self) -> None:
+        """Write (and sync, with a policy) everything queued so far; stops the writer."""
+        start = time.perf_counter()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        with self._cond:
+            self.counters["drain_seconds"] += time.perf_counter() - start
+
+    def close(self) -> None:
+        self.flush()
+
+    def abort(self) -> None:
+        """Drop queued outputs that have not been written yet."""
+        self._aborted = True
+        self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        """Counters plus write throughput (MB/s of writer busy time)."""
+        with self._cond:
+            stats = dict(self.counters)
+        busy = stats["write_seconds"] + stats["fsync_seconds"]
+        stats["write_mb_per_s"] = stats["bytes"] / 1e6 / busy if busy > 0 else 0.0
+        return stats
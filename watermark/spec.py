@@ -0,0 +1,170 @@
+"""Frozen watermark/export settings with a stable content hash.
+
+`WatermarkSpec` holds everything that decides how the watermark looks and
+where it is placed; `ExportSpec` adds the output settings (format, naming,
+resize, renditions). Both map one-to-one onto the flat template fields:
+`ExportSpec.from_fields` fills defaults and coerces types, `to_fields`
+turns a spec back into a template dict. This module is the single list of
+template fields and their defaults.
+
+`digest` is the sha1 of the canonical JSON form, so equal settings give the
+same key in every process and session; it keys the export manifest and the
+service's per-worker template cache (requests carry the 40-byte digest
+instead of the template). Specs are immutable and hashable.
+"""
+import hashlib
+import json
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Optional, Tuple
+
+from .layers import normalize_layer
+from .renditions import normalize_rendition
+
+# A layer or rendition dict frozen as sorted (key, value) pairs
+FrozenDict = Tuple[Tuple[str, Any], ...]
+
+
+def _freeze(d: Dict) -> FrozenDict:
+    return tuple(sorted(d.items()))
+
+
+_TRUE_STRINGS = {"1", "true", "yes", "on", "y", "t"}
+_FALSE_STRINGS = {"", "0", "false", "no", "off", "n", "f", "none", "null"}
+
+
+def _coerce(value: Any, default: Any) -> Any:
+    """Convert `value` to the type of `default`; unusable values give the default."""
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        # Hand-edited or query-string values: "false"/"0"/"off" must not count as set
+        if isinstance(value, str):
+            text = value.strip().lower()
+            if text in _TRUE_STRINGS:
+                return True
+            return False if text in _FALSE_STRINGS else default
+        return bool(value)
+    if isinstance(default, int):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+    if isinstance(default, str):
+        return str(value)
+    # Optional paths: empty means unset
+    return str(value) if value else None
+
+
+def _clean(d: Dict, defaults: Dict) -> Dict:
+    """`d` with every known field coerced like `_coerce` (malformed values become the default)."""
+    return {k: _coerce(v, defaults[k]) if k in defaults else v for k, v in d.items()}
+
+
+_LAYER_DEFAULTS = normalize_layer({})
+_RENDITION_DEFAULTS = normalize_rendition({})
+
+
+class _Spec:
+    __slots__ = ()
+
+    @property
+    def digest(self) -> str:
+        """sha1 hex of the canonical JSON form (stable across processes and runs)."""
+        if not self._digest:
+            object.__setattr__(self, "_digest", hashlib.sha1(self.to_json().encode("utf-8")).hexdigest())
+        return self._digest
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_fields(), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+@dataclass(frozen=True, eq=True)
+class WatermarkSpec(_Spec):
+    """How a watermark looks and where it goes (flat template field names)."""
+
+    text: str = ""
+    opacity: int = 50
+    position: str = "bottom-right"
+    custom_x: int = 0
+    custom_y: int = 0
+    font_path: Optional[str] = None
+    font_size: int = 0
+    font_bold: bool = False
+    font_italic: bool = False
+    font_color: str = "#000000"
+    font_stroke_width: int = 0
+    font_stroke_color: str = "#000000"
+    font_shadow_enabled: bool = False
+    font_shadow_offset_x: int = 2
+    font_shadow_offset_y: int = 2
+    font_shadow_color: str = "#000000"
+    render_scale: int = 1
+    watermark_type: str = "text"
+    image_watermark_path: Optional[str] = None
+    image_scale_mode: str = "percent"
+    image_scale_percent: int = 50
+    image_scale_width: int = 200
+    image_scale_height: int = 200
+    image_keep_aspect: bool = True
+    watermark_rotation: int = 0
+    tile_spacing: int = 80
+    tile_stagger: bool = True
+    # Ordered layer stack (bottom first); replaces the single watermark when non-empty
+    layers: Tuple[FrozenDict, ...] = ()
+    _digest: str = field(default="", init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_fields(cls, tpl: Dict) -> "WatermarkSpec":
+        values = {f.name: _coerce(tpl.get(f.name), f.default) for f in _WATERMARK_FIELDS if f.name != "layers"}
+        layers = tpl.get("layers") or []
+        values["layers"] = tuple(_freeze(normalize_layer(_clean(layer, _LAYER_DEFAULTS)))
+                                 for layer in layers if isinstance(layer, dict))
+        return cls(**values)
+
+    def to_fields(self) -> Dict[str, Any]:
+        out = {f.name: getattr(self, f.name) for f in _WATERMARK_FIELDS}
+        out["layers"] = [dict(layer) for layer in self.layers]
+        return out
+
+
+@dataclass(frozen=True, eq=True)
+class ExportSpec(_Spec):
+    """A watermark plus output format, naming, resize and renditions."""
+
+    watermark: WatermarkSpec = WatermarkSpec()
+    format: str = "png"
+    naming: str = "original"
+    prefix: str = ""
+    suffix: str = ""
+    jpeg_quality: int = 90
+    resize_mode: str = "none"
+    resize_width: int = 0
+    resize_height: int = 0
+    resize_percent: int = 0
+    # Rendition set: several sizes/formats from one decode; empty means single output
+    renditions: Tuple[FrozenDict, ...] = ()
+    _digest: str = field(default="", init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_fields(cls, tpl: Dict) -> "ExportSpec":
+        """Build from flat template fields; missing or malformed fields get defaults."""
+        values = {f.name: _coerce(tpl.get(f.name), f.default) for f in _EXPORT_FIELDS
+                  if f.name not in ("watermark", "renditions")}
+        renditions = tpl.get("renditions") or []
+        values["renditions"] = tuple(_freeze(normalize_rendition(_clean(r, _RENDITION_DEFAULTS)))
+                                     for r in renditions if isinstance(r, dict))
+        return cls(watermark=WatermarkSpec.from_fields(tpl), **values)
+
+    def to_fields(self) -> Dict[str, Any]:
+        """The flat template fields (without "name")."""
+        out = self.watermark.to_fields()
+        out.update((f.name, getattr(self, f.name)) for f in _EXPORT_FIELDS if f.name != "watermark")
+        out["renditions"] = [dict(r) for r in self.renditions]
+        return out
+
+
+_WATERMARK_FIELDS = tuple(f for f in fields(WatermarkSpec) if not f.name.startswith("_"))
+_EXPORT_FIELDS = tuple(f for f in fields(ExportSpec) if not f.name.startswith("_"))
+
+# Every flat template field, in template order
+TEMPLATE_FIELDS = tuple(f.name for f in _WATERMARK_FIELDS) + tuple(f.name for f in _EXPORT_FIELDS if f.name != "watermark")
@@ -0,0 +1,93 @@
+"""Startup timing breakdown for `main.py --profile-startup`.
+
+`enable()` starts the clock and hooks `__import__`, so every module imported
+afterwards is timed; the time is attributed to the module's top-level
+package (self time, nested imports of other packages excluded). `mark(label)`
+records a named phase of window construction; both are no-ops unless
+enabled. `report_lines()` lists the phases in order and the slowest
+import packages.
+"""
+import builtins
+import importlib.util
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+_enabled = False
+_t0 = 0.0
+_last = 0.0
+_marks: List[Tuple[str, float, float]] = []
+_imports: Dict[str, float] = {}
+_stack: List[List[float]] = []
+_original_import = builtins.__import__
+_main_thread: Optional[int] = None
+
+
+def _resolve(name: str, globals_, level: int) -> str:
+    if level <= 0:
+        return name
+    package = (globals_ or {}).get("__package__") or ""
+    try:
+        return importlib.util.resolve_name("." * level + name, package)
+    except (ImportError, ValueError):
+        return package
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    full = _resolve(name, globals, level)
+    # Already loaded (the common case) or imported from a helper thread: nothing to time
+    if not full or full in sys.modules or threading.get_ident() != _main_thread:
+        return _original_import(name, globals, locals, fromlist, level)
+    frame = [time.perf_counter(), 0.0]
+    _stack.append(frame)
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _stack.pop()
+        elapsed = time.perf_counter() - frame[0]
+        top = full.split(".")[0]
+        _imports[top] = _imports.get(top, 0.0) + elapsed - frame[1]
+        if _stack:
+            _stack[-1][1] += elapsed
+
+
+def enable() -> None:
+    global _enabled, _t0, _last, _main_thread
+    if _enabled:
+        return
+    _enabled = True
+    _t0 = _last = time.perf_counter()
+    _main_thread = threading.get_ident()
+    builtins.__import__ = _timed_import
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def mark(label: str) -> None:
+    """Close the current phase under `label` (no-op unless enabled)."""
+    global _last
+    if not _enabled:
+        return
+    now = time.perf_counter()
+    _marks.append((label, now - _last, now - _t0))
+    _last = now
+
+
+def finish() -> None:
+    """Stop timing imports (the marks stay available)."""
+    if builtins.__import__ is _timed_import:
+        builtins.__import__ = _original_import
+
+
+def report_lines(top: int = 12) -> List[str]:
+    lines = ["startup phases (ms, cumulative):"]
+    for label, seconds, total in _marks:
+        lines.append(f"  {label:<28} {seconds * 1000:9.1f} {total * 1000:10.1f}")
+    if _imports:
+        lines.append("imports by top-level package (self ms):")
+        for name, seconds in sorted(_imports.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+            lines.append(f"  {name:<28} {seconds * 1000:9.1f}")
+    return lines
@@ -1,5 +1,7 @@
 from typing import List, Dict, Optional
 
+from .spec import ExportSpec
+
 
 def add_or_update_template(templates: List[Dict], tpl: Dict) -> List[Dict]:
     name = tpl.get("name")
@@ -30,43 +32,38 @@ def find_template(templates: List[Dict], name: str) -> Optional[Dict]:
 
 
 def normalize_template_fields(tpl: Dict) -> Dict:
-    # Ensure essential fields exist; fallback to defaults if missing
-    fields = {
-        "name": tpl.get("name", ""),
-        "text": tpl.get("text", ""),
-        "opacity": tpl.get("opacity", 50),
-        "position": tpl.get("position", "bottom-right"),
-        "format": tpl.get("format", "png"),
-        "naming": tpl.get("naming", "original"),
-        "prefix": tpl.get("prefix", ""),
-        "suffix": tpl.get("suffix", ""),
-        "jpeg_quality": tpl.get("jpeg_quality", 90),
-        "resize_mode": tpl.get("resize_mode", "none"),
-        "resize_width": tpl.get("resize_width", 0),
-        "resize_height": tpl.get("resize_height", 0),
-        "resize_percent": tpl.get("resize_percent", 0),
-        "font_path": tpl.get("font_path"),
-        "font_size": tpl.get("font_size", 0),
-        "font_bold": tpl.get("font_bold", False),
-        "font_italic": tpl.get("font_italic", False),
-        "font_color": tpl.get("font_color", "#000000"),
-        # Advanced text style fields
-        "font_stroke_width": tpl.get("font_stroke_width", 0),
-        "font_stroke_color": tpl.get("font_stroke_color", "#000000"),
-        "font_shadow_enabled": tpl.get("font_shadow_enabled", False),
-        "font_shadow_offset_x": tpl.get("font_shadow_offset_x", 2),
-        "font_shadow_offset_y": tpl.get("font_shadow_offset_y", 2),
-        "font_shadow_color": tpl.get("font_shadow_color", "#000000"),
-        "render_scale": tpl.get("render_scale", 1),
-        # Image watermark fields
-        "watermark_type": tpl.get("watermark_type", "text"),
-        "image_watermark_path": tpl.get("image_watermark_path"),
-        "image_scale_mode": tpl.get("image_scale_mode", "percent"),
-        "image_scale_percent": tpl.get("image_scale_percent", 50),
-        "image_scale_width": tpl.get("image_scale_width", 200),
-        "image_scale_height": tpl.get("image_scale_height", 200),
-        "image_keep_aspect": tpl.get("image_keep_aspect", True),
-        # Rotation for both text and image watermarks
-        "watermark_rotation": tpl.get("watermark_rotation", 0),
-    }
-    return fields
\ No newline at end of file
+    """Template fields with defaults filled in and types coerced (see `spec.ExportSpec`)."""
+    fields = {"name": tpl.get("name", "")}
+    fields.update(ExportSpec.from_fields(tpl).to_fields())
+    return fields
+
+
+# Keys of the flat settings file that differ from the template field names
+_SETTINGS_TO_TEMPLATE = {
+    "watermark_text": "text",
+    "watermark_opacity": "opacity",
+    "watermark_position": "position",
+    "output_format": "format",
+    "output_naming": "naming",
+    "output_prefix": "prefix",
+    "output_suffix": "suffix",
+    "watermark_layers": "layers",
+}
+
+
+_TEMPLATE_TO_SETTINGS = {v: k for k, v in _SETTINGS_TO_TEMPLATE.items()}
+
+
+def template_from_settings(settings: Dict, defaults: Optional[Dict] = None) -> Dict:
+    """Convert the last-session settings dict into normalized template fields.
+
+    Fields missing from `settings` come from `defaults` (template fields) when given.
+    """
+    tpl = dict(defaults or {})
+    tpl.update((_SETTINGS_TO_TEMPLATE.get(k, k), v) for k, v in settings.items() if k != "templates")
+    return normalize_template_fields(tpl)
+
+
+def settings_from_spec(spec: ExportSpec) -> Dict:
+    """The settings-file keys for `spec` (inverse of `template_from_settings`)."""
+    return {_TEMPLATE_TO_SETTINGS.get(k, k): v for k, v in spec.to_fields().items()}
@@ -0,0 +1,155 @@
+"""Pick the export concurrency (thread vs process pool, worker count) by measurement.
+
+A short calibration exports a few images of the actual batch with each
+candidate configuration into a scratch folder and keeps the one with the
+highest megapixel throughput. The choice is cached per machine and workload
+class (typical image size and output format) in
+``~/.watermark_app/tuning.json``, so later batches start immediately.
+"""
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import PIL
+
+from .settings_io import default_settings_path, ensure_parent_dir
+
+# Batches smaller than this are not worth calibrating; they reuse a cached choice or run in-process
+MIN_CALIBRATION_BATCH = 16
+# Configurations within this fraction of the best are treated as ties, the one with fewer workers wins
+_TIE_MARGIN = 0.05
+
+
+def tuning_path() -> str:
+    return os.path.join(os.path.dirname(default_settings_path()), "tuning.json")
+
+
+def machine_key() -> str:
+    return (f"{platform.machine() or 'cpu'}-{os.cpu_count() or 1}cpu-"
+            f"py{sys.version_info[0]}.{sys.version_info[1]}-pillow{PIL.__version__}")
+
+
+def workload_key(paths: List[str], tpl: Dict) -> str:
+    """Bucket by median megapixels (powers of two) and output format."""
+    from .parallel import estimate_cost
+
+    sample = paths[:: max(1, len(paths) // 64)][:64]
+    mp = statistics.median([estimate_cost(p)[0] / 1e6 for p in sample]) if sample else 0.0
+    bucket = int(round(math.log2(max(mp, 0.25))))
+    fmt = str(tpl.get("format", "png")).lower()
+    return f"{fmt}-{bucket:+d}"
+
+
+def load_tuning() -> Dict:
+    try:
+        with open(tuning_path(), "r") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_choice(key: str, choice: Dict) -> None:
+    data = load_tuning()
+    data.setdefault(machine_key(), {})[key] = choice
+    path = tuning_path()
+    ensure_parent_dir(path)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def candidate_configs(pool: str = "auto") -> List[Tuple[str, int]]:
+    """(pool, workers) pairs to try; ("process", 1) means in-process."""
+    cpus = os.cpu_count() or 1
+    counts = sorted({n for n in (2, 4, cpus) if 2 <= n <= max(2, cpus)})
+    pools = ("thread", "process") if pool == "auto" else (pool,)
+    return [("process", 1)] + [(p, n) for p in pools for n in counts]
+
+
+def _calibration_sample(paths: List[str], size: int) -> List[str]:
+    """`size` inputs spread evenly over the batch's size distribution."""
+    from .parallel import estimate_cost
+
+    ordered = sorted(paths, key=lambda p: estimate_cost(p)[0])
+    if len(ordered) <= size:
+        return ordered
+    step = len(ordered) / float(size)
+    return [ordered[int(i * step + step / 2)] for i in range(size)]
+
+
+def calibrate(
+    paths: List[str],
+    tpl: Dict,
+    pool: str = "auto",
+    log: Optional[Callable[[str], None]] = None,
+) -> Dict:
+    """Measure every candidate on a sample of `paths`; returns the best as a choice dict.
+
+    The choice dict has "pool", "workers", "mp_per_s" and "results"
+    ([pool, workers, mp_per_s] for every candidate).
+    """
+    from .engine import _export_items
+    from .parallel import estimate_cost
+
+    configs = candidate_configs(pool)
+    sample = _calibration_sample(paths, max(4, max(n for _, n in configs)))
+    megapixels = sum(estimate_cost(p)[0] for p in sample) / 1e6
+    items = [(i + 1, p) for i, p in enumerate(sample)]
+    results = []
+    for kind, workers in configs:
+        out = tempfile.mkdtemp(prefix="wm_tune_")
+        try:
+            start = time.perf_counter()
+            for _ in _export_items(items, out, tpl, None, workers, "shm", 0, kind):
+                pass
+            rate = megapixels / max(time.perf_counter() - start, 1e-6)
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+        results.append([kind, workers, round(rate, 2)])
+        if log is not None:
+            label = "in-process" if workers == 1 else f"{kind} x{workers}"
+            log(f"calibration: {label}: {rate:.1f} MP/s")
+    best_rate = max(r[2] for r in results)
+    # Fewest workers among near-ties: same speed with less memory
+    kind, workers, rate = min((r for r in results if r[2] >= best_rate * (1 - _TIE_MARGIN)), key=lambda r: r[1])
+    return {"pool": kind, "workers": workers, "mp_per_s": rate, "results": results,
+            "measured_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def resolve_concurrency(
+    paths: List[str],
+    tpl: Dict,
+    workers="auto",
+    pool: str = "auto",
+    recalibrate: bool = False,
+    log: Optional[Callable[[str], None]] = None,
+) -> Tuple[str, int, str]:
+    """Return (pool, workers, source) for exporting `paths`.
+
+    - `workers`: an int overrides the count; "auto" (or 0/None) uses the
+      cached or calibrated choice.
+    - `pool`: "thread"/"process" overrides the pool type; "auto" chooses.
+    `source` is "manual", "cached", "calibrated" or "default".
+    """
+    manual_workers = workers not in (None, 0, "auto")
+    if manual_workers and pool != "auto":
+        return pool, int(workers), "manual"
+    key = workload_key(paths, tpl)
+    cached = load_tuning().get(machine_key(), {}).get(key)
+    if cached and not recalibrate and pool in ("auto", cached.get("pool")):
+        return cached["pool"], int(workers) if manual_workers else int(cached["workers"]), "cached"
+    if len(paths) < MIN_CALIBRATION_BATCH:
+        return ("process" if pool == "auto" else pool), int(workers) if manual_workers else 1, "default"
+    choice = calibrate(paths, tpl, pool, log)
+    if pool == "auto":
+        save_choice(key, choice)
+    return choice["pool"], int(workers) if manual_workers else int(choice["workers"]), "calibrated"
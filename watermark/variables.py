@@ -0,0 +1,104 @@
+import os
+import time
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image
+
+from .metadata import read_metadata
+
+
+# Supported per-image variables, e.g. "© Studio 2026 — {filename}" or "{width}x{height}"
+TEXT_VARIABLES = ("filename", "name", "ext", "index", "width", "height", "date_taken", "camera")
+
+_formatter = Formatter()
+
+
+def has_variables(text: str) -> bool:
+    """Return True when `text` contains at least one `{field}` placeholder."""
+    if not text or "{" not in text:
+        return False
+    try:
+        return any(field is not None for _, field, _, _ in _formatter.parse(text))
+    except ValueError:
+        return False
+
+
+def build_context(
+    path: str,
+    index: int,
+    img: Optional[Image.Image] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Collect variable values for one input image.
+
+    - `index`: 1-based position of the image in the batch.
+    - `img`: the (oriented) image, used for its size.
+    - `metadata`: header metadata; read lazily via `read_metadata` when omitted.
+      The capture date falls back to the file mtime.
+    """
+    base = os.path.basename(path)
+    name, ext = os.path.splitext(base)
+    meta = metadata if metadata is not None else read_metadata(path)
+    width, height = img.size if img is not None else (meta.get("width", 0), meta.get("height", 0))
+    date_taken = meta.get("date_taken", "")
+    if not date_taken:
+        try:
+            date_taken = time.strftime("%Y-%m-%d", time.localtime(os.path.getmtime(path)))
+        except OSError:
+            date_taken = ""
+    return {
+        "filename": base,
+        "name": name,
+        "ext": ext.lstrip("."),
+        "index": int(index),
+        "width": int(width),
+        "height": int(height),
+        "date_taken": date_taken,
+        "camera": " ".join(p for p in (meta.get("camera_make", ""), meta.get("camera_model", "")) if p),
+    }
+
+
+def resolve_runs(text: str, context: Dict[str, Any]) -> List[Tuple[str, bool]]:
+    """Split `text` into (run, is_static) pairs with variables substituted.
+
+    Literal parts are static and can be cached by the renderer; unknown or
+    malformed placeholders are kept verbatim as static text.
+    """
+    runs: List[Tuple[str, bool]] = []
+    try:
+        parsed = list(_formatter.parse(text))
+    except ValueError:
+        return [(text, True)]
+    for literal, field, spec, conv in parsed:
+        if literal:
+            runs.append((literal, True))
+        if field is None:
+            continue
+        if field in context:
+            value = context[field]
+            if conv == "r":
+                value = repr(value)
+            elif conv == "s" or conv == "a":
+                value = str(value)
+            try:
+                runs.append((format(value, spec or ""), False))
+                continue
+            except (ValueError, TypeError):
+                pass
+        raw = "{" + field + ("!" + conv if conv else "") + (":" + spec if spec else "") + "}"
+        runs.append((raw, True))
+    # Merge adjacent static runs so they are cached as one piece
+    merged: List[Tuple[str, bool]] = []
+    for run, static in runs:
+        if merged and static and merged[-1][1]:
+            merged[-1] = (merged[-1][0] + run, True)
+        else:
+            merged.append((run, static))
+    return merged
+
+
+def resolve_text(text: str, context: Optional[Dict[str, Any]]) -> str:
+    """Substitute variables in `text`; returns `text` unchanged without a context."""
+    if not context or not has_variables(text):
+        return text
+    return "".join(run for run, _ in resolve_runs(text, context))
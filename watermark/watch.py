@@ -0,0 +1,290 @@
+"""Hot-folder watch mode: export images as they are dropped into input folders.
+
+New or changed files are detected with inotify on Linux (via ctypes, no extra
+dependency) or by polling `scan_directory_for_images` elsewhere. A file is
+only exported once its size and mtime have been stable for `settle` seconds,
+so copies still in progress are not picked up half-written. Stable files are
+queued and exported by a bounded thread pool; the export manifest of the
+output folder keeps restarts from redoing finished work.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .engine import export_one, export_renditions
+from .manifest import ExportManifest
+from .media import is_supported_image, scan_directory_for_images
+
+# inotify(7) constants
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Recursive inotify watcher; `wait(timeout)` returns changed file paths."""
+
+    def __init__(self, folders: List[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[int, str] = {}
+        self._rescan = False
+        for folder in folders:
+            self._watch_tree(folder)
+
+    def _watch_tree(self, folder: str) -> None:
+        for root, _, _ in os.walk(folder):
+            wd = self._add_watch(self._fd, os.fsencode(root), _WATCH_MASK)
+            if wd >= 0:
+                self._dirs[wd] = root
+
+    def wait(self, timeout: float) -> Optional[List[str]]:
+        """Changed paths, or None when events were lost and a full rescan is needed."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        changed: List[str] = []
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos + _EVENT_HEADER.size <= len(buf):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(buf, pos)
+                name = buf[pos + _EVENT_HEADER.size:pos + _EVENT_HEADER.size + length].rstrip(b"\0")
+                pos += _EVENT_HEADER.size + length
+                if mask & _IN_Q_OVERFLOW:
+                    self._rescan = True
+                    continue
+                folder = self._dirs.get(wd)
+                if folder is None or not name:
+                    continue
+                path = os.path.join(folder, os.fsdecode(name))
+                if mask & _IN_ISDIR:
+                    if mask & (_IN_CREATE | _IN_MOVED_TO):
+                        # New sub-folder: watch it and pick up files copied in before the watch existed
+                        self._watch_tree(path)
+                        changed.extend(scan_directory_for_images(path))
+                else:
+                    changed.append(path)
+        if self._rescan:
+            self._rescan = False
+            return None
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """Portable fallback: rescan the folders every `interval` seconds."""
+
+    def __init__(self, folders: List[str], interval: float = 1.0):
+        self.folders = list(folders)
+        self.interval = interval
+        self._seen: Dict[str, Tuple[int, int]] = self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snap = {}
+        for folder in self.folders:
+            for p in scan_directory_for_images(folder):
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                snap[p] = (st.st_size, st.st_mtime_ns)
+        return snap
+
+    def wait(self, timeout: float) -> Optional[List[str]]:
+        time.sleep(max(timeout, self.interval))
+        snap = self._snapshot()
+        changed = [p for p, stamp in snap.items() if self._seen.get(p) != stamp]
+        self._seen = snap
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def make_watcher(folders: List[str], poll: bool = False, interval: float = 1.0):
+    """inotify on Linux unless `poll` is set or it is unavailable; polling otherwise."""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folders)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(folders, interval)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class HotFolder:
+    """Watch `inputs` and export stable new images to `output_dir` with `tpl`.
+
+    - `workers`: size of the export thread pool; at most `workers` files are
+      decoded at once, the rest wait in the queue.
+    - `settle`: seconds a file's size/mtime must stay unchanged before export.
+    - `log(line)`: receives one line per exported/failed file and a metrics
+      line (queue depth, settling files, latency percentiles) every
+      `metrics_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        inputs: List[str],
+        output_dir: str,
+        tpl: Dict,
+        workers: Optional[int] = None,
+        settle: float = 2.0,
+        poll: bool = False,
+        interval: float = 1.0,
+        metrics_interval: float = 10.0,
+        log: Callable[[str], None] = print,
+    ):
+        self.inputs = [os.path.abspath(p) for p in inputs]
+        self.output_dir = os.path.abspath(output_dir)
+        self.tpl = tpl
+        self.workers = max(1, workers or min(4, os.cpu_count() or 1))
+        self.settle = settle
+        self.poll = poll
+        self.interval = interval
+        self.metrics_interval = metrics_interval
+        self.log = log
+        self._settling: Dict[str, Tuple[Tuple[int, int], float, float]] = {}
+        self._queue: "deque[Tuple[str, float]]" = deque()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._index = 0
+        self._done = 0
+        self._failed = 0
+        self._skipped = 0
+        self._latencies: "deque[float]" = deque(maxlen=1000)
+        self._manifest = ExportManifest(self.output_dir, tpl)
+
+    def _track(self, path: str, now: float) -> None:
+        path = os.path.abspath(path)
+        if not is_supported_image(path) or path.startswith(self.output_dir + os.sep):
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._settling.pop(path, None)
+            return
+        stamp = (st.st_size, st.st_mtime_ns)
+        prev = self._settling.get(path)
+        if prev is None or prev[0] != stamp:
+            first_seen = prev[2] if prev else now
+            self._settling[path] = (stamp, now, first_seen)
+
+    def _promote_stable(self, now: float) -> None:
+        for path, (stamp, since, first_seen) in list(self._settling.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._settling[path]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != stamp:
+                self._settling[path] = (current, now, first_seen)
+            elif current[0] > 0 and now - since >= self.settle:
+                del self._settling[path]
+                self._queue.append((path, first_seen))
+
+    def _export(self, path: str, first_seen: float) -> None:
+        started = time.monotonic()
+        with self._lock:
+            self._index += 1
+            index = self._index
+            key = self._manifest.key_for(path, index)
+            current = self._manifest.is_current(path, key)
+        try:
+            if current:
+                with self._lock:
+                    self._skipped += 1
+                return
+            if self.tpl.get("renditions"):
+                outputs = export_renditions(path, self.output_dir, self.tpl, index=index)
+            else:
+                outputs = [export_one(path, self.output_dir, self.tpl, index=index)]
+            finished = time.monotonic()
+            with self._lock:
+                self._manifest.record(path, key, outputs)
+                self._done += 1
+                self._latencies.append(finished - first_seen)
+            self.log(f"exported {path} in {(finished - started) * 1000:.0f} ms "
+                     f"(latency {(finished - first_seen) * 1000:.0f} ms since detected)")
+        except Exception as e:
+            with self._lock:
+                self._failed += 1
+            self.log(f"failed: {path}: {e}")
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def metrics_line(self) -> str:
+        with self._lock:
+            lat = list(self._latencies)
+            return (f"[watch] queue={len(self._queue)} settling={len(self._settling)} active={self._active} "
+                    f"done={self._done} skipped={self._skipped} failed={self._failed} "
+                    f"latency p50={_percentile(lat, 50) * 1000:.0f}ms p95={_percentile(lat, 95) * 1000:.0f}ms")
+
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        """Watch until `stop` is set (or KeyboardInterrupt)."""
+        stop = stop or threading.Event()
+        os.makedirs(self.output_dir, exist_ok=True)
+        watcher = make_watcher(self.inputs, self.poll, self.interval)
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        now = time.monotonic()
+        for folder in self.inputs:
+            for p in scan_directory_for_images(folder):
+                self._track(p, now)
+        next_metrics = now + self.metrics_interval
+        try:
+            while not stop.is_set():
+                changed = watcher.wait(min(self.interval, self.settle / 2.0 or self.interval))
+                now = time.monotonic()
+                if changed is None:
+                    changed = [p for folder in self.inputs for p in scan_directory_for_images(folder)]
+                for p in changed:
+                    self._track(p, now)
+                self._promote_stable(now)
+                while self._queue and self._active < self.workers:
+                    path, first_seen = self._queue.popleft()
+                    with self._lock:
+                        self._active += 1
+                    pool.submit(self._export, path, first_seen)
+                if now >= next_metrics:
+                    self.log(self.metrics_line())
+                    next_metrics = now + self.metrics_interval
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+            pool.shutdown(wait=True)
+            with self._lock:
+                self._manifest.save()
+            self.log(self.metrics_line())
@@ -3,6 +3,8 @@
 
 import os
 import json
+import time
+import threading
 
 # 直接尝试导入 PyQt5（优先）或 PySide6 的具体类，便于编辑器类型解析
 try:
@@ -16,7 +18,7 @@ try:
         QPixmap, QImage, QFont, QColor, QPainter, QDrag, QIcon
     )
     from PyQt5.QtCore import (
-        Qt, QSize, QPoint, QRect, QMimeData, QByteArray
+        Qt, QSize, QPoint, QRect, QMimeData, QByteArray, QTimer, QThread
     )
     QT_LIB = "PyQt5"
 except Exception:
@@ -31,7 +33,7 @@ except Exception:
             QPixmap, QImage, QFont, QColor, QPainter, QDrag, QIcon
         )
         from PySide6.QtCore import (
-            Qt, QSize, QPoint, QRect, QMimeData, QByteArray
+            Qt, QSize, QPoint, QRect, QMimeData, QByteArray, QTimer, QThread
         )
         QT_LIB = "PySide6"
     except Exception as e:
@@ -45,10 +47,17 @@ except Exception as e:
 
 # 抽离模块：字体、处理、导出、设置
 from watermark.fonts import scan_system_font_files, load_font
-from watermark.processing import apply_text_watermark, apply_image_watermark
-from watermark.exporting import resize_image_proportionally, save_image
+from watermark.layers import layer_from_template
+from watermark import instrument, startup
+from watermark.variables import build_context
+from watermark.metadata import read_metadata, apply_orientation
+from watermark.renditions import parse_rendition_list, format_rendition_spec
 from watermark.settings_io import read_settings, write_settings
-from watermark.templates_io import add_or_update_template, list_template_names, find_template, normalize_template_fields
+from watermark.spec import ExportSpec, TEMPLATE_FIELDS
+from watermark.templates_io import (
+    add_or_update_template, list_template_names, find_template, normalize_template_fields,
+    settings_from_spec, template_from_settings,
+)
 from watermark.media import is_supported_image, scan_directory_for_images, make_output_basename
 from watermark.preview import pil_to_qimage
 from ui.preview_basic import PreviewBasicUI
@@ -56,6 +65,36 @@ from ui.font_settings import FontSettingsUI
 from ui.position_grid import PositionGridUI
 from ui.output_settings import OutputSettingsUI
 
+# 模板字段与窗口属性同名，以下除外；custom_x/custom_y 对应 watermark_position_custom
+_SPEC_ATTRS = {
+    "text": "watermark_text",
+    "opacity": "watermark_opacity",
+    "position": "watermark_position",
+    "format": "output_format",
+    "naming": "output_naming",
+    "prefix": "output_prefix",
+    "suffix": "output_suffix",
+    "font_size": "font_size_user",
+    "layers": "watermark_layers",
+}
+
+
+class _ExportThread(QThread):
+    """在后台线程运行并发校准与导出，界面保持响应；主线程在 finished 后读取 report/error（无需自定义信号）"""
+
+    def __init__(self, job, parent=None):
+        super().__init__(parent)
+        self._job = job
+        self.report = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.report = self._job()
+        except Exception as e:
+            self.error = e
+
+
 class WatermarkApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -81,6 +120,16 @@ class WatermarkApp(QMainWindow):
         self.resize_width = 1920
         self.resize_height = 1080
         self.resize_percent = 100
+        # 多尺寸/多格式导出（一次解码输出多个版本），为空时按单一输出
+        self.renditions = []
+        # 打包输出：""（逐个文件）/"zip"（存储，不压缩）/"tar"
+        self.archive_format = ""
+        # 导出并发：池类型 "auto"/"thread"/"process"，进程/线程数 0 表示按校准结果自动选择
+        self.export_pool = "auto"
+        self.export_workers = 0
+        self._export_thread = None  # 进行中的后台导出（_ExportThread）
+        # 导出时统计各阶段耗时并在完成提示中显示
+        self.stage_metrics = False
         # 文本水印字体设置（高级）
         self.font_path = None  # 选中的字体文件路径（ttf/otf/ttc）
         self.font_size_user = 36  # 用户指定字号（像素），0 表示自动
@@ -95,7 +144,8 @@ class WatermarkApp(QMainWindow):
         self.font_shadow_offset_y = 2
         self.font_shadow_color = "#000000"
         self.render_scale = 1
-        self._available_fonts = scan_system_font_files()
+        # 系统字体列表由后台线程扫描，完成后再填充字体下拉框（见 _start_font_scan）
+        self._available_fonts = []
         # 图片水印设置（高级）
         self.watermark_type = "text"  # text | image
         self.image_watermark_path = None
@@ -106,6 +156,12 @@ class WatermarkApp(QMainWindow):
         self.image_keep_aspect = True
         # 通用：水印旋转角度（0-360）
         self.watermark_rotation = 0
+        # 平铺模式：间距（像素）与隔行错位
+        self.tile_spacing = 80
+        self.tile_stagger = True
+        # 多图层叠加：有序图层列表（底层在前），非空时替代单一水印
+        self.watermark_layers = []
+        startup.mark("window: state")
         
         # 设置中心部件
         self.central_widget = QWidget()
@@ -118,12 +174,19 @@ class WatermarkApp(QMainWindow):
         
         # 创建左侧面板
         self.create_left_panel()
+        startup.mark("window: left panel")
         
         # 创建右侧面板
         self.create_right_panel()
+        startup.mark("window: right panel")
         
         # 加载上次的设置
         self.load_settings()
+        startup.mark("window: load settings")
+
+        # 较少使用的面板与字体扫描推迟到窗口显示之后，不阻塞启动
+        self._start_font_scan()
+        QTimer.singleShot(0, self._build_deferred_panels)
 
     # ==== 拖拽导入支持 ====
     def dragEnterEvent(self, event):
@@ -171,6 +234,10 @@ class WatermarkApp(QMainWindow):
         _pg = PositionGridUI(self)
         settings_layout.addWidget(_pg.group)
 
+        # 图层叠加（子组件，较少使用，首帧显示后由 _build_deferred_panels 构建）
+        self._layer_stack_layout = QVBoxLayout()
+        settings_layout.addLayout(self._layer_stack_layout)
+
         # 无需手动拖拽开关，拖拽默认可用
         
         # 输出设置（子组件）
@@ -202,6 +269,51 @@ class WatermarkApp(QMainWindow):
         # 添加到主布局
         self.main_layout.addWidget(right_panel, 2)
         
+    def _build_deferred_panels(self):
+        """构建推迟的面板（图层叠加），状态由面板构造时从宿主同步"""
+        from ui.layer_stack import LayerStackUI
+        _ls = LayerStackUI(self)
+        self._layer_stack_layout.addWidget(_ls.group)
+        startup.mark("window: deferred panels")
+
+    def _start_font_scan(self):
+        """在后台线程扫描系统字体；主线程用定时器轮询结果（兼容 PyQt5/PySide6，无需自定义信号）"""
+        self._font_scan_result = None
+
+        def _scan():
+            try:
+                self._font_scan_result = scan_system_font_files()
+            except Exception as e:
+                print(f"扫描字体失败: {e}")
+                self._font_scan_result = []
+
+        threading.Thread(target=_scan, name="font-scan", daemon=True).start()
+        self._font_scan_timer = QTimer(self)
+        self._font_scan_timer.timeout.connect(self._poll_font_scan)
+        self._font_scan_timer.start(50)
+
+    def _poll_font_scan(self):
+        """字体扫描完成后填充字体下拉框，并选中已保存的字体"""
+        fonts = self._font_scan_result
+        if fonts is None:
+            return
+        self._font_scan_timer.stop()
+        self._available_fonts = fonts
+        if not hasattr(self, "font_combo"):
+            return
+        combo = self.font_combo
+        combo.blockSignals(True)
+        while combo.count() > 1:
+            combo.removeItem(1)
+        for name, path in fonts:
+            combo.addItem(name, userData=path)
+        combo.blockSignals(False)
+        if self.font_path:
+            idx = combo.findData(self.font_path)
+            if idx >= 0:
+                combo.setCurrentIndex(idx)
+        startup.mark("font scan")
+
     def import_images(self):
         """导入图片"""
         file_dialog = QFileDialog()
@@ -321,11 +433,13 @@ class WatermarkApp(QMainWindow):
             image_path = self.images[self.current_image_index]
             
             try:
-                # 使用PIL添加水印
-                img = Image.open(image_path)
+                # 使用PIL添加水印（按 EXIF 方向摆正）
+                meta = read_metadata(image_path)
+                img = apply_orientation(Image.open(image_path), meta["orientation"])
                 
-                # 添加水印
-                watermarked_img = self.apply_watermark(img)
+                # 添加水印（文本变量按当前图片解析）
+                context = build_context(image_path, self.current_image_index + 1, img, meta)
+                watermarked_img = self.apply_watermark(img, context)
                 # 记录原图尺寸用于坐标映射
                 self._last_image_size = (watermarked_img.width, watermarked_img.height)
                 
@@ -344,43 +458,14 @@ class WatermarkApp(QMainWindow):
                 self.preview_label.setText(f"无法打开图片:\n{os.path.basename(image_path)}\n错误: {str(e)}")
                 self.preview_label.setAlignment(Qt.AlignCenter)
     
-    def apply_watermark(self, img):
-        """应用水印到图片（委托处理模块）"""
-        custom_point = (self.watermark_position_custom.x(), self.watermark_position_custom.y())
-        if getattr(self, "watermark_type", "text") == "image" and self.image_watermark_path:
-            return apply_image_watermark(
-                img,
-                watermark_path=self.image_watermark_path,
-                position=self.watermark_position,
-                custom_point=custom_point,
-                opacity_percent=int(self.watermark_opacity),
-                scale_mode=str(getattr(self, "image_scale_mode", "percent")),
-                scale_percent=int(getattr(self, "image_scale_percent", 50)),
-                scale_width=int(getattr(self, "image_scale_width", 200)),
-                scale_height=int(getattr(self, "image_scale_height", 200)),
-                keep_aspect=bool(getattr(self, "image_keep_aspect", True)),
-                rotation_deg=int(getattr(self, "watermark_rotation", 0)),
-            )
-        else:
-            return apply_text_watermark(
-                img,
-                text=self.watermark_text,
-                position=self.watermark_position,
-                custom_point=custom_point,
-                opacity_percent=int(self.watermark_opacity),
-                font_path=self.font_path,
-                font_size_user=int(self.font_size_user),
-                font_bold=bool(self.font_bold),
-                font_italic=bool(self.font_italic),
-                font_color=self.font_color,
-                stroke_width=int(getattr(self, "font_stroke_width", 0)),
-                stroke_color=getattr(self, "font_stroke_color", "#000000"),
-                shadow_enabled=bool(getattr(self, "font_shadow_enabled", False)),
-                shadow_offset=(int(getattr(self, "font_shadow_offset_x", 2)), int(getattr(self, "font_shadow_offset_y", 2))),
-                shadow_color=getattr(self, "font_shadow_color", "#000000"),
-                render_scale=int(getattr(self, "render_scale", 1)),
-                rotation_deg=int(getattr(self, "watermark_rotation", 0)),
-            )
+    def apply_watermark(self, img, context=None):
+        """应用水印到图片（委托导出引擎，单一水印视为单图层）"""
+        from watermark.engine import render_watermarked
+        return render_watermarked(img, self._collect_template_fields(), context)
+
+    def _current_layer(self):
+        """将当前单一水印设置转换为一个图层"""
+        return layer_from_template(self._collect_template_fields())
 
     def _load_font(self, font_size):
         """包装为外部统一的字体加载器（保留兼容调用）。"""
@@ -483,41 +568,101 @@ class WatermarkApp(QMainWindow):
         else:
             indices = [self.current_image_index]
         
-        # 导出每张图片
-        for idx in indices:
-            if idx >= 0 and idx < len(self.images):
-                input_path = self.images[idx]
-                
-                # 生成输出文件名
-                filename = os.path.basename(input_path)
-                output_name = make_output_basename(filename, self.output_naming, self.output_prefix, self.output_suffix)
-                
-                # 添加扩展名
-                if self.output_format.lower() == "jpeg":
-                    output_path = os.path.join(output_dir, f"{output_name}.jpg")
-                else:
-                    output_path = os.path.join(output_dir, f"{output_name}.png")
-                
-                # 打开原图并添加水印
-                img = Image.open(input_path)
-                watermarked_img = self.apply_watermark(img)
-                # 按导出缩放设置处理
-                watermarked_img = resize_image_proportionally(
-                    watermarked_img,
-                    mode=self.resize_mode,
-                    resize_width=int(self.resize_width),
-                    resize_height=int(self.resize_height),
-                    resize_percent=int(self.resize_percent),
-                )
-                # 保存图片
-                save_image(
-                    watermarked_img,
-                    output_format=self.output_format,
-                    jpeg_quality=int(self.jpeg_quality),
-                    output_path=output_path,
-                )
-        
-        QMessageBox.information(self, "成功", "图片导出完成")
+        # 导出每张图片（委托导出引擎，文本变量按图片逐张解析）
+        paths = [self.images[idx] for idx in indices if 0 <= idx < len(self.images)]
+        tpl = normalize_template_fields(self._collect_template_fields())
+        archive = None
+        if self.archive_format:
+            archive = f"watermarked_{time.strftime('%Y%m%d_%H%M%S')}.{self.archive_format}"
+        export_workers, export_pool = self.export_workers or "auto", self.export_pool
+
+        def _job():
+            # 导出引擎与并发校准模块较重，首次导出时再导入
+            from watermark.engine import export_images as engine_export_images
+            from watermark.tuning import resolve_concurrency
+            # 并发方式：手动指定，或按本机缓存/对本批少量图片的校准结果选择（校准可能耗时数秒）
+            pool, workers, _ = resolve_concurrency(paths, tpl, export_workers, export_pool)
+            return engine_export_images(paths, output_dir, tpl, archive=archive, workers=workers, pool=pool)
+
+        self._start_stage_metrics()
+        self._run_export(_job)
+
+    def resume_export(self):
+        """继续输出目录中中断的导出任务（按任务日志跳过已完成的图片）"""
+        output_dir = QFileDialog.getExistingDirectory(self, "选择未完成导出的输出文件夹")
+        if not output_dir:
+            return
+        from watermark.journal import load_job
+        job = load_job(output_dir)
+        if job is None:
+            QMessageBox.information(self, "提示", "该文件夹中没有可继续的导出任务")
+            return
+        if job["finished"] and not job["pending"]:
+            QMessageBox.information(self, "提示", "该文件夹中的导出任务已全部完成")
+            return
+
+        def _job():
+            from watermark.engine import resume_export as engine_resume_export
+            return engine_resume_export(output_dir)
+
+        self._start_stage_metrics()
+        self._run_export(_job)
+
+    def _set_export_buttons_enabled(self, enabled):
+        for button in (self.export_button, self.export_all_button, self.left_panel.resume_export_button):
+            button.setEnabled(enabled)
+
+    def _run_export(self, job):
+        """在后台线程执行导出任务，完成后在主线程显示结果；导出期间禁用导出按钮"""
+        self._set_export_buttons_enabled(False)
+        self._export_thread = _ExportThread(job, self)
+        self._export_thread.finished.connect(self._on_export_finished)
+        self._export_thread.start()
+
+    def _on_export_finished(self):
+        thread, self._export_thread = self._export_thread, None
+        self._set_export_buttons_enabled(True)
+        if thread.error is not None:
+            QMessageBox.critical(self, "错误", f"导出失败: {thread.error}")
+        else:
+            self._show_export_report(thread.report)
+        thread.deleteLater()
+
+    def _start_stage_metrics(self):
+        """按设置开关阶段耗时统计，并清空上一次导出的数据"""
+        instrument.enable(self.stage_metrics)
+        instrument.reset()
+
+    def _stage_summary(self, report):
+        """阶段耗时摘要：占比最高的阶段 + 各阶段明细行"""
+        stages = {k: v for k, v in (report.get("stages") or {}).items() if k not in ("image_total", "read")}
+        if not stages:
+            return "", ""
+        total = sum(h["sum"] for h in stages.values()) or 1.0
+        top = sorted(stages.items(), key=lambda kv: kv[1]["sum"], reverse=True)[:3]
+        headline = "耗时占比: " + "，".join(f"{name} {h['sum'] / total:.0%}" for name, h in top)
+        return headline, "\n".join(instrument.summary_lines(report["stages"]))
+
+    def _show_export_report(self, report):
+        """汇总导出结果：失败列表或完成（含跳过数量）提示；开启统计时附各阶段耗时"""
+        headline, details = self._stage_summary(report)
+        if report["failed"]:
+            failures = "\n".join(f"{os.path.basename(p)}: {err}" for p, err in report["failed"][:10])
+            title, text, icon = "部分失败", f"{len(report['failed'])} 张图片导出失败:\n{failures}", QMessageBox.Warning
+        elif report["skipped"]:
+            title, text, icon = "成功", f"图片导出完成（{len(report['skipped'])} 张未变化，已跳过）", QMessageBox.Information
+        else:
+            title, text, icon = "成功", "图片导出完成", QMessageBox.Information
+        if not headline:
+            if icon == QMessageBox.Warning:
+                QMessageBox.warning(self, title, text)
+            else:
+                QMessageBox.information(self, title, text)
+            return
+        box = QMessageBox(icon, title, f"{text}\n\n{headline}", QMessageBox.Ok, self)
+        # 明细放在“显示详细信息”中，避免提示框过宽
+        box.setDetailedText(details)
+        box.exec_()
     
     def on_watermark_text_changed(self, text):
         """水印文本变更"""
@@ -608,6 +753,44 @@ class WatermarkApp(QMainWindow):
         self.watermark_position = pos
         self.update_preview()
     
+    def on_tile_spacing_changed(self, val):
+        self.tile_spacing = int(val)
+        self.update_preview()
+
+    def on_tile_stagger_changed(self, state):
+        self.tile_stagger = (state == Qt.Checked)
+        self.update_preview()
+    
+    # ==== 图层叠加事件 ====
+    def on_add_layer(self):
+        """将当前水印设置追加为顶层图层"""
+        self.watermark_layers.append(self._current_layer())
+        self._refresh_layer_list()
+        self.update_preview()
+
+    def on_remove_layer(self):
+        row = self.layer_list.currentRow() if hasattr(self, "layer_list") else -1
+        if 0 <= row < len(self.watermark_layers):
+            del self.watermark_layers[row]
+            self._refresh_layer_list()
+            self.update_preview()
+
+    def on_clear_layers(self):
+        self.watermark_layers = []
+        self._refresh_layer_list()
+        self.update_preview()
+
+    def _refresh_layer_list(self):
+        if not hasattr(self, "layer_list"):
+            return
+        self.layer_list.clear()
+        for i, layer in enumerate(self.watermark_layers):
+            if layer.get("type") == "image":
+                desc = f"图片: {os.path.basename(str(layer.get('image_watermark_path') or ''))}"
+            else:
+                desc = f"文本: {layer.get('text', '')}"
+            self.layer_list.addItem(f"{i + 1}. {desc}（{layer.get('position', '')}）")
+    
     def on_format_changed(self, format_text):
         """输出格式变更"""
         self.output_format = format_text.lower()
@@ -642,6 +825,41 @@ class WatermarkApp(QMainWindow):
     def on_resize_percent_changed(self, value):
         self.resize_percent = int(value)
 
+    def on_renditions_changed(self, text):
+        """多尺寸导出规格变更（逗号分隔，如 2048w:jpeg:90:_l, 50%:png）"""
+        try:
+            self.renditions = parse_rendition_list(text)
+            ok = True
+        except ValueError:
+            ok = False
+        if hasattr(self, "renditions_input"):
+            self.renditions_input.setStyleSheet("" if ok else "border:1px solid #d33;")
+
+    def on_archive_format_changed(self, idx):
+        """打包输出方式变更"""
+        try:
+            self.archive_format = self.archive_combo.itemData(idx) or ""
+        except Exception:
+            self.archive_format = ""
+
+    def on_export_pool_changed(self, idx):
+        """导出并发池类型变更（自动/多线程/多进程）"""
+        try:
+            self.export_pool = self.export_pool_combo.itemData(idx) or "auto"
+        except Exception:
+            self.export_pool = "auto"
+
+    def on_export_workers_changed(self, value):
+        """导出并发数变更（0 为自动）"""
+        self.export_workers = int(value)
+
+    def on_stage_metrics_changed(self, checked):
+        """阶段耗时统计开关"""
+        self.stage_metrics = bool(checked)
+
+    def _renditions_text(self):
+        return ", ".join(format_rendition_spec(r) for r in self.renditions)
+
     def _update_resize_rows_visibility(self):
         mode = getattr(self, "resize_mode", "none")
         if hasattr(self, "resize_width_row"):
@@ -717,46 +935,32 @@ class WatermarkApp(QMainWindow):
         self.watermark_position_custom = QPoint(pos_x, pos_y)
         self.watermark_position = "custom"
         self.update_preview()
+    def _current_spec(self):
+        """当前设置 → ExportSpec（模板字段及默认值统一定义在 watermark/spec.py）"""
+        fields = {name: getattr(self, _SPEC_ATTRS.get(name, name))
+                  for name in TEMPLATE_FIELDS if name not in ("custom_x", "custom_y")}
+        fields["custom_x"] = self.watermark_position_custom.x()
+        fields["custom_y"] = self.watermark_position_custom.y()
+        return ExportSpec.from_fields(fields)
+
+    def _apply_spec(self, spec):
+        """把 ExportSpec 写回对应的窗口属性（不更新界面）"""
+        fields = spec.to_fields()
+        for name, value in fields.items():
+            if name not in ("custom_x", "custom_y"):
+                setattr(self, _SPEC_ATTRS.get(name, name), value)
+        self.watermark_position_custom = QPoint(fields["custom_x"], fields["custom_y"])
+
+    def _collect_template_fields(self):
+        """收集当前设置为模板字段（不含名称）"""
+        return self._current_spec().to_fields()
+
     def save_template(self):
         """保存当前设置为模板"""
         template_name, ok = QInputDialog.getText(self, "保存模板", "输入模板名称:")
         if ok and template_name:
-            template = {
-                "name": template_name,
-                "text": self.watermark_text,
-                "opacity": self.watermark_opacity,
-                "position": self.watermark_position,
-                "format": self.output_format,
-                "naming": self.output_naming,
-                "prefix": self.output_prefix,
-                "suffix": self.output_suffix,
-                "jpeg_quality": self.jpeg_quality
-                ,"resize_mode": self.resize_mode,
-                "resize_width": self.resize_width,
-                "resize_height": self.resize_height,
-                "resize_percent": self.resize_percent,
-                "font_path": self.font_path,
-                "font_size": self.font_size_user,
-                "font_bold": self.font_bold,
-                "font_italic": self.font_italic,
-                "font_color": self.font_color,
-                "font_stroke_width": self.font_stroke_width,
-                "font_stroke_color": self.font_stroke_color,
-                "font_shadow_enabled": self.font_shadow_enabled,
-                "font_shadow_offset_x": self.font_shadow_offset_x,
-                "font_shadow_offset_y": self.font_shadow_offset_y,
-                "font_shadow_color": self.font_shadow_color,
-                "render_scale": self.render_scale,
-                # 图片水印相关
-                "watermark_type": self.watermark_type,
-                "image_watermark_path": self.image_watermark_path,
-                "image_scale_mode": self.image_scale_mode,
-                "image_scale_percent": self.image_scale_percent,
-                "image_scale_width": self.image_scale_width,
-                "image_scale_height": self.image_scale_height,
-                "image_keep_aspect": self.image_keep_aspect,
-                "watermark_rotation": self.watermark_rotation,
-            }
+            template = {"name": template_name}
+            template.update(self._collect_template_fields())
             
             self.templates = add_or_update_template(self.templates, template)
             self.save_settings()
@@ -778,56 +982,69 @@ class WatermarkApp(QMainWindow):
     
     def load_template(self, template):
         """加载模板"""
-        tpl = normalize_template_fields(template)
-        self.watermark_text = tpl["text"]
-        self.watermark_opacity = tpl["opacity"]
-        self.watermark_position = tpl["position"]
-        self.output_format = tpl["format"]
-        self.output_naming = tpl["naming"]
-        self.output_prefix = tpl["prefix"]
-        self.output_suffix = tpl["suffix"]
-        self.jpeg_quality = tpl.get("jpeg_quality", self.jpeg_quality)
-        self.resize_mode = tpl.get("resize_mode", self.resize_mode)
-        self.resize_width = tpl.get("resize_width", self.resize_width)
-        self.resize_height = tpl.get("resize_height", self.resize_height)
-        self.resize_percent = tpl.get("resize_percent", self.resize_percent)
-        self.font_path = tpl.get("font_path", self.font_path)
-        self.font_size_user = int(tpl.get("font_size", self.font_size_user))
-        self.font_bold = bool(tpl.get("font_bold", self.font_bold))
-        self.font_italic = bool(tpl.get("font_italic", self.font_italic))
-        self.font_color = tpl.get("font_color", self.font_color)
-        self.font_stroke_width = int(tpl.get("font_stroke_width", self.font_stroke_width))
-        self.font_stroke_color = tpl.get("font_stroke_color", self.font_stroke_color)
-        self.font_shadow_enabled = bool(tpl.get("font_shadow_enabled", self.font_shadow_enabled))
-        self.font_shadow_offset_x = int(tpl.get("font_shadow_offset_x", self.font_shadow_offset_x))
-        self.font_shadow_offset_y = int(tpl.get("font_shadow_offset_y", self.font_shadow_offset_y))
-        self.font_shadow_color = tpl.get("font_shadow_color", self.font_shadow_color)
-        self.render_scale = int(tpl.get("render_scale", self.render_scale))
-        # 图片水印
-        self.watermark_type = tpl.get("watermark_type", self.watermark_type)
-        self.image_watermark_path = tpl.get("image_watermark_path", self.image_watermark_path)
-        self.image_scale_mode = tpl.get("image_scale_mode", self.image_scale_mode)
-        self.image_scale_percent = int(tpl.get("image_scale_percent", self.image_scale_percent))
-        self.image_scale_width = int(tpl.get("image_scale_width", self.image_scale_width))
-        self.image_scale_height = int(tpl.get("image_scale_height", self.image_scale_height))
-        self.image_keep_aspect = bool(tpl.get("image_keep_aspect", self.image_keep_aspect))
-        self.watermark_rotation = int(tpl.get("watermark_rotation", getattr(self, "watermark_rotation", 0)))
+        self._apply_spec(ExportSpec.from_fields(template))
+        self._sync_settings_ui()
+        self.update_preview()
+    
+    def save_settings(self):
+        """保存设置到文件"""
+        settings = settings_from_spec(self._current_spec())
+        settings.update({
+            "archive_format": self.archive_format,
+            "export_pool": self.export_pool,
+            "export_workers": self.export_workers,
+            "stage_metrics": self.stage_metrics,
+            "templates": self.templates,
+        })
         
-        # 更新UI
+        try:
+            write_settings(settings)
+        except Exception as e:
+            print(f"保存设置失败: {e}")
+    
+    def load_settings(self):
+        """加载设置"""
+        try:
+            settings = read_settings()
+            if settings:
+                # 设置文件中缺少的字段保持当前值
+                self._apply_spec(ExportSpec.from_fields(template_from_settings(settings, self._collect_template_fields())))
+                self.templates = settings.get("templates", [])
+                self.archive_format = settings.get("archive_format", self.archive_format) or ""
+                self.export_pool = settings.get("export_pool", self.export_pool) or "auto"
+                self.export_workers = int(settings.get("export_workers", self.export_workers) or 0)
+                self.stage_metrics = bool(settings.get("stage_metrics", self.stage_metrics))
+                self._sync_settings_ui()
+                # 刷新预览
+                self.update_preview()
+        except Exception as e:
+            print(f"加载设置失败: {e}")
+
+    def _sync_settings_ui(self):
+        """按当前属性刷新各设置控件（加载设置与模板后调用）"""
         self.text_input.setText(self.watermark_text)
         self.opacity_slider.setValue(self.watermark_opacity)
-        if hasattr(self, "rotation_slider"):
-            self.rotation_slider.setValue(int(self.watermark_rotation))
-        if hasattr(self, "rotation_value_label"):
-            self.rotation_value_label.setText(f"{int(self.watermark_rotation)}°")
-        
+
         if self.output_format.lower() == "jpeg":
             self.format_combo.setCurrentIndex(1)
         else:
             self.format_combo.setCurrentIndex(0)
-        # 更新 JPEG 质量 UI
+
+        if self.output_naming == "prefix":
+            self.naming_prefix_radio.setChecked(True)
+        elif self.output_naming == "suffix":
+            self.naming_suffix_radio.setChecked(True)
+        else:
+            self.naming_original_radio.setChecked(True)
+
+        self.prefix_input.setText(self.output_prefix)
+        self.suffix_input.setText(self.output_suffix)
+        # 更新 JPEG 质量 UI 显示与数值
+        if hasattr(self, "jpeg_quality_container"):
+            self.jpeg_quality_container.setVisible(self.output_format.lower() == "jpeg")
         if hasattr(self, "jpeg_quality_slider"):
             self.jpeg_quality_slider.setValue(int(self.jpeg_quality))
+        if hasattr(self, "jpeg_quality_value_label"):
             self.jpeg_quality_value_label.setText(f"{int(self.jpeg_quality)}")
         # 更新字体 UI
         if hasattr(self, "font_combo"):
@@ -843,9 +1060,9 @@ class WatermarkApp(QMainWindow):
             self.font_bold_check.setChecked(bool(self.font_bold))
         if hasattr(self, "font_italic_check"):
             self.font_italic_check.setChecked(bool(self.font_italic))
-        # 更新颜色预览按钮
         if hasattr(self, "font_color_preview"):
             self.font_color_preview.setStyleSheet(f"background:{self.font_color}; border:1px solid #888;")
+        # 新增：高级样式 UI 同步
         if hasattr(self, "font_stroke_width_spin"):
             self.font_stroke_width_spin.setValue(int(self.font_stroke_width))
         if hasattr(self, "font_stroke_color_preview"):
@@ -858,6 +1075,8 @@ class WatermarkApp(QMainWindow):
             self.font_shadow_y_spin.setValue(int(self.font_shadow_offset_y))
         if hasattr(self, "font_shadow_color_preview"):
             self.font_shadow_color_preview.setStyleSheet(f"background:{self.font_shadow_color}; border:1px solid #888;")
+        if hasattr(self, "render_scale_spin"):
+            self.render_scale_spin.setValue(int(self.render_scale))
         # 更新缩放 UI
         if hasattr(self, "resize_mode_combo"):
             reverse_map = {
@@ -877,7 +1096,17 @@ class WatermarkApp(QMainWindow):
         if hasattr(self, "resize_percent_spin"):
             self.resize_percent_spin.setValue(int(self.resize_percent))
         self._update_resize_rows_visibility()
-
+        if hasattr(self, "renditions_input"):
+            self.renditions_input.setText(self._renditions_text())
+        if hasattr(self, "archive_combo"):
+            idx = self.archive_combo.findData(self.archive_format)
+            self.archive_combo.setCurrentIndex(idx if idx >= 0 else 0)
+        if hasattr(self, "export_pool_combo"):
+            idx = self.export_pool_combo.findData(self.export_pool)
+            self.export_pool_combo.setCurrentIndex(idx if idx >= 0 else 0)
+            self.export_workers_spin.setValue(int(self.export_workers))
+        if hasattr(self, "stage_metrics_check"):
+            self.stage_metrics_check.setChecked(self.stage_metrics)
         # 图片水印 UI 同步
         if hasattr(self, "watermark_type_combo"):
             self.watermark_type_combo.setCurrentIndex(0 if self.watermark_type == "text" else 1)
@@ -901,212 +1130,19 @@ class WatermarkApp(QMainWindow):
         if hasattr(self, "percent_row") and hasattr(self, "free_row"):
             self.percent_row.setVisible(self.image_scale_mode == "percent")
             self.free_row.setVisible(self.image_scale_mode == "free")
-        
-        if self.output_naming == "prefix":
-            self.naming_prefix_radio.setChecked(True)
-        elif self.output_naming == "suffix":
-            self.naming_suffix_radio.setChecked(True)
-        else:
-            self.naming_original_radio.setChecked(True)
-        
-        self.prefix_input.setText(self.output_prefix)
-        self.suffix_input.setText(self.output_suffix)
-        
-        self.update_preview()
-    
-    def save_settings(self):
-        """保存设置到文件"""
-        settings = {
-            "watermark_text": self.watermark_text,
-            "watermark_opacity": self.watermark_opacity,
-            "watermark_position": self.watermark_position,
-            "output_format": self.output_format,
-            "output_naming": self.output_naming,
-            "output_prefix": self.output_prefix,
-            "output_suffix": self.output_suffix,
-            "jpeg_quality": self.jpeg_quality,
-            "resize_mode": self.resize_mode,
-            "resize_width": self.resize_width,
-            "resize_height": self.resize_height,
-            "resize_percent": self.resize_percent,
-            "font_path": self.font_path,
-            "font_size": self.font_size_user,
-            "font_bold": self.font_bold,
-            "font_italic": self.font_italic,
-            "font_color": self.font_color,
-            "font_stroke_width": self.font_stroke_width,
-            "font_stroke_color": self.font_stroke_color,
-            "font_shadow_enabled": self.font_shadow_enabled,
-            "font_shadow_offset_x": self.font_shadow_offset_x,
-            "font_shadow_offset_y": self.font_shadow_offset_y,
-            "font_shadow_color": self.font_shadow_color,
-            "render_scale": self.render_scale,
-            # 图片水印设置
-            "watermark_type": self.watermark_type,
-            "image_watermark_path": self.image_watermark_path,
-            "image_scale_mode": self.image_scale_mode,
-            "image_scale_percent": self.image_scale_percent,
-            "image_scale_width": self.image_scale_width,
-            "image_scale_height": self.image_scale_height,
-            "image_keep_aspect": self.image_keep_aspect,
-            "watermark_rotation": self.watermark_rotation,
-            "templates": self.templates
-        }
-        
-        try:
-            write_settings(settings)
-        except Exception as e:
-            print(f"保存设置失败: {e}")
-    
-    def load_settings(self):
-        """加载设置"""
-        try:
-            settings = read_settings()
-            if settings:
-                self.watermark_text = settings.get("watermark_text", self.watermark_text)
-                self.watermark_opacity = settings.get("watermark_opacity", self.watermark_opacity)
-                self.watermark_position = settings.get("watermark_position", self.watermark_position)
-                self.output_format = settings.get("output_format", self.output_format)
-                self.output_naming = settings.get("output_naming", self.output_naming)
-                self.output_prefix = settings.get("output_prefix", self.output_prefix)
-                self.output_suffix = settings.get("output_suffix", self.output_suffix)
-                self.templates = settings.get("templates", [])
-                self.jpeg_quality = settings.get("jpeg_quality", self.jpeg_quality)
-                self.resize_mode = settings.get("resize_mode", self.resize_mode)
-                self.resize_width = settings.get("resize_width", self.resize_width)
-                self.resize_height = settings.get("resize_height", self.resize_height)
-                self.resize_percent = settings.get("resize_percent", self.resize_percent)
-                self.font_path = settings.get("font_path", self.font_path)
-                self.font_size_user = int(settings.get("font_size", self.font_size_user))
-                self.font_bold = bool(settings.get("font_bold", self.font_bold))
-                self.font_italic = bool(settings.get("font_italic", self.font_italic))
-                self.font_color = settings.get("font_color", self.font_color)
-                # 新增：描边、阴影、高清渲染
-                self.font_stroke_width = int(settings.get("font_stroke_width", self.font_stroke_width))
-                self.font_stroke_color = settings.get("font_stroke_color", self.font_stroke_color)
-                self.font_shadow_enabled = bool(settings.get("font_shadow_enabled", self.font_shadow_enabled))
-                self.font_shadow_offset_x = int(settings.get("font_shadow_offset_x", self.font_shadow_offset_x))
-                self.font_shadow_offset_y = int(settings.get("font_shadow_offset_y", self.font_shadow_offset_y))
-                self.font_shadow_color = settings.get("font_shadow_color", self.font_shadow_color)
-                self.render_scale = int(settings.get("render_scale", self.render_scale))
-                # 图片水印设置
-                self.watermark_type = settings.get("watermark_type", self.watermark_type)
-                self.image_watermark_path = settings.get("image_watermark_path", self.image_watermark_path)
-                self.image_scale_mode = settings.get("image_scale_mode", self.image_scale_mode)
-                self.image_scale_percent = int(settings.get("image_scale_percent", self.image_scale_percent))
-                self.image_scale_width = int(settings.get("image_scale_width", self.image_scale_width))
-                self.image_scale_height = int(settings.get("image_scale_height", self.image_scale_height))
-                self.image_keep_aspect = bool(settings.get("image_keep_aspect", self.image_keep_aspect))
-                self.watermark_rotation = int(settings.get("watermark_rotation", getattr(self, "watermark_rotation", 0)))
-                
-                # 更新UI
-                self.text_input.setText(self.watermark_text)
-                self.opacity_slider.setValue(self.watermark_opacity)
-                
-                if self.output_format.lower() == "jpeg":
-                    self.format_combo.setCurrentIndex(1)
-                else:
-                    self.format_combo.setCurrentIndex(0)
-                
-                if self.output_naming == "prefix":
-                    self.naming_prefix_radio.setChecked(True)
-                elif self.output_naming == "suffix":
-                    self.naming_suffix_radio.setChecked(True)
-                else:
-                    self.naming_original_radio.setChecked(True)
-                
-                self.prefix_input.setText(self.output_prefix)
-                self.suffix_input.setText(self.output_suffix)
-                # 更新 JPEG 质量 UI 显示与数值
-                if hasattr(self, "jpeg_quality_container"):
-                    self.jpeg_quality_container.setVisible(self.output_format.lower() == "jpeg")
-                if hasattr(self, "jpeg_quality_slider"):
-                    self.jpeg_quality_slider.setValue(int(self.jpeg_quality))
-                if hasattr(self, "jpeg_quality_value_label"):
-                    self.jpeg_quality_value_label.setText(f"{int(self.jpeg_quality)}")
-                # 更新字体 UI
-                if hasattr(self, "font_combo"):
-                    if self.font_path:
-                        idx = self.font_combo.findData(self.font_path)
-                        if idx >= 0:
-                            self.font_combo.setCurrentIndex(idx)
-                    else:
-                        self.font_combo.setCurrentIndex(0)
-                if hasattr(self, "font_size_spin"):
-                    self.font_size_spin.setValue(int(self.font_size_user))
-                if hasattr(self, "font_bold_check"):
-                    self.font_bold_check.setChecked(bool(self.font_bold))
-                if hasattr(self, "font_italic_check"):
-                    self.font_italic_check.setChecked(bool(self.font_italic))
-                if hasattr(self, "font_color_preview"):
-                    self.font_color_preview.setStyleSheet(f"background:{self.font_color}; border:1px solid #888;")
-                # 新增：高级样式 UI 同步
-                if hasattr(self, "font_stroke_width_spin"):
-                    self.font_stroke_width_spin.setValue(int(self.font_stroke_width))
-                if hasattr(self, "font_stroke_color_preview"):
-                    self.font_stroke_color_preview.setStyleSheet(f"background:{self.font_stroke_color}; border:1px solid #888;")
-                if hasattr(self, "font_shadow_check"):
-                    self.font_shadow_check.setChecked(bool(self.font_shadow_enabled))
-                if hasattr(self, "font_shadow_x_spin"):
-                    self.font_shadow_x_spin.setValue(int(self.font_shadow_offset_x))
-                if hasattr(self, "font_shadow_y_spin"):
-                    self.font_shadow_y_spin.setValue(int(self.font_shadow_offset_y))
-                if hasattr(self, "font_shadow_color_preview"):
-                    self.font_shadow_color_preview.setStyleSheet(f"background:{self.font_shadow_color}; border:1px solid #888;")
-                if hasattr(self, "render_scale_spin"):
-                    self.render_scale_spin.setValue(int(self.render_scale))
-                # 更新缩放 UI
-                if hasattr(self, "resize_mode_combo"):
-                    reverse_map = {
-                        "none": "不缩放",
-                        "width": "按宽度",
-                        "height": "按高度",
-                        "percent": "按百分比",
-                    }
-                    text = reverse_map.get(self.resize_mode, "不缩放")
-                    idx = self.resize_mode_combo.findText(text)
-                    if idx >= 0:
-                        self.resize_mode_combo.setCurrentIndex(idx)
-                if hasattr(self, "resize_width_spin"):
-                    self.resize_width_spin.setValue(int(self.resize_width))
-                if hasattr(self, "resize_height_spin"):
-                    self.resize_height_spin.setValue(int(self.resize_height))
-                if hasattr(self, "resize_percent_spin"):
-                    self.resize_percent_spin.setValue(int(self.resize_percent))
-                self._update_resize_rows_visibility()
-                # 图片水印 UI 同步
-                if hasattr(self, "watermark_type_combo"):
-                    self.watermark_type_combo.setCurrentIndex(0 if self.watermark_type == "text" else 1)
-                if hasattr(self, "image_path_edit"):
-                    self.image_path_edit.setText(str(self.image_watermark_path or ""))
-                if hasattr(self, "scale_mode_combo"):
-                    self.scale_mode_combo.setCurrentIndex(0 if self.image_scale_mode == "percent" else 1)
-                if hasattr(self, "percent_spin"):
-                    self.percent_spin.setValue(int(self.image_scale_percent))
-                if hasattr(self, "width_spin"):
-                    self.width_spin.setValue(int(self.image_scale_width))
-                if hasattr(self, "height_spin"):
-                    self.height_spin.setValue(int(self.image_scale_height))
-                if hasattr(self, "keep_aspect_check"):
-                    self.keep_aspect_check.setChecked(bool(self.image_keep_aspect))
-                if hasattr(self, "text_row") and hasattr(self, "image_row") and hasattr(self, "scale_row"):
-                    _is_image = (self.watermark_type == "image")
-                    self.text_row.setVisible(not _is_image)
-                    self.image_row.setVisible(_is_image)
-                    self.scale_row.setVisible(_is_image)
-                if hasattr(self, "percent_row") and hasattr(self, "free_row"):
-                    self.percent_row.setVisible(self.image_scale_mode == "percent")
-                    self.free_row.setVisible(self.image_scale_mode == "free")
-                if hasattr(self, "rotation_slider"):
-                    self.rotation_slider.setValue(int(self.watermark_rotation))
-                if hasattr(self, "rotation_value_label"):
-                    self.rotation_value_label.setText(f"{int(self.watermark_rotation)}°")
-                # 刷新预览
-                self.update_preview()
-        except Exception as e:
-            print(f"加载设置失败: {e}")
+        if hasattr(self, "rotation_slider"):
+            self.rotation_slider.setValue(int(self.watermark_rotation))
+        if hasattr(self, "rotation_value_label"):
+            self.rotation_value_label.setText(f"{int(self.watermark_rotation)}°")
+        if hasattr(self, "tile_spacing_spin"):
+            self.tile_spacing_spin.setValue(int(self.tile_spacing))
+        if hasattr(self, "tile_stagger_check"):
+            self.tile_stagger_check.setChecked(bool(self.tile_stagger))
+        self._refresh_layer_list()
     
     def closeEvent(self, event):
-        """关闭窗口时保存设置"""
+        """关闭窗口时保存设置；导出进行中时等待其完成，避免销毁仍在运行的线程"""
         self.save_settings()
+        if self._export_thread is not None:
+            self._export_thread.wait()
         event.accept()
\ No newline at end of file